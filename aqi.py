@@ -0,0 +1,128 @@
+import functools
+import numpy as np
+import pandas as pd
+import argparse
+
+#The EPA air quality index of whole columns of pollutant readings at once, from the breakpoints in AQI-Criteria.csv.
+#Each reading is truncated to the EPA's precision, its breakpoint row found with searchsorted and its sub-index
+#interpolated linearly within the row; the AQI is the highest sub-index of the day (or hour). Works the same on
+#the daily maximums of environment.csv and on hourly Weatherbit data (see weatherbit()).
+#
+#   from aqi import add_aqi, read_aq
+#   aq = add_aqi(read_aq("AQ.csv"))
+
+CRITERIA = "AQI-Criteria.csv"
+POLLUTANTS = ["O3", "PM25", "PM10", "CO", "NO2"]
+#Decimals the EPA truncates each pollutant to (O3 and CO in ppm, NO2 in ppb, particulates in ug/m3)
+PRECISION = {"O3": 3, "PM25": 1, "PM10": 0, "CO": 1, "NO2": 0}
+#Weatherbit reports the gases in ug/m3; molecular weights to convert them to ppm/ppb at 25C (24.45 L/mol)
+MOLECULAR_WEIGHT = {"O3": 48.00, "CO": 28.01, "NO2": 46.01}
+
+class Breakpoints():
+
+    def __init__(self, path=CRITERIA):
+        criteria = pd.read_csv(path)
+        self.levels = np.array(criteria["LEVEL"].tolist(), dtype=object)
+        self.aqi_low = criteria["AQI.MIN"].to_numpy(dtype=float)
+        self.aqi_high = criteria["AQI.MAX"].to_numpy(dtype=float)
+        #Each row runs from one step above the previous row's upper breakpoint through its own
+        self.high = {p: criteria[p].to_numpy(dtype=float) for p in POLLUTANTS}
+        self.low = {p: np.r_[0, self.high[p][:-1] + 10.0**-PRECISION[p]] for p in POLLUTANTS}
+
+    def truncate(self, pollutant, values):
+        scale = 10.0**PRECISION[pollutant]
+        #The small offset keeps readings like 0.07 (0.0699999...) from being truncated a step down
+        return np.floor(np.asarray(values, dtype=float)*scale + 1e-6)/scale
+
+    def row(self, breakpoints, values):
+        #Index of the first row whose upper breakpoint is at or above the value; values above the table use the last row
+        return np.minimum(np.searchsorted(breakpoints, values, side="left"), len(breakpoints) - 1)
+
+    def sub_index(self, pollutant, values):
+        #Sub-index of every reading (NaN where it's missing); readings above the table extend its last row.
+        #A negative reading (a sensor offset around zero) counts as zero rather than falling below the first row
+        values = self.truncate(pollutant, np.maximum(values, 0))
+        i = self.row(self.high[pollutant], values)
+        low, high = self.low[pollutant][i], self.high[pollutant][i]
+        return (self.aqi_high[i] - self.aqi_low[i])/(high - low)*(values - low) + self.aqi_low[i]
+
+    def level(self, pollutant, values):
+        #Level label of every reading (None where it's missing), truncated like in sub_index so the two agree
+        values = self.truncate(pollutant, np.maximum(values, 0))
+        labels = self.levels[self.row(self.high[pollutant], values)]
+        labels[np.isnan(values)] = None
+        return labels
+
+    def aqi_level(self, aqi):
+        aqi = np.asarray(aqi, dtype=float)
+        labels = self.levels[self.row(self.aqi_high, aqi)]
+        labels[np.isnan(aqi)] = None
+        return labels
+
+@functools.lru_cache(maxsize=None)
+def breakpoints(path=CRITERIA):
+    #Loaded once per criteria file
+    return Breakpoints(path)
+
+def parse(values, implied=None):
+    #Readings as floats from the text of the air quality tables, where flagged readings look like "P 37.3" or
+    #"P 37.3 +". implied is how many decimals a flagged reading that lost its decimal point had ("P 074" is 0.074 ppm O3).
+    #Negative readings keep their sign here; sub_index counts them as zero
+    text = pd.Series(values).astype("string").str.strip()
+    parsed = pd.to_numeric(text.str.extract(r"(-?\d*\.?\d+)", expand=False), errors="coerce").to_numpy(dtype=float)
+    if implied is not None:
+        flagged = (text.str.contains(r"[^\d.\s+-]", regex=True) & ~text.str.contains(".", regex=False)).fillna(False)
+        parsed = np.where(flagged.to_numpy(dtype=bool), parsed/10.0**implied, parsed)
+    return parsed
+
+def read_aq(path):
+    #An air quality table (AQ.csv, ProvoAQ.csv, aq2023.csv) with every pollutant parsed to a float
+    data = pd.read_csv(path, dtype=str)
+    for p in POLLUTANTS:
+        if p in data:
+            data[p] = parse(data[p], implied=PRECISION[p] if p == "O3" else None)
+    return data
+
+def weatherbit(data):
+    #Hourly (or daily) Weatherbit air quality records (co, no2, o3 in ug/m3) in the columns and units of the criteria
+    data = data.rename(columns={p.lower(): p for p in POLLUTANTS})
+    for p, weight in MOLECULAR_WEIGHT.items():
+        if p in data:
+            ppb = pd.to_numeric(data[p], errors="coerce")*24.45/weight
+            data[p] = ppb if p == "NO2" else ppb/1000
+    return data
+
+def sub_indices(data, pollutants=POLLUTANTS, criteria=CRITERIA):
+    #(rows x pollutants) array of sub-indices
+    table = breakpoints(criteria)
+    return np.column_stack([table.sub_index(p, data[p].to_numpy(dtype=float)) for p in pollutants])
+
+def add_aqi(data, pollutants=POLLUTANTS, criteria=CRITERIA):
+    #Adds the <pollutant>_LEVEL columns, the AQI (the highest sub-index, NaN without any readings) and its AQI_LEVEL
+    table = breakpoints(criteria)
+    data = data.copy()
+    for p in pollutants:
+        data[p] = pd.to_numeric(data[p], errors="coerce")
+        data[f"{p}_LEVEL"] = table.level(p, data[p].to_numpy(dtype=float))
+    indices = sub_indices(data, pollutants, criteria)
+    missing = np.isnan(indices).all(axis=1)
+    aqi = np.round(np.max(np.where(np.isnan(indices), -np.inf, indices), axis=1))
+    data["AQI"] = np.where(missing, np.nan, aqi)
+    data["AQI_LEVEL"] = table.aqi_level(data["AQI"])
+    return data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the AQI and pollutant levels of an air quality table")
+    parser.add_argument("data", help="i.e. AQ.csv, or hourly Weatherbit records with --weatherbit")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--weatherbit", action="store_true", help="Lower case columns with the gases in ug/m3")
+    parser.add_argument("--criteria", default=CRITERIA)
+    args = parser.parse_args()
+
+    data = weatherbit(pd.read_csv(args.data)) if args.weatherbit else read_aq(args.data)
+    data = add_aqi(data, [p for p in POLLUTANTS if p in data], args.criteria)
+    if args.output is None:
+        print(data)
+        print(data["AQI_LEVEL"].value_counts())
+    else:
+        data.to_csv(args.output, index=False)
@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import main
+from main import clean_data, save_data
+from lookup import format_fine
+from mocksite import STATES, VIOLATIONS
+from features import LAGS
+from lagtable import coefficient_table
+from rolling import RollingMeans, blank
+from training import read_provo, design, fit_rf, LeastSquares, TRUNCATED, DIFFERENCE
+
+#Benchmarks of the scraping and analysis hot paths on synthetic data: citations in the shape the scraper
+#buffers them (the fields of Scraper.format_text and Scraper.checkPayment) and daily panels shaped like Provo.csv,
+#at 1x, 10x and 100x today's size. Every benchmark is timed --repeat times per size; the results are written to
+#JSON and compared with the stored baseline (bench_baseline.json), so a change that makes a path slower or
+#faster shows up as a ratio. The timings are machine specific: save a new baseline when moving to another machine.
+#
+#   python bench.py
+#   python bench.py --only clean_data rolling --scales 1 10
+#   python bench.py --save-baseline
+
+OUTPUT = "bench_results.json"
+BASELINE = "bench_baseline.json"
+SCALES = [1, 10, 100]
+
+#Citations in the data set today, and citations per save_data flush (the scraper saves every 1000 indexes)
+CITATIONS = 150000
+FLUSH = 1000
+
+#The dashboard's metrics and lag slider
+METRICS = ["CO", "NO2", "O3", "PM10", "PM25", "AQI", "MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip",
+           "Wind", "DailyNumFines", "NumPaidFines", "TotalFineAmount"]
+MAX_LAGS = 90
+#Smoothness slider positions the rolling means are timed at
+WINDOWS = [1, 7, 30, 90, 180]
+
+ENVIRONMENT = ["MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip", "Wind", "CO", "NO2", "O3", "PM10", "PM25", "AQI"]
+TEMPERATURES = ["MaxTemp", "MinTemp", "MeanTemp"]
+
+def synthetic_citations(n, seed=0):
+    #n citations as the scraper buffers them before a flush (see lookup.format_citation for the same row from JSON)
+    rng = np.random.default_rng(seed)
+    officers = rng.integers(1, 11, n)
+    indexes = rng.integers(0, 100000, n)
+    issued = pd.Timestamp("2014-01-06") + pd.to_timedelta(rng.integers(0, 10*365*24*60, n), unit="min")
+    unpaid = rng.random(n) < 0.2
+    return pd.DataFrame({
+        "Citation": [f"P{officer}-{index:05d}" for officer, index in zip(officers, indexes)],
+        "License Plate/Vin": [f"{state} {plate}" for state, plate in zip(rng.choice(STATES, n), rng.integers(100000, 999999, n))],
+        "Fine": [format_fine(fine) for fine in rng.choice([0.0, 15.0, 20.0, 25.0, 35.0, 50.0, 75.0, 100.0, 1020.0], n)],
+        "Issued": issued.strftime('%b %d, %Y %I:%M %p'),
+        "Location": [f"Lot {lot}" for lot in rng.integers(1, 61, n)],
+        "Violation": rng.choice(VIOLATIONS, n),
+        #An unpaid citation has both the appeal and pay buttons (see Scraper.payment_info)
+        "CitationText": np.where(unpaid, "APPEAL", None),
+        "Unpaid": unpaid,
+    })
+
+def synthetic_provo(provo, scale, seed=0):
+    #scale times as many days as provo: its whole weeks repeated on consecutive dates (so the days of the week and
+    #their dummies still line up), with noise on the weather, air quality and citation counts so no two copies match
+    rng = np.random.default_rng(seed)
+    weeks = provo.iloc[:len(provo)//7*7]
+    n = int(round(len(provo)*scale))
+    panel = weeks.iloc[np.arange(n) % len(weeks)].reset_index(drop=True)
+    panel["DATE"] = pd.date_range(provo["DATE"].iloc[0], periods=n, freq="D")
+    panel["Month"] = panel["DATE"].dt.month
+    panel["Year"] = panel["DATE"].dt.year
+
+    for col in ENVIRONMENT:
+        values = panel[col].to_numpy(dtype=float)
+        noisy = values + rng.normal(0, 0.05*np.nanstd(values), n)
+        panel[col] = noisy if col in TEMPERATURES else np.maximum(noisy, 0)
+    fines = panel["DailyNumFines"].to_numpy(dtype=float)
+    new_fines = rng.poisson(np.nan_to_num(fines)).astype(float)
+    ratio = np.divide(new_fines, fines, out=np.ones(n), where=fines > 0)
+    panel["DailyNumFines"] = new_fines
+    panel["NumPaidFines"] = np.minimum(np.round(panel["NumPaidFines"].to_numpy(dtype=float)*ratio), new_fines)
+    panel["TotalFineAmount"] = panel["TotalFineAmount"].to_numpy(dtype=float)*ratio
+    paid = panel["NumPaidFines"].to_numpy()
+    panel["AvgPaidFine"] = np.divide(panel["TotalFineAmount"].to_numpy(), paid, out=np.zeros(n), where=paid > 0)
+    #In the types of the panel it was made from (see schema.py)
+    return panel.astype(provo.dtypes.to_dict())
+
+#Each benchmark takes the scale and today's Provo.csv, does its setup and returns the number of rows it works on
+#and the function to time. The setup isn't timed.
+
+def bench_save_data(scale, provo):
+    #A flush of the scrape buffer: cleaning the buffered rows and writing them to the Parquet store
+    rows = synthetic_citations(FLUSH*scale).to_dict("records")
+    def run():
+        main.DATA.clear()
+        main.DATA.rows.extend(rows)
+        save_data(pd.DataFrame(), save=True)
+    return len(rows), run
+
+def bench_clean_data(scale, provo):
+    #Parsing Issued into IssuedDate/IssuedTime and the rest of clean_data over the citations
+    citations = synthetic_citations(CITATIONS*scale)
+    return len(citations), lambda: clean_data(citations.copy())
+
+def bench_lag_table(scale, provo):
+    #The "Lags of Key Metrics" coefficients of every metric for 1 through MAX_LAGS lags
+    panel = synthetic_provo(provo, scale)
+    return len(panel), lambda: coefficient_table(panel, METRICS, MAX_LAGS)
+
+def bench_features(scale, provo):
+    #The lags, dummies, interactions and differences of all three models
+    panel = synthetic_provo(provo, scale)
+    return len(panel), lambda: design(panel)
+
+def bench_fit_lasso(scale, provo):
+    d = design(synthetic_provo(provo, scale))
+    days = d["kept"] & (d["days"] >= max(LAGS))
+    return int(days.sum()), lambda: LeastSquares().update(d["lasso"][days], d["log_fines"][days])
+
+def bench_fit_first_difference(scale, provo):
+    d = design(synthetic_provo(provo, scale))
+    days = d["days"] >= DIFFERENCE
+    return int(days.sum()), lambda: LeastSquares().update(d["difference"][days], d["log_fines_change"][days])
+
+def bench_fit_rf(scale, provo):
+    d = design(synthetic_provo(provo, scale))
+    return int((d["days"] >= max(LAGS)).sum()), lambda: fit_rf(d)
+
+def bench_rolling(scale, provo):
+    #The smoothness sliders: building the prefix sums of every metric, then every metric's means at a few windows,
+    #over all days and per day of the week
+    panel = synthetic_provo(provo, scale)
+    fines = ["DailyNumFines", "NumPaidFines", "TotalFineAmount"]
+    def run():
+        values = panel[METRICS].to_numpy(dtype=float, copy=True)
+        values[:, [METRICS.index(fine) for fine in fines]] = blank(panel, fines, TRUNCATED)
+        means = RollingMeans(values, METRICS, groups=panel["Day"])
+        for window in WINDOWS:
+            for metric in METRICS:
+                means.mean(window, metric)
+                means.group_mean(window, metric)
+    return len(panel), run
+
+#Runs the dashboard once in a new process, like the first visit after the server starts, and prints the seconds
+#the run took to its first chart and to its end (see dashboard.py)
+COLD_START = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=600).run()
+print(json.dumps(app.session_state["timings"]))
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def dashboard_timings():
+    #In this directory, where the dashboard's data is
+    done = subprocess.run([sys.executable, "-c", COLD_START, os.path.join(HERE, "dashboard.py")], cwd=HERE,
+                          capture_output=True, text=True, check=True)
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+def bench_dashboard_first_chart(scale, provo):
+    #The first meaningful paint of a cold start: imports, loading Provo.csv and the first chart of the landing page
+    return len(provo), lambda: dashboard_timings()["first_chart"]
+
+def bench_dashboard_cold_start(scale, provo):
+    #The whole first run of the landing page
+    return len(provo), lambda: dashboard_timings()["complete"]
+
+#Benchmark and the largest scale it runs at without --full; the ones left out at 100x need more memory than a
+#laptop has (15 million citations, the lag table's days x metrics x lags design) or take minutes (the random forest)
+BENCHMARKS = {
+    "save_data": (bench_save_data, 100),
+    "clean_data": (bench_clean_data, 10),
+    "lag_table": (bench_lag_table, 10),
+    "features": (bench_features, 100),
+    "fit_lasso": (bench_fit_lasso, 100),
+    "fit_first_difference": (bench_fit_first_difference, 100),
+    "fit_rf": (bench_fit_rf, 1),
+    "rolling": (bench_rolling, 100),
+    #Today's Provo.csv only
+    "dashboard_first_chart": (bench_dashboard_first_chart, 1),
+    "dashboard_cold_start": (bench_dashboard_cold_start, 1),
+}
+
+def measure(run, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        measured = run()
+        #Runs timed in another process return the seconds they measured there
+        seconds.append(measured if isinstance(measured, float) else time.perf_counter() - start)
+    return seconds
+
+def result_key(name, scale):
+    return f"{name}@{scale}x"
+
+def run_benchmarks(names, scales, provo, repeat=3, full=False):
+    results = {}
+    for name in names:
+        bench, max_scale = BENCHMARKS[name]
+        for scale in scales:
+            if scale > max_scale and not full:
+                continue
+            rows, run = bench(scale, provo)
+            seconds = measure(run, repeat)
+            median = float(np.median(seconds))
+            results[result_key(name, scale)] = {"benchmark": name, "scale": scale, "rows": rows, "seconds": seconds,
+                                                "best": min(seconds), "median": median, "rows_per_second": rows/median if median > 0 else None}
+            print(f"{result_key(name, scale):<28} {rows:>10} rows  {median:9.4f}s median  {min(seconds):9.4f}s best")
+    return results
+
+def environment():
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "numpy": np.__version__, "pandas": pd.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def compare(results, baseline, threshold=0.2):
+    #Ratio of every median to the baseline's; slower or faster when it's off by more than the threshold
+    comparison = {}
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["median"]/baseline[key]["median"] if baseline[key]["median"] > 0 else float("inf")
+        status = "slower" if ratio > 1 + threshold else "faster" if ratio < 1/(1 + threshold) else "same"
+        comparison[key] = {"baseline": baseline[key]["median"], "median": result["median"], "ratio": ratio, "status": status}
+    return comparison
+
+def write_json(data, path):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the scraping and analysis hot paths on synthetic data")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--scales", nargs="+", type=int, default=SCALES, help="Multiples of today's data size")
+    parser.add_argument("--full", action="store_true", help="Also run the benchmarks above the scale they stop at by default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data", default="Provo.csv", help="Provo.csv the synthetic panels are made from")
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as slower or faster")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with an error if anything got slower")
+    args = parser.parse_args()
+
+    provo = read_provo(args.data)
+    output, baseline_path = os.path.abspath(args.output), os.path.abspath(args.baseline)
+    #save_data writes to the citation store and the scrape journal in the working directory, so run in a scratch one
+    here = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            results = run_benchmarks(args.only, args.scales, provo, args.repeat, args.full)
+        finally:
+            os.chdir(here)
+
+    report = {"environment": environment(), "repeat": args.repeat, "results": results}
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline["results"], args.threshold)
+    write_json(report, output)
+    if args.save_baseline:
+        #Keeps the baseline's results for benchmarks that weren't run this time
+        stored = baseline["results"] if baseline is not None else {}
+        write_json({"environment": report["environment"], "repeat": args.repeat, "results": {**stored, **results}}, baseline_path)
+        print(f"Saved the baseline to {args.baseline}")
+
+    regressions = []
+    if "comparison" in report:
+        print(f"\nCompared with {args.baseline} (recorded {baseline['environment']['created']}):")
+        for key, c in report["comparison"].items():
+            print(f"{key:<28} {c['baseline']:9.4f}s -> {c['median']:9.4f}s  x{c['ratio']:.2f}  {c['status']}")
+            if c["status"] == "slower":
+                regressions.append(key)
+    print(f"Results written to {args.output}")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(f"Slower than the baseline: {', '.join(regressions)}")
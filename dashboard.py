@@ -1,48 +1,48 @@
+import time
+
+#When this run of the script started, for the timings below
+STARTED = time.perf_counter()
+
 import numpy as np
 import pandas as pd
+import os
 import streamlit as st
 import plotly.express as px
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import LinearRegression
-import plotly.graph_objects as go
-
-from sympy import sympify, symbols, sqrt
-
-st.title("How Parking Demand Changes in Response to Environmental Factors")
-
-st.write('''
-In this analysis I seek to answer whether changes in air quality change transportation incentives for students at my university, Brigham Young University (BYU).
-''')
-
-st.write('''
-To answer this question I combine historical air quality data from the Utah Department of Environmental Quality along with the corresponding colinear weather factors for the corresponding dates.
-To measure how the incentives of university students to drive to school I analyzed and aggregated approximated 150,000 traffic citations distributed from my university from the years 2014-2022.
-         ''')
 
-st.write('''
-This dashboard contains visuals for key elements to exploring the key elements and factors used to distinguishing the "signal from the noise." The goal is to control for all other effects that could otherwise affect the daily number of traffic citations given and isolate the effect that changes in air quality has on students driving to school, and hence, on the number of tickets given out.''')
+from rolling import RollingMeans, blank
+from schema import read_provo
 
-st.markdown("See this [blog post](https://samleebyu.github.io/2023/11/13/byu-traffic-citations/) for how I collected this data")
-st.markdown("See this [blog post](https://samleebyu.github.io/2023/12/16/byu-traffic-citations-eda) for how I used this data to answer my research question")
-st.markdown("All relevant code and data is documented on this project's [repository](https://github.com/SamLeeBYU/BYUTrafficCitations)")
+#Streamlit reruns this whole script on every widget change, so the data and everything derived from it
+#is computed in cached stages. The caches live in the server process and are shared by every session;
+#each stage is keyed on its arguments, so an interaction only redoes the stages that depend on it.
+#
+#Every section is its own page and only the open page runs, so a visitor looking at the key metrics never waits
+#for the lag table, the equation parser (sympy) or the models; the modules only one section needs are imported
+#in it. The seconds from the start of a run to its first chart and to its end are kept in
+#st.session_state["timings"]; bench.py measures them on a cold start.
 
-st.markdown("## Dashboard Guide")
-st.markdown("- [Key Metrics Over Time](#key-metrics-over-time)")
-st.markdown("- [Time Series Dependence Analysis](#lags-of-key-metrics)")
-st.markdown("- [Compare Different Metrics](#analyze-different-metrics-by-school-term)")
-st.markdown("- [Time Series Modeling](#the-model)")
+TIMINGS = {}
 
-provo = pd.read_csv("Provo.csv")
+def mark(name):
+    #Seconds since the run started, the first time name is reached in this run
+    TIMINGS.setdefault(name, time.perf_counter() - STARTED)
 
-provo["DATE"] = pd.to_datetime(provo["DATE"])
+def chart(figure):
+    st.plotly_chart(figure)
+    mark("first_chart")
 
-st.markdown("---")
+def provo_modified():
+    #Passed to the cached functions below so they are recomputed when Provo.csv changes
+    return os.path.getmtime("Provo.csv")
 
-st.markdown("## Key Metrics Over Time")
+@st.cache_data
+def load_provo(modified):
+    #Typed, from the binary copy of Provo.csv when it's up to date (see schema.py)
+    return read_provo("Provo.csv")
 
-metrics = ["CO", "NO2", "O3", "PM10", "PM25", "AQI", "MaxTemp", 
-           "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip", 
-           "Wind", "DailyNumFines", "NumPaidFines", 
+metrics = ["CO", "NO2", "O3", "PM10", "PM25", "AQI", "MaxTemp",
+           "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip",
+           "Wind", "DailyNumFines", "NumPaidFines",
            "TotalFineAmount"]
 measurements = {
     "CO": "PPM 8-hour",
@@ -63,369 +63,308 @@ measurements = {
     "DATE": ""
 }
 
-days = provo["Day"].unique()
+FINES = ["DailyNumFines", "NumPaidFines", "TotalFineAmount"]
 
-selected_metric = st.selectbox("Select a Metric", metrics)
-smoothness = st.slider("Adjust Smoothness*", min_value=1, max_value=180, value=30)
+@st.cache_resource
+def metric_means():
+    #Prefix sums of every metric, overall and per day of the week, for any smoothness (see rolling.py).
+    #The citations of the missing data and COVID days are left out, like they are from the models
+    from training import TRUNCATED
 
-st.write("Smoothness* is calculated as a rolling average over the specified number of days; i.e. a smoothness of 30 indicates a rolling average spanning over 30 days.")
+    provo = load_provo(provo_modified())
+    values = provo[metrics].to_numpy(dtype=float, copy=True)
+    values[:, [metrics.index(fine) for fine in FINES]] = blank(provo, FINES, TRUNCATED)
+    return RollingMeans(values, metrics, groups=provo["Day"])
 
-st.write("Select Days:")
+def key_metrics():
+    st.write('''
+In this analysis I seek to answer whether changes in air quality change transportation incentives for students at my university, Brigham Young University (BYU).
+''')
 
-selected_days = []
+    st.write('''
+To answer this question I combine historical air quality data from the Utah Department of Environmental Quality along with the corresponding colinear weather factors for the corresponding dates.
+To measure how the incentives of university students to drive to school I analyzed and aggregated approximated 150,000 traffic citations distributed from my university from the years 2014-2022.
+         ''')
 
-for day in days:
-    checkbox_value = st.checkbox(f'{day}')
-    if checkbox_value:
-        selected_days.append(day)
+    st.write('''
+This dashboard contains visuals for key elements to exploring the key elements and factors used to distinguishing the "signal from the noise." The goal is to control for all other effects that could otherwise affect the daily number of traffic citations given and isolate the effect that changes in air quality has on students driving to school, and hence, on the number of tickets given out.''')
 
-st.markdown("---")
-separate = st.checkbox("Separate Days by Color")
+    st.markdown("See this [blog post](https://samleebyu.github.io/2023/11/13/byu-traffic-citations/) for how I collected this data")
+    st.markdown("See this [blog post](https://samleebyu.github.io/2023/12/16/byu-traffic-citations-eda) for how I used this data to answer my research question")
+    st.markdown("All relevant code and data is documented on this project's [repository](https://github.com/SamLeeBYU/BYUTrafficCitations)")
 
-metric_plot = None
-if separate:
-    rolling_means = provo[provo["Day"].isin(selected_days)].copy()
-    rolling_means[selected_metric] = rolling_means.groupby("Day")[selected_metric].rolling(window=smoothness).mean().reset_index(drop=True)
-    rolling_means = rolling_means.dropna()
-    metric_plot = px.line(rolling_means, x="DATE", y=selected_metric, color="Day")
-else:
-    rolling_means = provo[provo["Day"].isin(selected_days)].copy()
-    rolling_means[selected_metric] = rolling_means[selected_metric].rolling(window=smoothness).mean()
-    metric_plot = px.line(rolling_means, x="DATE", y=selected_metric)
-ylabel = measurements[selected_metric]
-if len(ylabel) > 0:
-    ylabel = "(" + ylabel + ")"
-metric_plot.update_yaxes(title_text=f"{selected_metric} {ylabel}")
-st.plotly_chart(metric_plot)
+    st.markdown("## Dashboard Guide")
+    for page in PAGES:
+        st.page_link(page)
 
-st.markdown("## Lags of Key Metrics")
+    st.markdown("---")
 
-st.write('''
-With this time series data set, analyze the effect of past values by calculating lags. Each lag is calculated as the values separated by the (previous) corresponding amount of days.
-         ''')
+    st.markdown("## Key Metrics Over Time")
 
-st.markdown("See how lag variables are used in this project on my blog [here](https://samleebyu.github.io/2023/12/16/byu-traffic-citations-eda/#a)")
+    provo = load_provo(provo_modified())
+    days = provo["Day"].unique()
 
-st.markdown("See this [article](https://www.journals.uchicago.edu/doi/full/10.1086/690946) for more information about lagged variables.")
+    selected_metric = st.selectbox("Select a Metric", metrics)
+    smoothness = st.slider("Adjust Smoothness*", min_value=1, max_value=180, value=30)
 
-lags = st.slider("Select # of Lags", min_value=1, max_value=90, value=30)
+    st.write("Smoothness* is calculated as a rolling average over the specified number of days; i.e. a smoothness of 30 indicates a rolling average spanning over 30 days.")
 
-lag_cols = []
+    st.write("Select Days:")
 
-for lag in range(1, lags + 1):
-    lagged_cols = [provo[metric].shift(lag).rename(f"{metric}_Lag{lag}") for metric in metrics]
-    lag_cols.append(pd.concat(lagged_cols, axis=1))
+    selected_days = []
 
-provo = pd.concat([provo] + lag_cols, axis=1)
+    for day in days:
+        checkbox_value = st.checkbox(f'{day}')
+        if checkbox_value:
+            selected_days.append(day)
 
-provo = provo.iloc[lags:]
+    st.markdown("---")
+    separate = st.checkbox("Separate Days by Color")
 
-model = LinearRegression()
+    selected_rows = provo["Day"].isin(selected_days).to_numpy()
+    rolling_means = provo.loc[selected_rows, ["DATE", "Day"]].copy()
 
-lag_metric = st.selectbox("Select a Metric to Analyze the Lags", metrics)
+    metric_plot = None
+    if separate:
+        rolling_means[selected_metric] = metric_means().group_mean(smoothness, selected_metric)[selected_rows]
+        rolling_means = rolling_means.dropna()
+        metric_plot = px.line(rolling_means, x="DATE", y=selected_metric, color="Day")
+    else:
+        rolling_means[selected_metric] = metric_means().mean(smoothness, selected_metric, selected_rows)
+        metric_plot = px.line(rolling_means, x="DATE", y=selected_metric)
+    ylabel = measurements[selected_metric]
+    if len(ylabel) > 0:
+        ylabel = "(" + ylabel + ")"
+    metric_plot.update_yaxes(title_text=f"{selected_metric} {ylabel}")
+    chart(metric_plot)
 
-model.fit(provo[[f"{lag_metric}_Lag{lag}" for lag in range(1, lags+1)]], provo[lag_metric])
-lag_df = {"Lag": range(1, lags+1),
-          "Delta": model.coef_}
-lag_df = pd.DataFrame(lag_df)
+MAX_LAGS = 90
+#The term comparison only uses the days that have every lag of the count picked on the lags page
+DEFAULT_LAGS = 30
 
-lag_plot = px.line(lag_df, x="Lag", y="Delta", title=f"{lag_metric} Regressed on {lags} Lag(s)")
-lag_plot.update_xaxes(title_text = "Lag (Days Behind)")
-lag_plot.update_yaxes(title_text='Coefficient')
+@st.cache_data
+def lag_tables(modified):
+    #The lag coefficients of every metric for every number of lags, solved in one pass (see lagtable.py),
+    #so moving the slider or picking another metric is a lookup
+    from lagtable import coefficient_table
 
-st.plotly_chart(lag_plot)
+    return coefficient_table(load_provo(modified), metrics, MAX_LAGS)
 
-st.markdown("## Analyze Different Metrics by School Term")
+def lag_metrics():
+    from lagtable import lag_curve
 
-st.write("Select Terms:")
-unique_terms = provo["Term"].unique()
+    st.markdown("## Lags of Key Metrics")
 
-selected_terms = []
-for term in unique_terms:
-    checkbox_value = st.checkbox(f'{term}')
-    if checkbox_value:
-        selected_terms.append(term)
+    st.write('''
+With this time series data set, analyze the effect of past values by calculating lags. Each lag is calculated as the values separated by the (previous) corresponding amount of days.
+         ''')
 
-st.markdown("---")
+    st.markdown("See how lag variables are used in this project on my blog [here](https://samleebyu.github.io/2023/12/16/byu-traffic-citations-eda/#a)")
 
-term_metric = st.selectbox("Metric to Analyze: ", metrics)
-y_function = st.text_input(f"Equation to Transform {term_metric}. Ex: log({term_metric})", f"{term_metric}")
-y = symbols(term_metric)
+    st.markdown("See this [article](https://www.journals.uchicago.edu/doi/full/10.1086/690946) for more information about lagged variables.")
 
-y_function = sympify(y_function)
-st.write(y_function)
+    lags = st.slider("Select # of Lags", min_value=1, max_value=MAX_LAGS, value=st.session_state.get("lags", DEFAULT_LAGS))
+    st.session_state["lags"] = lags
 
-metric = st.selectbox("Measure Metric Against: ", ["DATE"]+metrics, index=0)
-x_function = st.text_input(f"Equation to Transform {metric}", f"{metric}")
-x = symbols(metric)
+    lag_metric = st.selectbox("Select a Metric to Analyze the Lags", metrics)
 
-x_function = sympify(x_function)
-st.write(x_function)
+    lag_df = lag_curve(lag_tables(provo_modified())[lag_metric], lags)
 
-term_metrics = provo[provo["Term"].isin(selected_terms)].copy()
+    lag_plot = px.line(lag_df, x="Lag", y="Delta", title=f"{lag_metric} Regressed on {lags} Lag(s)")
+    lag_plot.update_xaxes(title_text = "Lag (Days Behind)")
+    lag_plot.update_yaxes(title_text='Coefficient')
 
-try:
-    if term_metric != "DATE":
-        #st.write(term_metrics[term_metric].apply(lambda z: np.log(z)))
-        term_metrics[term_metric] = term_metrics[term_metric].apply(lambda z: float(y_function.subs(y, z)))
-    if metric != "DATE":
-        term_metrics[metric] = term_metrics[metric].apply(lambda z: float(x_function.subs(x, z)))
-except Exception as e:
-    st.write("Transformation failed.")
-    #st.write(e)
+    chart(lag_plot)
 
-term_metrics_fig = px.scatter(term_metrics, x=metric, y=term_metric, color="Term", color_discrete_sequence=["#4d8ebd", "#af8a82", "#7a9c51", "#e58c1e"],
-                              title=f"{term_metric} vs. {metric}")
-ylabel = measurements[term_metric]
-if len(ylabel) > 0:
-    ylabel = "(" + ylabel + ")"
-xlabel = measurements[metric]
-if len(xlabel) > 0:
-    xlabel = "(" + xlabel + ")"
+def term_metrics():
+    #sympy is only loaded once this page is opened
+    from transforms import compile_transform, apply_transform, TransformError
 
-term_metrics_fig.update_yaxes(title_text=f"{term_metric} {ylabel}")
-term_metrics_fig.update_xaxes(title_text=f"{metric} {xlabel}")
+    def show_transform(expression, variable):
+        try:
+            st.write(compile_transform(expression, variable)[0])
+        except TransformError as e:
+            st.write(f"Transformation failed: {e}")
 
-st.plotly_chart(term_metrics_fig)
+    def transform(data, column, expression):
+        #Transforms the column in place (see transforms.py); values outside the equation's domain are left out of the plot
+        try:
+            data[column], undefined = apply_transform(expression, column, data[column])
+        except TransformError:
+            return
+        if undefined > 0:
+            st.write(f"{expression} is undefined for {undefined} of the {len(data)} values of {column}; they are left out.")
 
-st.write(f"R-squared: {term_metrics[term_metric].corr(term_metrics[metric])**2}")
+    st.markdown("## Analyze Different Metrics by School Term")
 
-################################################################################################################
+    #Only the days that have every lag
+    lags = st.session_state.get("lags", DEFAULT_LAGS)
+    provo = load_provo(provo_modified()).iloc[lags:]
 
-st.markdown("---")
+    st.write("Select Terms:")
+    unique_terms = provo["Term"].unique()
 
-st.markdown("## The Model")
+    selected_terms = []
+    for term in unique_terms:
+        checkbox_value = st.checkbox(f'{term}')
+        if checkbox_value:
+            selected_terms.append(term)
 
-st.markdown('''
-In the end I computed three main models to help me decipher the effect that environmental factors had on daily fluctuations in traffic citations:
-         
-1) A multilinear regression model using lasso variable selection methods. Due to time series dependency, a series of lag variable and lag interaction terms are also included in the regression.
-2) A multilinear regression using first differences to account for the time series dependence. A lasso regression was also used here to select the appropriate variables. Additionally, due to non-normality of the residuals, robust linear regression was performed.
-3) A random forest model across all factors for optimal prediction.
-         ''')
+    st.markdown("---")
 
-st.markdown("A summary of the model findings are found [here](https://samleebyu.github.io/2023/12/16/byu-traffic-citations-eda/#e)")
-
-provo = pd.read_csv("Provo.csv")
-provo["DATE"] = pd.to_datetime(provo["DATE"])
-
-recompile_models = st.button("Recompile Models")
-
-fileExists = False
-predictions = pd.DataFrame()
-
-try:
-    predictions = pd.read_csv("predictions.csv")
-    fileExists = True
-except Exception as e:
-    fileExists = False
-
-if not fileExists or recompile_models:
-    model_factors = ["MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip",
-                    "Wind", "CO", "NO2", "O3", "PM10", "PM25", "AQI", "Mon", 
-                    "Tues", "Wed", "Thurs", "Fri", "Sun", "FullTime", 
-                    "Holiday", "Exam", "February", "March", "April", "May", 
-                    "June", "July", "August", "September", "October", "November",
-                    "December", "Spring", "Summer", "Fall", "DailyNumFines_Lag1",
-                    "DailyNumFines_Lag7",
-                    "DailyNumFines_Lag14", "DailyNumFines_Lag21", 
-                    "DailyNumFines_Lag28"]
-
-    lags = [1, 7, 14, 21, 28]
-
-    provo['log_DailyNumFines'] = np.log(provo['DailyNumFines'] + 1)
-    for lag in lags:
-        provo[f'DailyNumFines_Lag{lag}'] = provo['DailyNumFines'].shift(lag)
-
-    # Missing Data
-    end_date = "2019-04-23"
-    begin_date = "2017-03-08"
-
-    # COVID
-    covid_begin_date = "2020-03-14"
-    covid_end_date = "2020-09-07"
-
-    def truncate_provo(p):
-        return p[~((p['DATE'] >= pd.to_datetime(begin_date)) & (p['DATE'] <= pd.to_datetime(end_date)) |
-                (p['DATE'] >= pd.to_datetime(covid_begin_date)) & (p['DATE'] <= pd.to_datetime(covid_end_date)))]
-
-
-    # Add dummy variables
-    provo = pd.concat([provo, pd.get_dummies(provo["Term"])], axis=1)
-
-    log_factors = ["RainPrecip", "SnowPrecip", "Wind", "NO2", "PM10", "PM25", "AQI", "FullTime"]
-
-    # Log transformation for log factors
-    for factor in log_factors:
-        provo[factor] = np.log(provo[factor] + 1)
-
-    polynomial_factors = ["MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip",
-                        "Wind", "CO", "NO2", "O3", "PM10", "PM25", "AQI",
-                        "FullTime", "DailyNumFines_Lag1",
-                        "DailyNumFines_Lag7",
-                        "DailyNumFines_Lag14", "DailyNumFines_Lag21", 
-                        "DailyNumFines_Lag28"]
-
-    for factor in polynomial_factors:
-        provo[f'{factor}_2'] = provo[factor]**2
-        
-    polynomial_factors = [f'{factor}_2' for factor in polynomial_factors]
-
-    env_lag_factors = []
+    term_metric = st.selectbox("Metric to Analyze: ", metrics)
+    y_function = st.text_input(f"Equation to Transform {term_metric}. Ex: log({term_metric})", f"{term_metric}")
+    show_transform(y_function, term_metric)
 
-    def add_interaction_factors():
-        global provo
-        interaction_factors = []
+    metric = st.selectbox("Measure Metric Against: ", ["DATE"]+metrics, index=0)
+    x_function = st.text_input(f"Equation to Transform {metric}", f"{metric}")
+    show_transform(x_function, metric)
 
-        env_factors = ["MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip",
-                    "Wind", "CO", "NO2", "O3", "PM10", "PM25", "AQI"]
+    term_metrics = provo[provo["Term"].isin(selected_terms)].copy()
 
-        days = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sun"]
+    if term_metric != "DATE":
+        transform(term_metrics, term_metric, y_function)
+    if metric != "DATE":
+        transform(term_metrics, metric, x_function)
 
-        months = ["February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
-        # Create dummy variables for months
-        for month in months:
-            col = provo['Month'] == month
-            col.name = month
-            provo = pd.concat([provo, col], axis=1)
-        seasons = ["Spring", "Summer", "Fall"]
-        lag_factors = ["DailyNumFines_Lag1", "DailyNumFines_Lag7", "DailyNumFines_Lag14", "DailyNumFines_Lag21", "DailyNumFines_Lag28"]
+    term_metrics_fig = px.scatter(term_metrics, x=metric, y=term_metric, color="Term", color_discrete_sequence=["#4d8ebd", "#af8a82", "#7a9c51", "#e58c1e"],
+                                  title=f"{term_metric} vs. {metric}")
+    ylabel = measurements[term_metric]
+    if len(ylabel) > 0:
+        ylabel = "(" + ylabel + ")"
+    xlabel = measurements[metric]
+    if len(xlabel) > 0:
+        xlabel = "(" + xlabel + ")"
 
-        combinations = [(x, y) for i, x in enumerate(env_factors) for y in env_factors[i + 1:]]
-        for combination in combinations:
-            factor = '_'.join(combination)
-            interaction_factors.append(factor)
-            col = provo[combination[0]] * provo[combination[1]]
-            col.name = factor
-            provo = pd.concat([provo, col], axis=1)
+    term_metrics_fig.update_yaxes(title_text=f"{term_metric} {ylabel}")
+    term_metrics_fig.update_xaxes(title_text=f"{metric} {xlabel}")
 
-        for day in days:
-            factor = f'{day}_DailyNumFines_Lag1'
-            env_lag_factors.append(factor)
-            interaction_factors.append(factor)
-            col = provo[day] * provo['DailyNumFines_Lag1']
-            col.name = factor
-            provo = pd.concat([provo, col], axis=1)
+    chart(term_metrics_fig)
 
-        for env_factor in env_factors:
-            for lag_factor in lag_factors:
-                factor = f'{env_factor}_{lag_factor}'
-                env_lag_factors.append(factor)
-                interaction_factors.append(factor)
-                col = provo[env_factor] * provo[lag_factor]
-                col.name = factor
-                provo = pd.concat([provo, col], axis=1)
+    st.write(f"R-squared: {term_metrics[term_metric].corr(term_metrics[metric])**2}")
 
-            for month in months:
-                factor = f'{env_factor}_{month}'
-                interaction_factors.append(factor)
-                col = provo[env_factor] * provo[month]
-                col.name = factor
-                provo = pd.concat([provo, col], axis=1)
+################################################################################################################
 
-            for season in seasons:
-                factor = f'{env_factor}_{season}'
-                interaction_factors.append(factor)
-                col = provo[env_factor] * provo[season]
-                col.name = factor
-                provo = pd.concat([provo, col], axis=1)
+@st.cache_resource
+def trainer():
+    #One trainer per server process, shared by every session, so a retrain is never started twice
+    from training import Trainer
 
-        return interaction_factors
+    return Trainer()
 
-    interaction_factors = add_interaction_factors()
+@st.cache_data
+def provo_key(modified):
+    #Hash of the data and model settings the saved models are stored under (see training.py)
+    from training import artifact_key
 
-    model_factors = model_factors + interaction_factors + polynomial_factors
+    return artifact_key(load_provo(modified))
 
-    provo_truncated = truncate_provo(provo)
+@st.cache_data
+def load_predictions(path, modified):
+    return pd.read_csv(path, parse_dates=["DATE"])
 
-    lasso_factors = [
-        "NO2", "AQI", "CO", "SnowPrecip", "MinTemp", "MaxTemp", "Mon", "Tues", "Wed", "Thurs", "Fri", "Sun", "FullTime", "Holiday", "Exam", "DailyNumFines_Lag1", "DailyNumFines_Lag14", "DailyNumFines_Lag21", "February", "May", "November", "Spring", "Fall", "RainPrecip", "December", "Wind", "DailyNumFines_Lag7", "August", "O3", "PM10", "DailyNumFines_Lag28", "PM25", "July",
-        "SnowPrecip_CO", "Mon_DailyNumFines_Lag1", "Tues_DailyNumFines_Lag1", "Wed_DailyNumFines_Lag1", "Thurs_DailyNumFines_Lag1", "Fri_DailyNumFines_Lag1", "Sun_DailyNumFines_Lag1",
-        "MinTemp_DailyNumFines_Lag1", "MaxTemp_DailyNumFines_Lag14", "MaxTemp_DailyNumFines_Lag21", "MinTemp_February", "MinTemp_May", "MinTemp_November", "MinTemp_Spring", "MinTemp_Fall", "RainPrecip_May", "RainPrecip_December", "SnowPrecip_DailyNumFines_Lag1", "SnowPrecip_DailyNumFines_Lag14", "SnowPrecip_DailyNumFines_Lag21",
-        "SnowPrecip_February", "Wind_DailyNumFines_Lag7", "Wind_DailyNumFines_Lag14", "Wind_Summer", "CO_August", "CO_November", "NO2_August", "O3_DailyNumFines_Lag7", "O3_DailyNumFines_Lag14", "O3_May", "PM10_DailyNumFines_Lag21", "PM10_DailyNumFines_Lag28", "PM25_July", "PM25_December", "CO_2", "FullTime_2", "DailyNumFines_Lag1_2", "DailyNumFines_Lag7_2"
-    ]
+SERIES = ["DailyNumFines", "LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]
 
-    provo_lasso = model.fit(provo_truncated[lasso_factors].iloc[np.max(lags):], provo_truncated["log_DailyNumFines"].iloc[np.max(lags):])
+@st.cache_resource
+def prediction_means(path, modified):
+    #Prefix sums of the fines and the (rounded) predictions; the missing data and COVID days are left out
+    from training import TRUNCATED
 
-    provo["FirstDifferencePrediction"] = None
-    provo["LassoPrediction"] = None
-    provo["RFPrediction"] = None
+    predictions = load_predictions(path, modified).copy()
+    for m in ["LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]:
+        predictions[m] = np.maximum(np.round(predictions[m]), [0])
+    return RollingMeans(blank(predictions, SERIES, TRUNCATED), SERIES)
 
-    provo.loc[np.max(lags):, "LassoPrediction"] = np.exp(provo_lasso.predict(provo[lasso_factors].iloc[max(lags):]))-1
+def model():
+    st.markdown("## The Model")
 
-    difference = 1
+    st.markdown('''
+In the end I computed three main models to help me decipher the effect that environmental factors had on daily fluctuations in traffic citations:
 
-    difference_factors = [
-        "NO2", "Mon", "Tues", "Wed", "Thurs", "Fri", "Sun", "Holiday", "Exam", "MaxTemp", "PM25", "MinTemp", "MeanTemp", "RainPrecip", "CO", "SnowPrecip", "Wind", "O3", "AQI", "October", "December", "June", "Wind", "April",  "May", "August", "Spring", "Summer", "PM10", "September", "February",
-        "MaxTemp_PM25", "MinTemp_MeanTemp", "RainPrecip_CO", "SnowPrecip_CO", "Wind_NO2", "NO2_O3", "PM25_AQI", "MeanTemp_October", "RainPrecip_December", "SnowPrecip_June", "Wind_April", "Wind_May", "CO_April", "CO_August", "CO_December", "CO_Spring", "NO2_August",
-        "NO2_Spring", "NO2_Summer", "PM10_April", "PM10_June", "PM10_September", "PM10_December", "AQI_February", "SnowPrecip_2"
-    ]
+1) A multilinear regression model using lasso variable selection methods. Due to time series dependency, a series of lag variable and lag interaction terms are also included in the regression.
+2) A multilinear regression using first differences to account for the time series dependence. A lasso regression was also used here to select the appropriate variables. Additionally, due to non-normality of the residuals, robust linear regression was performed.
+3) A random forest model across all factors for optimal prediction.
+         ''')
 
-    for factor in ["log_DailyNumFines"] + difference_factors:
-        col = provo[factor]-provo[factor].shift(difference)
-        col.name = factor + "_change"
-        provo_truncated = pd.concat([provo_truncated, col], axis=1)
-        provo = pd.concat([provo, col], axis=1)
+    st.markdown("A summary of the model findings are found [here](https://samleebyu.github.io/2023/12/16/byu-traffic-citations-eda/#e)")
 
-    difference_factors = [factor + "_change" for factor in difference_factors]
+    recompile_models = st.button("Recompile Models")
 
-    provo_first_difference = model.fit(provo_truncated[difference_factors].iloc[difference:], provo_truncated["log_DailyNumFines_change"].iloc[difference:])
+    key = provo_key(provo_modified())
+    if recompile_models:
+        trainer().submit(load_provo(provo_modified()), key, force=True)
+    elif not trainer().has(key):
+        trainer().submit(load_provo(provo_modified()), key)
 
-    provo.loc[difference:, "FirstDifferencePrediction"] = np.exp(provo_first_difference.predict(provo[difference_factors].iloc[difference:]) + np.log(provo["DailyNumFines"].shift(difference) + 1).iloc[1:])-1
+    if trainer().training(key):
+        st.write("The models are being fit in the background. Reload the page once they are done to see their predictions.")
+    elif trainer().error(key) is not None:
+        st.error(f"Fitting the models failed: {trainer().error(key)}")
 
-    rf = RandomForestRegressor(n_estimators=100, random_state=1120)
-    rf.fit(provo[model_factors].iloc[max(lags):], provo["log_DailyNumFines"].iloc[max(lags):])
+    #The models saved for this data, or the last predictions made until they are done
+    predictions_path = trainer().path(key, "predictions.csv") if trainer().has(key) else trainer().last_predictions()
+    if not os.path.exists(predictions_path):
+        return
+    predictions = load_predictions(predictions_path, os.path.getmtime(predictions_path))
 
-    provo.loc[np.max(lags):, "RFPrediction"] = np.exp(rf.predict(provo[model_factors].iloc[max(lags):]))-1
+    col1, col2 = st.columns(2)
 
-    predictions = provo[["DATE", "DailyNumFines", "LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]]
-    predictions.to_csv("predictions.csv", index=False)
+    with col1:
+        selected_year = st.selectbox("Select a Year", ["All"]+(np.unique(predictions["DATE"].dt.year)).tolist(), index=0)
 
-predictions["DATE"] = pd.to_datetime(predictions["DATE"])
-
-col1, col2 = st.columns(2)
+    with col2:
+        selected_term = st.selectbox("Select a Term", ["All"]+(np.unique(predictions["Term"]).tolist()), index=0)
 
-with col1:
-    selected_year = st.selectbox("Select a Year", ["All"]+(np.unique(predictions["DATE"].dt.year)).tolist(), index=0)
+    if selected_year == "All":
+        selected_year = np.unique(predictions["DATE"].dt.year).tolist()
+    else:
+        selected_year = [int(selected_year)]
 
-with col2:
-    selected_term = st.selectbox("Select a Term", ["All"]+(np.unique(predictions["Term"]).tolist()), index=0)
+    if selected_term == "All":
+        selected_term = np.unique(predictions["Term"]).tolist()
+    else:
+        selected_term = [selected_term]
 
-if selected_year == "All":
-    selected_year = np.unique(predictions["DATE"].dt.year).tolist()
-else:
-    selected_year = [int(selected_year)]
+    model_smoothness = st.slider("Adjust Smoothness", min_value=1, max_value=180, value=30)
 
-if selected_term == "All":
-    selected_term = np.unique(predictions["Term"]).tolist()
-else:
-    selected_term = [selected_term]
+    selected_rows = ((predictions["DATE"].dt.year.isin(selected_year)) & (predictions["Term"].isin(selected_term))).to_numpy()
+    if selected_rows.all():
+        #Everything is selected, so the precomputed sums can be used as they are
+        selected_rows = None
 
-model_smoothness = st.slider("Adjust Smoothness", min_value=1, max_value=180, value=30)
+    means = prediction_means(predictions_path, os.path.getmtime(predictions_path))
+    rolling_means = pd.DataFrame({m: means.mean(model_smoothness, m, selected_rows) for m in SERIES})
+    rolling_means["DATE"] = predictions["DATE"].to_numpy() if selected_rows is None else predictions.loc[selected_rows, "DATE"].to_numpy()
+    rolling_means = rolling_means.iloc[(model_smoothness-1):].copy()
 
-predictions = predictions[(predictions["DATE"].dt.year.isin(selected_year)) & (predictions["Term"].isin(selected_term))].copy()
+    st.write("\# of Daily Fines Over Time")
+    predictive_plot = px.line(rolling_means, x="DATE", y="DailyNumFines", color_discrete_sequence=["#ff97ff"])
+    predictive_plot.update_yaxes(title_text="Daily # of Fines")
 
-for m in ["LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]:
-    predictions[m] = np.maximum(np.round(predictions[m]), [0])
+    for m in ["LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]:
+        label = ""
+        if m == "LassoPrediction":
+            label = "Multilinear Model (w/ Weekly Lags)"
+        elif m == "FirstDifferencePrediction":
+            label = "First Differences"
+        else:
+            label = "Random Forest"
 
-rolling_means = predictions[["DailyNumFines", "LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]].rolling(window=model_smoothness).mean().reset_index(drop=True)
-rolling_means["DATE"] = predictions["DATE"].reset_index(drop=True)
-rolling_means = rolling_means.iloc[(model_smoothness-1):].copy()
+        predictive_plot.add_scatter(x=rolling_means["DATE"], y=rolling_means[m], mode='lines', name=label)
 
-st.write("\# of Daily Fines Over Time")
-predictive_plot = px.line(rolling_means, x="DATE", y="DailyNumFines", color_discrete_sequence=["#ff97ff"])
-predictive_plot.update_yaxes(title_text="Daily # of Fines")
+    chart(predictive_plot)
 
-for m in ["LassoPrediction", "FirstDifferencePrediction", "RFPrediction"]:
-    label = ""
-    if m == "LassoPrediction":
-        label = "Multilinear Model (w/ Weekly Lags)"
-    elif m == "FirstDifferencePrediction":
-        label = "First Differences"
-    else:
-        label = "Random Forest"
+PAGES = [
+    st.Page(key_metrics, title="Key Metrics Over Time", url_path="key-metrics-over-time", default=True),
+    st.Page(lag_metrics, title="Time Series Dependence Analysis", url_path="lags-of-key-metrics"),
+    st.Page(term_metrics, title="Compare Different Metrics", url_path="analyze-different-metrics-by-school-term"),
+    st.Page(model, title="Time Series Modeling", url_path="the-model"),
+]
 
-    predictive_plot.add_scatter(x=rolling_means["DATE"], y=rolling_means[m], mode='lines', name=label)
+st.title("How Parking Demand Changes in Response to Environmental Factors")
 
-st.plotly_chart(predictive_plot)
+page = st.navigation(PAGES)
+page.run()
 
+mark("complete")
+st.session_state["timings"] = {"page": page.title, **TIMINGS}
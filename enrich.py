@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+
+from pipeline import read_chunks, CHUNKSIZE
+
+#Attaches the air quality and weather readings at the time of every citation, instead of merging hourly readings
+#on derived date/hour columns (Air Quality.ipynb) or daily weather onto every row (Weather.ipynb). Each source is
+#sorted by time once; every chunk of citations is matched to the latest reading at or before its time, within a
+#tolerance (an hourly reading covers its hour, a daily one its day), with searchsorted over datetime64 arrays.
+#Citations are read, enriched and written a chunk at a time, so memory doesn't grow with the number of citations.
+#
+#   python enrich.py --citations ParkingCitationsEncrypted.csv --air-quality aq_hourly.csv --weather weather.json --output enriched.csv
+
+class Readings():
+    #The readings of one source, sorted by time
+
+    def __init__(self, times, values, tolerance, prefix="", daily=False):
+        times = pd.to_datetime(pd.Series(times)).to_numpy(dtype="datetime64[ns]")
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        values = values.reset_index(drop=True).iloc[order]
+        self.values = {prefix + str(col): values[col].to_numpy() for col in values.columns}
+        self.tolerance = pd.Timedelta(tolerance).to_timedelta64()
+        #Daily readings are matched on the citation's date, so citations without a time still get them
+        self.daily = daily
+
+    def rows(self, times):
+        #Row of the latest reading at or before each (sorted) time and less than the tolerance before it; -1 where none
+        i = np.searchsorted(self.times, times, side="right") - 1
+        found = (i >= 0) & ~np.isnat(times)
+        found[found] &= (times[found] - self.times[i[found]]) < self.tolerance
+        return np.where(found, i, -1)
+
+    def join(self, times):
+        #The readings matched to every time, as columns in the order of the times
+        order = np.argsort(times, kind="stable")
+        rows = np.empty(len(times), dtype=int)
+        rows[order] = self.rows(times[order])
+        missing = rows < 0
+        columns = {}
+        for col, values in self.values.items():
+            matched = values[np.maximum(rows, 0)] if len(values) else np.full(len(rows), np.nan)
+            if missing.any():
+                matched = matched.astype(float if matched.dtype.kind in "iufb" else object)
+                matched[missing] = np.nan
+            columns[col] = matched
+        return columns
+
+def load(path):
+    #Records of a .csv file, or of a .json file laid out like the API responses ("daily" lists or "data" records)
+    if not path.endswith(".json"):
+        return pd.read_csv(path)
+    with open(path) as f:
+        payload = json.load(f)
+    return pd.DataFrame(payload["daily"] if "daily" in payload else payload["data"])
+
+def air_quality(records, tolerance="1h", columns=("aqi", "co", "no2", "o3", "pm10", "pm25")):
+    #Hourly Weatherbit air quality (see fetcher.py); the reading of hour h covers h:00 through h:59
+    records = load(records) if isinstance(records, str) else records
+    times = pd.to_datetime(records["datetime"], format='%Y-%m-%d:%H')
+    return Readings(times, records[[c for c in columns if c in records]], tolerance)
+
+def weather(records, tolerance="1D"):
+    #Daily Open-Meteo weather (weather.json, see fetcher.py)
+    records = load(records) if isinstance(records, str) else records
+    return Readings(pd.to_datetime(records["time"]), records.drop(columns=["time"]), tolerance, daily=True)
+
+def time_of_day(values):
+    #Times like 01:37 PM (see main.clean_data) as offsets from midnight, NaT where missing or unreadable.
+    #The fixed layout is read straight from the characters' bytes, which is far faster than parsing every string
+    text = pd.Series(values).astype("string").fillna("").str.strip()
+    #Only ASCII can be turned into bytes; the other rows are blanked here and left to the fallback below
+    ascii = ~text.str.contains(r"[^\x00-\x7f]", regex=True).to_numpy(dtype=bool)
+    fast = text.where(ascii, "")
+    codes = np.frombuffer(fast.to_numpy(dtype="S8").tobytes(), dtype=np.uint8).reshape(-1, 8).astype(int)
+    digits = codes[:, [0, 1, 3, 4]] - ord("0")
+    hour, minute = digits[:, 0]*10 + digits[:, 1], digits[:, 2]*10 + digits[:, 3]
+    valid = (((digits >= 0) & (digits <= 9)).all(axis=1) & (codes[:, 2] == ord(":")) & (codes[:, 5] == ord(" "))
+             & np.isin(codes[:, 6], [ord("A"), ord("P")]) & (codes[:, 7] == ord("M"))
+             & (hour >= 1) & (hour <= 12) & (minute < 60) & (fast.str.len() == 8).to_numpy(dtype=bool))
+    minutes = (hour % 12 + 12*(codes[:, 6] == ord("P")))*60 + minute
+    offsets = (minutes*60).astype("timedelta64[s]").astype("timedelta64[ns]")
+    offsets[~valid] = np.timedelta64("NaT")
+    #Anything else (i.e. 1:37 PM) is left to pandas
+    other = ~valid & (text != "").to_numpy(dtype=bool)
+    if other.any():
+        clock = pd.to_datetime(text[other], format='%I:%M %p', errors="coerce")
+        offsets[other] = (clock - clock.dt.normalize()).to_numpy(dtype="timedelta64[ns]")
+    return offsets
+
+def citation_times(citations):
+    #Issue date (midnight) and issue time of every citation as datetime64; the time is NaT where it's unknown
+    dates = pd.to_datetime(citations["IssuedDate"]).dt.normalize().to_numpy(dtype="datetime64[ns]")
+    if "IssuedTime" not in citations:
+        return dates, np.full(len(citations), np.datetime64("NaT"), dtype="datetime64[ns]")
+    return dates, dates + time_of_day(citations["IssuedTime"])
+
+def enrich_chunk(citations, sources):
+    dates, times = citation_times(citations)
+    columns = {}
+    for readings in sources:
+        columns.update(readings.join(dates if readings.daily else times))
+    return pd.concat([citations.reset_index(drop=True), pd.DataFrame(columns)], axis=1)
+
+def enrich(chunks, sources):
+    #Yields every chunk of citations with the readings of the sources
+    for citations in chunks:
+        yield enrich_chunk(citations, sources)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attach the air quality and weather at the time of every citation")
+    parser.add_argument("--citations", required=True, help="Citation CSV file or Parquet store directory")
+    parser.add_argument("--air-quality", default=None, help="Hourly Weatherbit records (.csv or .json)")
+    parser.add_argument("--weather", default=None, help="Daily Open-Meteo weather, i.e. weather.json")
+    parser.add_argument("--air-quality-tolerance", default="1h")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Citations enriched at a time")
+    args = parser.parse_args()
+
+    sources = []
+    if args.air_quality:
+        sources.append(air_quality(args.air_quality, args.air_quality_tolerance))
+    if args.weather:
+        sources.append(weather(args.weather))
+
+    rows = 0
+    for i, chunk in enumerate(enrich(read_chunks(args.citations, args.chunksize, columns=None), sources)):
+        chunk.to_csv(args.output, index=False, mode="w" if i == 0 else "a", header=i == 0)
+        rows += len(chunk)
+    print(f"{rows} citations written to {args.output}")
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import argparse
+
+from schema import read_provo
+
+#The factors the dashboard's models are fit on, described as a spec instead of built up column by column.
+#Every factor has a kind (a column of Provo.csv, a log, lag, dummy, power, product or first difference)
+#and the factors or columns it is computed from. build_matrix only computes the factors a model asks for
+#(and whatever those are computed from) and writes them into one preallocated matrix.
+#
+#   from features import build_matrix, LASSO_FACTORS
+#   X = build_matrix(read_provo("Provo.csv"), LASSO_FACTORS)
+
+class Column():
+    #A column of the data as is
+    def __init__(self, column):
+        self.column = column
+
+    def compute(self, data, factor):
+        return data[self.column].to_numpy(dtype=float)
+
+class Log():
+    #log(column + 1)
+    def __init__(self, column):
+        self.column = column
+
+    def compute(self, data, factor):
+        return np.log(data[self.column].to_numpy(dtype=float) + 1)
+
+class Lag():
+    #The column lag days before (NaN for the first lag days)
+    def __init__(self, column, lag):
+        self.column = column
+        self.lag = lag
+
+    def compute(self, data, factor):
+        return data[self.column].shift(self.lag).to_numpy(dtype=float)
+
+class Dummy():
+    #1 where the column equals value, 0 elsewhere
+    def __init__(self, column, value):
+        self.column = column
+        self.value = value
+
+    def compute(self, data, factor):
+        return (data[self.column] == self.value).to_numpy(dtype=float)
+
+class Power():
+    #A factor raised to a power
+    def __init__(self, factor, power):
+        self.factor = factor
+        self.power = power
+
+    def compute(self, data, factor):
+        return factor(self.factor)**self.power
+
+class Product():
+    #Interaction of two factors
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def compute(self, data, factor):
+        return factor(self.left)*factor(self.right)
+
+class Difference():
+    #A factor minus its value difference days before
+    def __init__(self, factor, difference=1):
+        self.factor = factor
+        self.difference = difference
+
+    def compute(self, data, factor):
+        values = factor(self.factor)
+        change = np.full_like(values, np.nan)
+        change[self.difference:] = values[self.difference:] - values[:-self.difference]
+        return change
+
+ENV_FACTORS = ["MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip",
+               "Wind", "CO", "NO2", "O3", "PM10", "PM25", "AQI"]
+LOG_FACTORS = ["RainPrecip", "SnowPrecip", "Wind", "NO2", "PM10", "PM25", "AQI", "FullTime"]
+DAYS = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sun"]
+MONTHS = ["February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+TERMS = ["Winter", "Spring", "Summer", "Fall"]
+SEASONS = ["Spring", "Summer", "Fall"]
+LAGS = [1, 7, 14, 21, 28]
+LAG_FACTORS = [f"DailyNumFines_Lag{lag}" for lag in LAGS]
+POLYNOMIAL_FACTORS = ENV_FACTORS + ["FullTime"] + LAG_FACTORS
+
+SPEC = {}
+for column in ENV_FACTORS + DAYS + ["FullTime", "Holiday", "Exam", "DailyNumFines"]:
+    SPEC[column] = Column(column)
+#Skewed factors are modeled on a log scale, including everything computed from them
+for column in LOG_FACTORS:
+    SPEC[column] = Log(column)
+SPEC["log_DailyNumFines"] = Log("DailyNumFines")
+for lag in LAGS:
+    SPEC[f"DailyNumFines_Lag{lag}"] = Lag("DailyNumFines", lag)
+for term in TERMS:
+    SPEC[term] = Dummy("Term", term)
+#Month is stored as a number, so these never match; kept as the models were fit this way
+for month in MONTHS:
+    SPEC[month] = Dummy("Month", month)
+for factor in POLYNOMIAL_FACTORS:
+    SPEC[f"{factor}_2"] = Power(factor, 2)
+
+INTERACTION_FACTORS = []
+def interaction(left, right):
+    SPEC[f"{left}_{right}"] = Product(left, right)
+    INTERACTION_FACTORS.append(f"{left}_{right}")
+
+for i, x in enumerate(ENV_FACTORS):
+    for y in ENV_FACTORS[i + 1:]:
+        interaction(x, y)
+for day in DAYS:
+    interaction(day, "DailyNumFines_Lag1")
+for env_factor in ENV_FACTORS:
+    for other in LAG_FACTORS + MONTHS + SEASONS:
+        interaction(env_factor, other)
+
+MODEL_FACTORS = ENV_FACTORS + DAYS + ["FullTime", "Holiday", "Exam"] + MONTHS + SEASONS + LAG_FACTORS
+MODEL_FACTORS = MODEL_FACTORS + INTERACTION_FACTORS + [f"{factor}_2" for factor in POLYNOMIAL_FACTORS]
+
+LASSO_FACTORS = [
+    "NO2", "AQI", "CO", "SnowPrecip", "MinTemp", "MaxTemp", "Mon", "Tues", "Wed", "Thurs", "Fri", "Sun", "FullTime", "Holiday", "Exam", "DailyNumFines_Lag1", "DailyNumFines_Lag14", "DailyNumFines_Lag21", "February", "May", "November", "Spring", "Fall", "RainPrecip", "December", "Wind", "DailyNumFines_Lag7", "August", "O3", "PM10", "DailyNumFines_Lag28", "PM25", "July",
+    "SnowPrecip_CO", "Mon_DailyNumFines_Lag1", "Tues_DailyNumFines_Lag1", "Wed_DailyNumFines_Lag1", "Thurs_DailyNumFines_Lag1", "Fri_DailyNumFines_Lag1", "Sun_DailyNumFines_Lag1",
+    "MinTemp_DailyNumFines_Lag1", "MaxTemp_DailyNumFines_Lag14", "MaxTemp_DailyNumFines_Lag21", "MinTemp_February", "MinTemp_May", "MinTemp_November", "MinTemp_Spring", "MinTemp_Fall", "RainPrecip_May", "RainPrecip_December", "SnowPrecip_DailyNumFines_Lag1", "SnowPrecip_DailyNumFines_Lag14", "SnowPrecip_DailyNumFines_Lag21",
+    "SnowPrecip_February", "Wind_DailyNumFines_Lag7", "Wind_DailyNumFines_Lag14", "Wind_Summer", "CO_August", "CO_November", "NO2_August", "O3_DailyNumFines_Lag7", "O3_DailyNumFines_Lag14", "O3_May", "PM10_DailyNumFines_Lag21", "PM10_DailyNumFines_Lag28", "PM25_July", "PM25_December", "CO_2", "FullTime_2", "DailyNumFines_Lag1_2", "DailyNumFines_Lag7_2"
+]
+
+DIFFERENCE_FACTORS = [
+    "NO2", "Mon", "Tues", "Wed", "Thurs", "Fri", "Sun", "Holiday", "Exam", "MaxTemp", "PM25", "MinTemp", "MeanTemp", "RainPrecip", "CO", "SnowPrecip", "Wind", "O3", "AQI", "October", "December", "June", "April",  "May", "August", "Spring", "Summer", "PM10", "September", "February",
+    "MaxTemp_PM25", "MinTemp_MeanTemp", "RainPrecip_CO", "SnowPrecip_CO", "Wind_NO2", "NO2_O3", "PM25_AQI", "MeanTemp_October", "RainPrecip_December", "SnowPrecip_June", "Wind_April", "Wind_May", "CO_April", "CO_August", "CO_December", "CO_Spring", "NO2_August",
+    "NO2_Spring", "NO2_Summer", "PM10_April", "PM10_June", "PM10_September", "PM10_December", "AQI_February", "SnowPrecip_2"
+]
+for factor in ["log_DailyNumFines"] + DIFFERENCE_FACTORS:
+    SPEC[f"{factor}_change"] = Difference(factor)
+DIFFERENCE_FACTORS = [f"{factor}_change" for factor in DIFFERENCE_FACTORS]
+
+MODELS = {
+    "lasso": LASSO_FACTORS,
+    "difference": DIFFERENCE_FACTORS,
+    "rf": MODEL_FACTORS,
+}
+
+def build_matrix(data, factors, dtype=np.float32, spec=SPEC):
+    #Computes the factors into the columns of one (days x factors) matrix; factors that are only needed to
+    #compute others are kept (at full precision) while the matrix is built and then dropped
+    computed = {}
+    def factor(name):
+        if name not in computed:
+            computed[name] = spec[name].compute(data, factor)
+        return computed[name]
+
+    matrix = np.empty((len(data), len(factors)), dtype=dtype)
+    for j, name in enumerate(factors):
+        matrix[:, j] = factor(name)
+    return matrix
+
+def build_frame(data, factors, dtype=np.float32, spec=SPEC):
+    #The same as a DataFrame, for the notebooks
+    return pd.DataFrame(build_matrix(data, factors, dtype, spec), columns=factors, index=data.index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the factors a model is fit on")
+    parser.add_argument("model", nargs="?", choices=list(MODELS), default="rf")
+    parser.add_argument("--data", default="Provo.csv")
+    parser.add_argument("--output", default=None, help="Save the factors to a .csv or .npy file")
+    parser.add_argument("--list", action="store_true", help="Only print the names of the model's factors")
+    args = parser.parse_args()
+
+    factors = MODELS[args.model]
+    if args.list:
+        print("\n".join(factors))
+    else:
+        data = read_provo(args.data)
+        if args.output is None or args.output.endswith(".csv"):
+            features = build_frame(data, factors)
+            features.insert(0, "DATE", data["DATE"])
+            if args.output is None:
+                print(features)
+            else:
+                features.to_csv(args.output, index=False)
+        else:
+            np.save(args.output, build_matrix(data, factors))
+        print(f"{len(factors)} factors for {len(data)} days")
@@ -0,0 +1,220 @@
+import pandas as pd
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+
+import aiohttp
+
+#Fetches the daily weather history (Open-Meteo, as in Weather.ipynb) and the hourly air quality history
+#(Weatherbit, as in Air Quality.ipynb) for Provo. A date range is split into windows the size each API accepts,
+#aligned to calendar months/years so the same days always make the same requests. The windows are fetched
+#concurrently over one pooled session, no faster than the rate limit, and every response is saved in an on-disk
+#cache keyed by the endpoint, location and window. Fetching again (i.e. to add the latest days) only requests
+#the windows that aren't cached; windows that end today or later are never cached since their data isn't final.
+#
+#   python fetcher.py weather --start 2014-01-06 --end 2023-08-17 --output weather.json
+#   python fetcher.py airquality --start 2023-01-01 --end 2023-08-17 --daily --output aq2023.csv
+
+LATITUDE = 40.2338
+LONGITUDE = -111.6585
+CACHE = "api_cache"
+
+class Source(ABC):
+    #One history API: where it is, how big a window it accepts and where the records are in its responses
+
+    def __init__(self, name, url, window, field, params, exclusive_end=False, time_column="time"):
+        self.name = name
+        self.url = url
+        #Pandas frequency of the windows, i.e. "MS" for calendar months
+        self.window = window
+        #"daily" responses hold a list per column, "data" responses a list of records
+        self.field = field
+        self.params = params
+        #Weatherbit's end_date is the first day not returned
+        self.exclusive_end = exclusive_end
+        self.time_column = time_column
+
+    @abstractmethod
+    def query(self, start, end, latitude, longitude):
+        #Request parameters of the window from start through end (inclusive)
+        pass
+
+    def records(self, payload):
+        records = payload.get(self.field) or []
+        return pd.DataFrame(records)
+
+class OpenMeteo(Source):
+
+    def query(self, start, end, latitude, longitude):
+        return {"latitude": latitude, "longitude": longitude, "start_date": start, "end_date": end, **self.params}
+
+class Weatherbit(Source):
+
+    def query(self, start, end, latitude, longitude):
+        if self.exclusive_end:
+            end = (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        return {"lat": latitude, "lon": longitude, "start_date": start, "end_date": end, **self.params}
+
+SOURCES = {
+    "weather": OpenMeteo("weather", "https://archive-api.open-meteo.com/v1/archive", "YS", "daily", {
+        "daily": "temperature_2m_max,temperature_2m_min,temperature_2m_mean,rain_sum,snowfall_sum,wind_speed_10m_max",
+        "timezone": "America/Denver"}),
+    #Weatherbit only returns about a month of hourly air quality per request
+    "airquality": Weatherbit("airquality", "https://api.weatherbit.io/v2.0/history/airquality", "MS", "data",
+                             {"tz": "local"}, exclusive_end=True, time_column="datetime"),
+}
+
+def windows(start, end, freq):
+    #(first, last) days of every window between start and end (inclusive), cut at the freq boundaries
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    if end < start:
+        return []
+    bounds = [start] + [b for b in pd.date_range(start, end, freq=freq) if b > start] + [end + pd.Timedelta(days=1)]
+    return [(a.strftime('%Y-%m-%d'), (b - pd.Timedelta(days=1)).strftime('%Y-%m-%d')) for a, b in zip(bounds[:-1], bounds[1:])]
+
+def cache_key(source, query):
+    #Endpoint, location, window and fields, but never the API key
+    keyed = {k: v for k, v in query.items() if k != "key"}
+    return hashlib.sha256(json.dumps([source.url, keyed], sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+class RateLimiter():
+    #Spaces the start of requests at least 1/rate seconds apart, across all tasks
+
+    def __init__(self, rate):
+        self.interval = 1/rate if rate else 0
+        self.next = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class Fetcher():
+
+    def __init__(self, source, cache=CACHE, concurrency=4, rate=None, retries=3, key=None, base_url=None,
+                 latitude=LATITUDE, longitude=LONGITUDE, timeout=60):
+        self.source = SOURCES[source] if isinstance(source, str) else source
+        self.cache = os.path.join(cache, self.source.name)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.key = key
+        #Lets the requests go to the local stand-in (see mocksite.py) instead of the real API
+        self.url = self.source.url if base_url is None else base_url.rstrip("/") + "/" + self.source.url.split("/", 3)[3]
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timeout = timeout
+        self.fetched = 0
+        self.cached = 0
+
+    def path(self, query):
+        return os.path.join(self.cache, f"{cache_key(self.source, query)}.json")
+
+    def load(self, query):
+        try:
+            with open(self.path(query)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, query, payload):
+        os.makedirs(self.cache, exist_ok=True)
+        path = self.path(query)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(payload, f)
+        os.replace(temporary, path)
+
+    async def fetch_window(self, session, limiter, start, end):
+        query = self.source.query(start, end, self.latitude, self.longitude)
+        payload = self.load(query)
+        if payload is not None:
+            self.cached += 1
+            return payload
+        params = dict(query, key=self.key) if self.key else query
+        for attempt in range(self.retries):
+            await limiter.wait()
+            try:
+                async with session.get(self.url, params=params) as response:
+                    #Rate limited or a server error: wait and try again
+                    if response.status == 429 or response.status >= 500:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
+                    response.raise_for_status()
+                    payload = await response.json(content_type=None)
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries - 1:
+                    raise
+                await asyncio.sleep(2**attempt)
+        self.fetched += 1
+        if pd.Timestamp(end) < pd.Timestamp.today().normalize():
+            self.save(query, payload)
+        return payload
+
+    async def fetch_all(self, start, end):
+        limiter = RateLimiter(self.rate)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            return await asyncio.gather(*(self.fetch_window(session, limiter, a, b)
+                                          for a, b in windows(start, end, self.source.window)))
+
+    def fetch(self, start, end):
+        #Every record from start through end as one frame, in time order
+        payloads = asyncio.run(self.fetch_all(start, end))
+        frames = [self.source.records(payload) for payload in payloads]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        records = pd.concat(frames, ignore_index=True)
+        return records.sort_values(self.source.time_column, kind="stable").reset_index(drop=True)
+
+def daily_max(hourly):
+    #Daily maximum of each pollutant of the hourly air quality records, as in aq2023.csv
+    hourly = hourly.copy()
+    hourly["DATE"] = pd.to_datetime(hourly["datetime"], format='%Y-%m-%d:%H').dt.strftime('%Y-%m-%d')
+    daily = hourly.groupby("DATE")[["co", "no2", "o3", "pm10", "pm25"]].max().reset_index()
+    daily.columns = [col.upper() for col in daily.columns]
+    return daily
+
+def read_key(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return f.read().strip()
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch the weather or air quality history of Provo")
+    parser.add_argument("source", choices=list(SOURCES))
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", default=pd.Timestamp.today().strftime('%Y-%m-%d'))
+    parser.add_argument("--output", default=None, help=".csv, or .json in the API's response layout")
+    parser.add_argument("--daily", action="store_true", help="Daily maximums of the hourly air quality")
+    parser.add_argument("--cache", default=CACHE)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second at most")
+    parser.add_argument("--key-file", default="air_quality_api_key.txt", help="Weatherbit API key")
+    parser.add_argument("--base-url", default=None, help="i.e. http://127.0.0.1:8080 for mocksite.py")
+    args = parser.parse_args()
+
+    fetcher = Fetcher(args.source, args.cache, args.concurrency, args.rate,
+                      key=read_key(args.key_file) if args.source == "airquality" else None, base_url=args.base_url)
+    records = fetcher.fetch(args.start, args.end)
+    if args.daily:
+        records = daily_max(records)
+    if args.output is None:
+        print(records)
+    elif args.output.endswith(".json"):
+        payload = records.to_dict(orient="list") if fetcher.source.field == "daily" else records.to_dict(orient="records")
+        with open(args.output, "w") as f:
+            json.dump({"latitude": LATITUDE, "longitude": LONGITUDE, fetcher.source.field: payload}, f)
+    else:
+        records.to_csv(args.output, index=False)
+    print(f"{fetcher.fetched} windows fetched, {fetcher.cached} from the cache, {len(records)} records")
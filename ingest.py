@@ -0,0 +1,145 @@
+import hashlib
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+#Builds ProvoAQ.csv from the yearly pollutant tables in "Provo Air Quality Data" ({metric}-{year}_table_1.csv,
+#extracted from the images by PDF Extraction.ipynb, and the OCR text of the same pages, {metric}-{year}_Page_1.txt).
+#Every file is parsed into long rows (DATE, METRIC, DATA) in a process pool and the result cached under the hash
+#of the file's contents, so running it again only parses files that were added or changed.
+#
+#   python ingest.py
+#   python ingest.py --workers 4 --output ProvoAQ.csv
+
+DATA_DIR = "Provo Air Quality Data"
+CACHE = os.path.join(DATA_DIR, ".cache")
+OUTPUT = "ProvoAQ.csv"
+#Part of every cache key, so changing how files are parsed doesn't reuse tables parsed the old way
+PARSER = 1
+
+MONTHS = ["JANUARY", "FEBRUARY", "MARCH", "APRIL", "MAY", "JUNE", "JULY", "AUGUST", "SEPTEMBER", "OCTOBER", "NOVEMBER", "DECEMBER"]
+NAME = re.compile(r"(?P<metric>[A-Z0-9]+)-(?P<year>\d{4})_(table_1\.csv|Page_1\.txt)$")
+
+def file_key(path):
+    h = hashlib.sha256(f"{PARSER}:{os.path.basename(path)}:".encode())
+    with open(path, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()[:16]
+
+def month_number(names):
+    #1-12 for each column name, matched by prefix since a few extracted headers are cut off ("DECEMB"); 0 otherwise
+    names = [str(name).strip().upper() for name in names]
+    return np.array([next((m for m, month in enumerate(MONTHS, start=1) if len(name) >= 3 and month.startswith(name)), 0)
+                     for name in names])
+
+def long_rows(metric, year, days, months, values):
+    #DATE/METRIC/DATA rows, leaving out dates that don't exist (February 30th); blank readings are missing
+    dates = pd.to_datetime(pd.DataFrame({"year": year, "month": months, "day": days}), errors="coerce")
+    keep = dates.notna().to_numpy()
+    values = pd.Series(values, dtype="string").str.strip()[keep].replace("", pd.NA)
+    #Readings are stored the way read_csv would read them: numbers as floats, flagged readings (P 37.3) as written
+    numbers = pd.to_numeric(values, errors="coerce")
+    text = values.where(numbers.isna(), numbers.astype(float).astype(str))
+    return pd.DataFrame({"DATE": dates[keep].to_numpy(), "METRIC": metric, "DATA": text.to_numpy(dtype=object)})
+
+def parse_table(path, metric, year):
+    #A month per column. Rows are days 1 through 31, except where the day column merges rows ("1 2 3" where PM10
+    #was only sampled every third day; the reading is the first day's). The day column is missing from some tables
+    #and misread in others ("6" for 16), so it's only used when its days go up
+    table = pd.read_csv(path, dtype=str)
+    months = month_number(table.columns)
+    days = np.arange(1, len(table) + 1)
+    day_column = [c for c, m in zip(table.columns, months) if m == 0]
+    if day_column:
+        first = pd.to_numeric(table[day_column[0]].str.extract(r"^\s*(\d+)", expand=False), errors="coerce").to_numpy()
+        if not np.isnan(first).any() and (np.diff(first) > 0).all():
+            days = first.astype(int)
+    values = table.loc[:, months > 0].to_numpy(dtype=object)
+    return long_rows(metric, year, np.repeat(days, values.shape[1]),
+                     np.tile(months[months > 0], len(table)), values.ravel())
+
+def parse_ocr(path, metric, year):
+    #The OCR text has one cell per line, row by row after the month names, but blank cells are dropped,
+    #so only the rows with a reading for every month can be lined up with their months (and sparse pages not at all)
+    with open(path) as f:
+        tokens = [t.strip() for t in f.read().split("\n") if t.strip()]
+    tokens = tokens[next((i for i, t in enumerate(tokens) if re.fullmatch(r"\d+", t)), len(tokens)):]
+    rows = []
+    start = 0
+    for day in range(1, 32):
+        if str(day) not in tokens[start:]:
+            break
+        at = tokens.index(str(day), start)
+        end = tokens.index(str(day + 1), at + 1) if str(day + 1) in tokens[at + 1:] else len(tokens)
+        cells = tokens[at + 1:end]
+        if len(cells) == len(MONTHS) and all(re.fullmatch(r"-?\d*\.?\d+", c) for c in cells):
+            rows.append((day, cells))
+        start = at + 1
+    if not rows:
+        return long_rows(metric, year, [], [], [])
+    days = np.repeat([day for day, _ in rows], len(MONTHS))
+    return long_rows(metric, year, days, np.tile(np.arange(1, 13), len(rows)), [c for _, cells in rows for c in cells])
+
+def parse_file(path):
+    match = NAME.search(os.path.basename(path))
+    metric, year = match["metric"], int(match["year"])
+    if path.endswith(".csv"):
+        return parse_table(path, metric, year)
+    return parse_ocr(path, metric, year)
+
+def cached_parse(path, cache=CACHE):
+    #Parses the file unless a table with the hash of its contents is already cached; runs in the pool's processes
+    cached = os.path.join(cache, f"{file_key(path)}.parquet")
+    if os.path.exists(cached):
+        return pd.read_parquet(cached), False
+    rows = parse_file(path)
+    os.makedirs(cache, exist_ok=True)
+    #Written to a temporary file first so a crash never leaves half a table under the key
+    temporary = f"{cached}.{os.getpid()}.tmp"
+    rows.to_parquet(temporary, index=False)
+    os.replace(temporary, cached)
+    return rows, True
+
+def sources(data_dir=DATA_DIR):
+    return sorted(p for p in glob.glob(os.path.join(data_dir, "*")) if NAME.search(os.path.basename(p)))
+
+def ingest(data_dir=DATA_DIR, cache=CACHE, workers=None, ocr=True):
+    #ProvoAQ as one row per date and a column per metric, from the extracted tables; the OCR text is only used
+    #for pages without an extracted table
+    paths = [p for p in sources(data_dir) if ocr or p.endswith(".csv")]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(cached_parse, paths, [cache]*len(paths)))
+    parsed = sum(new for _, new in results)
+
+    tables = [rows for (rows, _), p in zip(results, paths) if p.endswith(".csv")]
+    extracted = {p[:-len("_table_1.csv")] for p in paths if p.endswith(".csv")}
+    pages = [rows for (rows, _), p in zip(results, paths) if p.endswith(".txt") and p[:-len("_Page_1.txt")] not in extracted]
+    def wide(frames):
+        rows = pd.concat(frames, ignore_index=True) if frames else long_rows("", 2000, [], [], [])
+        return rows.pivot(index="DATE", columns="METRIC", values="DATA")
+
+    provo_aq = wide(tables)
+    if pages:
+        provo_aq = provo_aq.combine_first(wide(pages))
+    provo_aq = provo_aq.sort_index().reset_index()
+    provo_aq.columns.name = None
+    return provo_aq, parsed, len(paths)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build ProvoAQ.csv from the tables in the Provo Air Quality Data directory")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--cache", default=None, help="Directory of the parsed tables (default: .cache in the data directory)")
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--workers", type=int, default=None, help="Processes parsing files (default: one per core)")
+    parser.add_argument("--no-ocr", action="store_true", help="Only use the extracted tables")
+    args = parser.parse_args()
+
+    cache = args.cache or os.path.join(args.data_dir, ".cache")
+    provo_aq, parsed, files = ingest(args.data_dir, cache, args.workers, not args.no_ocr)
+    provo_aq["DATE"] = provo_aq["DATE"].dt.strftime('%Y-%m-%d')
+    provo_aq.to_csv(args.output, index=False)
+    print(f"Parsed {parsed} of {files} files ({files - parsed} cached), {len(provo_aq)} days written to {args.output}")
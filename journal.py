@@ -0,0 +1,147 @@
+import pandas as pd
+import json
+import os
+import time
+import threading
+import re
+
+#An append-only journal of the keys that have been scraped and the rows that have not been saved to file yet.
+#Records are JSON lines and are fsync'd in batches, so a crash loses at most the last few seconds of work.
+#On startup the journal is read back to work out which keys of each officer (or shard) are left, and the rows that
+#never made it to file are put back in the buffer. It is then compacted: finished keys are stored as
+#ranges and rows that were already saved are dropped.
+#
+#Records:
+#   {"t": "done", "officer": 8, "start": 100, "stop": 101}   keys P8-00100 up to P8-00101 (exclusive) are scraped
+#   {"t": "retired", "officer": 8, "index": 26543}          nothing left to scrape for P8 from index 26543 on
+#   {"t": "row", "row": {...}}                              a citation added to the buffer
+#   {"t": "flush"}                                          every row before this has been saved to file
+
+class Journal():
+
+    def __init__(self, sync_every=100, sync_interval=5.0):
+        self.path = None
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        #What was read back from the journal when it was opened
+        self._done = {}
+        self._retired = {}
+        self._pending = []
+
+    @property
+    def is_open(self):
+        return self._file is not None
+
+    def open(self, path):
+        self.path = path
+        self._load()
+        self._compact()
+        self._file = open(path, "a")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    #The last line may have been cut off by the crash
+                    continue
+                if record["t"] == "done":
+                    self._done.setdefault(record["officer"], set()).update(range(record["start"], record["stop"]))
+                elif record["t"] == "retired":
+                    self._retired[record["officer"]] = min(record["index"], self._retired.get(record["officer"], float("inf")))
+                elif record["t"] == "row":
+                    self._pending.append(record["row"])
+                    #A journaled row means its key was scraped, even if the "done" record didn't make it to disk
+                    key = re.match(r'P(\d+)-(\d+)', str(record["row"].get("Citation")))
+                    if key:
+                        self._done.setdefault(int(key.group(1)), set()).add(int(key.group(2)))
+                elif record["t"] == "flush":
+                    self._pending = []
+
+    def _compact(self):
+        records = []
+        for officer, done in self._done.items():
+            if not done:
+                continue
+            done = sorted(done)
+            start = done[0]
+            for previous, index in zip(done, done[1:] + [None]):
+                if index != previous + 1:
+                    records.append({"t": "done", "officer": officer, "start": start, "stop": previous + 1})
+                    start = index
+        records += [{"t": "retired", "officer": officer, "index": index} for officer, index in self._retired.items()]
+        records += [{"t": "row", "row": row} for row in self._pending]
+
+        temp = self.path + ".tmp"
+        with open(temp, "w") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+
+    def _write(self, records, sync=False):
+        if self._file is None:
+            return
+        with self._lock:
+            for record in records:
+                self._file.write(json.dumps(record, default=str) + "\n")
+            self._unsynced += len(records)
+            if sync or self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+                self._last_sync = time.monotonic()
+
+    def done(self, officer, index):
+        self._write([{"t": "done", "officer": officer, "start": index, "stop": index + 1}])
+
+    def retire(self, officer, index):
+        self._write([{"t": "retired", "officer": officer, "index": index}], sync=True)
+
+    def rows(self, rows):
+        self._write([{"t": "row", "row": row} for row in rows])
+
+    def flushed(self):
+        self._write([{"t": "flush"}], sync=True)
+
+    def pending_rows(self):
+        #Rows that were buffered but never saved to file before the last run stopped
+        return pd.DataFrame(self._pending)
+
+    def is_done(self, officer, index):
+        #Whether an earlier run finished this key; scrapers skip these keys, as they may come after one that wasn't
+        return index in self._done.get(officer, ())
+
+    def resume_index(self, officer, start, stop):
+        #First index of [start, stop) to scrape: the first key not finished in it, or stop when there is nothing left.
+        #Only an unbroken run of finished keys is skipped, so a key that was never finished (a lookup that failed, or
+        #a citation still waiting on the writer when the scrape crashed) is always scraped again
+        done = self._done.get(officer, ())
+        while start < stop and start in done:
+            start += 1
+        if start >= self._retired.get(officer, float("inf")):
+            return stop
+        return start
+
+    def resume(self, ranges):
+        #Cuts each officer's range of indexes down to what is left to scrape, up to where it was retired
+        ranges = {officer: range(self.resume_index(officer, indexes.start, indexes.stop),
+                                 min(indexes.stop, self._retired.get(officer, indexes.stop)))
+                  for officer, indexes in ranges.items()}
+        return {officer: indexes for officer, indexes in ranges.items() if len(indexes) > 0}
+
+    def close(self):
+        if self._file is not None:
+            self._write([], sync=True)
+            self._file.close()
+            self._file = None
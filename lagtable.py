@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+#Regressions of a metric on its own lags, for the "Lags of Key Metrics" section of dashboard.py.
+#The design matrix of a metric's lags is a strided view over the series, so no lagged copies are made.
+#The coefficients for every lag count 1 through max_lags are solved from one running Gram matrix per metric:
+#the regression on L lags uses days L onward, so going from L+1 down to L adds a single day's outer product,
+#and the coefficients are the solution of the leading (L+1)x(L+1) block (intercept and lags 1 through L).
+
+def lag_matrix(values, lags):
+    #Row t holds lags 1 through lags of values[t + lags], i.e. values[t + lags - 1] down to values[t]
+    return sliding_window_view(np.asarray(values, dtype=float)[:-1], lags)[:, ::-1]
+
+def lag_coefficients(values, lags):
+    #Least squares coefficients (with an intercept) of the series on lags 1 through lags
+    values = np.asarray(values, dtype=float)
+    X = lag_matrix(values, lags)
+    y = values[lags:]
+    #Centering takes care of the intercept
+    coef, *_ = np.linalg.lstsq(X - X.mean(axis=0), y - y.mean(), rcond=None)
+    return coef
+
+def coefficient_table(data, metrics, max_lags):
+    #Returns {metric: table} where table[L-1, :L] are the coefficients of the regression on L lags
+    values = data[metrics].to_numpy(dtype=float)
+    #Standardized so the Gram matrices are well conditioned; lag coefficients don't change when the series is shifted or scaled
+    values = (values - values.mean(axis=0))/np.where(values.std(axis=0) > 0, values.std(axis=0), 1)
+    n, k = values.shape
+
+    #design[t, m] = [1, lag 1, ..., lag max_lags, value] of metric m on day t, with lags before the first day left at 0
+    #(day t only enters the regressions on t lags or fewer, which never read those)
+    design = np.zeros((n, k, max_lags + 2))
+    design[:, :, 0] = 1
+    design[:, :, -1] = values
+    for lag in range(1, max_lags + 1):
+        design[lag:, :, lag] = values[:-lag]
+
+    gram = np.einsum("tmi,tmj->mij", design[max_lags:], design[max_lags:])
+    tables = np.full((k, max_lags, max_lags), np.nan)
+    for lags in range(max_lags, 0, -1):
+        if lags < max_lags:
+            gram += np.einsum("mi,mj->mij", design[lags], design[lags])
+        xx = gram[:, :lags + 1, :lags + 1]
+        xy = gram[:, :lags + 1, -1]
+        tables[:, lags - 1, :lags] = np.linalg.solve(xx, xy[..., None])[:, 1:, 0]
+
+    return {metric: tables[m] for m, metric in enumerate(metrics)}
+
+def lag_curve(table, lags):
+    #The coefficient curve of the regression on lags lags, as plotted by the dashboard
+    return pd.DataFrame({"Lag": range(1, lags + 1), "Delta": table[lags - 1, :lags]})
@@ -0,0 +1,186 @@
+import pandas as pd
+import asyncio
+import datetime
+import time
+
+import aiohttp
+
+from main import Scraper, save_data, format_key, log_error, issued_time, TIMEOUT, JOURNAL
+from probe import last_before, is_current
+from metrics import METRICS
+
+#Browser-free citation lookups.
+#Instead of typing each key into the rendered page, call the JSON request the page itself makes
+#when the search button is clicked, many keys at a time over a pooled connection.
+
+#JSON fields of the citation response and the labels the rendered card shows them under (what format_text reads)
+FIELDS = {
+    "citationNumber": "Citation",
+    "licensePlate": "License Plate/Vin",
+    "fineAmount": "Fine",
+    "issuedDate": "Issued",
+    "location": "Location",
+    "violation": "Violation",
+}
+
+def format_fine(fine):
+    #The card shows fines as text, i.e. $1,020.00
+    if isinstance(fine, (int, float)):
+        return f"${fine:,.2f}"
+    return fine
+
+def format_issued(issued):
+    #The card shows issue dates as text, i.e. Oct 10, 2023 01:37 PM
+    try:
+        return datetime.datetime.fromisoformat(issued).strftime('%b %d, %Y %I:%M %p')
+    except (TypeError, ValueError):
+        return issued
+
+def format_citation(payload, fields=FIELDS):
+    #Takes a citation response and returns the same row as Scraper.format_text and Scraper.checkPayment
+    citation = {fields.get(field, field): value for field, value in payload.items() if field != "actions"}
+    if "Fine" in citation:
+        citation["Fine"] = format_fine(citation["Fine"])
+    if "Issued" in citation:
+        citation["Issued"] = format_issued(citation["Issued"])
+    citation.update(Scraper.payment_info(payload.get("actions", [])))
+    return pd.DataFrame([citation])
+
+def cookies_from_driver(driver):
+    #Reuse the login of a Selenium session for the HTTP requests
+    return {cookie["name"]: cookie["value"] for cookie in driver.get_cookies()}
+
+class HttpLookup():
+
+    def __init__(self, endpoint, concurrency=32, cookies=None, retries=3):
+        #The citation request URL, with {key} in place of the citation key, i.e. P8-00042
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.cookies = cookies
+        self.retries = retries
+
+        #Starting time
+        self.start_time = datetime.datetime.now()
+
+        #Define parameters of loop
+        self.officers = range(1, 10+1)
+        self.index = range(1, 99999+1)
+
+    def session(self):
+        #One pooled session; the connector never holds more than `concurrency` connections
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, cookies=self.cookies)
+
+    async def fetch(self, session, officer, index):
+        #Look up a single citation key; returns an empty frame when there is no citation and None on failure
+        key = format_key(officer, index)
+        start = time.perf_counter()
+        try:
+            return await self._fetch(session, key)
+        finally:
+            #Async calls can't use METRICS.timed, so the time until the response (retries included) is recorded here
+            METRICS.observe("fetch", time.perf_counter() - start)
+
+    async def _fetch(self, session, key):
+        for attempt in range(self.retries):
+            try:
+                async with session.get(self.endpoint.format(key=key)) as response:
+                    #Only an explicit empty payload means there is no citation. A 404 is a failure like any other
+                    #error status: with a wrong endpoint every key would 404 and be journaled as done otherwise
+                    response.raise_for_status()
+                    payload = await response.json()
+                    if not payload:
+                        return pd.DataFrame()
+                    return format_citation(payload)
+            #A body that isn't JSON (i.e. a login page) raises ContentTypeError, a ClientError, or ValueError
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                if attempt == self.retries - 1:
+                    log_error(key, e)
+                    return None
+                await asyncio.sleep(2**attempt)
+
+    async def lookup(self, keys):
+        #Looks up (officer, index) pairs concurrently and returns the results in the same order
+        async with self.session() as session:
+            return await asyncio.gather(*(self.fetch(session, officer, index) for officer, index in keys))
+
+    def record(self, officer, j, scraped_data):
+        #Buffers a looked up citation (saving every 1000 indexes) and marks the key as done
+        if not scraped_data.empty:
+            save_data(scraped_data, save = j % 1000 == 0)
+            METRICS.key(format_key(officer, j), "hit")
+        else:
+            METRICS.key(format_key(officer, j), "miss")
+        JOURNAL.done(officer, j)
+
+    async def scan_officer(self, session, officer, indexes, batch_size=None, no_data_limit=50, rounds=3, last_issued=None):
+        #last_issued is the issue time of the officer's last citation before indexes, if there is one
+        batch_size = batch_size or 4*self.concurrency
+        no_data_sequence = 0
+        #Keys whose lookup failed after every retry; they are looked up again (up to `rounds` more times) once the
+        #rest of the officer is done. They aren't journaled as done until then, so a later run retries them too
+        failed = []
+        for start in range(indexes.start, indexes.stop, batch_size):
+            #Keys finished by an earlier run are skipped (see journal.py)
+            batch = [j for j in range(start, min(start + batch_size, indexes.stop)) if not JOURNAL.is_done(officer, j)]
+            results = await asyncio.gather(*(self.fetch(session, officer, j) for j in batch))
+
+            #Go through the batch in order so the no data sequence is the same as the browser's
+            retired = False
+            for j, scraped_data in zip(batch, results):
+                if scraped_data is None:
+                    METRICS.key(format_key(officer, j), "error")
+                    failed.append(j)
+                    continue
+                self.record(officer, j, scraped_data)
+                if not scraped_data.empty:
+                    last_issued = issued_time(scraped_data)
+                    no_data_sequence = 0
+                else:
+                    no_data_sequence += 1
+                if no_data_sequence >= no_data_limit and is_current(last_issued):
+                    JOURNAL.retire(officer, j)
+                    retired = True
+                    break
+            if retired:
+                break
+
+        for _ in range(rounds):
+            if not failed:
+                break
+            results = await asyncio.gather(*(self.fetch(session, officer, j) for j in failed))
+            retry = []
+            for j, scraped_data in zip(failed, results):
+                if scraped_data is None:
+                    METRICS.key(format_key(officer, j), "error")
+                    retry.append(j)
+                else:
+                    self.record(officer, j, scraped_data)
+            failed = retry
+        if failed:
+            print(f"{len(failed)} keys of officer {officer} failed every retry and are left for the next run (see errors.txt)")
+        return failed
+
+    def any_issued(self, officer, indexes):
+        #Whether any of the indexes is a citation (used to probe index ranges)
+        results = asyncio.run(self.lookup([(officer, index) for index in indexes]))
+        return any(scraped_data is not None and not scraped_data.empty for scraped_data in results)
+
+    async def scan(self, i = 1, j = 0, ranges=None, stored=None):
+        #Same order as Scraper.main_loop: officer i starts at index j, every following officer at 0
+        #ranges optionally limits each officer to a range of indexes (see probe.py)
+        #stored is each officer's highest stored citation (see probe.stored_last)
+        stored = stored or {}
+        if ranges is None:
+            ranges = {officer: range(j if officer == i else 0, len(self.index)+1) for officer in range(i, len(self.officers)+1)}
+        async with self.session() as session:
+            for officer, indexes in ranges.items():
+                await self.scan_officer(session, officer, indexes, last_issued=last_before(stored, officer, indexes.start))
+                save_data(pd.DataFrame(), save = True)
+
+    def main_loop(self, i = 1, j = 0, ranges=None, stored=None):
+        asyncio.run(self.scan(i, j, ranges, stored))
+        METRICS.report(force=True)
+        print("Finished scraping all the data.")
+        print(f"Total time elapsed: {datetime.datetime.now() - self.start_time}")
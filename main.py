@@ -1,9 +1,8 @@
 import pandas as pd
 import threading
 import time
-import re
-import os
 import datetime
+import os
 
 #import selenium libraries
 from selenium import webdriver
@@ -14,74 +13,199 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
+
+from timeouts import SCHEDULER, TimeoutExpired
+from journal import Journal
+from probe import ISSUED_FORMAT, last_before, is_current
+from store import write_citations
+from metrics import METRICS
+
+#Columns that have to be filled in for a scraped row to count as a citation
+KEY_COLUMNS = ['Citation', 'License Plate/Vin', 'Fine', 'Issued', 'CitationText']
+
+class CitationBuffer():
+    #Scraped rows waiting to be written to file.
+    #Rows are kept as plain dicts so adding one is O(1); the data frame is only built once per flush.
+
+    def __init__(self):
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
 
-DATA = pd.DataFrame()
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    def append(self, data):
+        columns = list(data.columns)
+        rows = [dict(zip(columns, row)) for row in zip(*(data[col].tolist() for col in columns))]
+        #Don't add empty data
+        if len(rows) > 0 and not all(pd.isna(rows[-1].get(col)) for col in KEY_COLUMNS):
+            self.rows.extend(rows)
+            return rows
+        return []
+
+    def tail(self, n=5):
+        return pd.DataFrame(self.rows[-n:])
+
+    def frame(self):
+        return pd.DataFrame(self.rows)
+
+    def clear(self):
+        self.rows = []
+
+def clean_data(data):
+    #Clean the data before saving it to the file
+    data["Officer"] = data["Citation"].astype("string").str.extract(r'P(\d+)', expand=False).astype(object)
+    data["Fine"] = pd.to_numeric(data["Fine"].astype("string").str.replace(r'[$,]', '', regex=True)).astype(float)
+    data["Residence"] = data["License Plate/Vin"].str.split().str[0]
+    issued = pd.to_datetime(data["Issued"], format='%b %d, %Y %I:%M %p')
+    data["IssuedDate"] = issued.dt.strftime('%Y-%m-%d')
+    data["IssuedTime"] = issued.dt.strftime('%I:%M %p')
+    return data
+
+DATA = CitationBuffer()
+
+#Keys scraped and rows not saved yet, so a crashed scrape can resume where it stopped (see journal.py)
+JOURNAL = Journal()
+JOURNAL_PATH = "ParkingCitations.journal"
+
+def open_journal(path=JOURNAL_PATH):
+    JOURNAL.open(path)
+    #Put the rows that never made it to file back in the buffer
+    DATA.append(JOURNAL.pending_rows())
+    if not DATA.empty:
+        print(f"Recovered {len(DATA)} unsaved citations from {path}")
+
+@METRICS.timed("save_data")
 def save_data(data, save=False):
-    global DATA
-    #Don't add empty data
-    if not data.empty and not data.iloc[-1][['Citation', 'License Plate/Vin', 'Fine', 'Issued', 'CitationText']].isna().all(): 
-        if DATA.empty:
-            DATA = data
-        else:
-            DATA = pd.concat([DATA, data]).reset_index(drop=True)
+    JOURNAL.rows(DATA.append(data))
     
-    if save:
-        #Clean the data before saving it to the file
-        DATA["Officer"] = DATA["Citation"].apply(lambda x: re.search(r'P(\d+)', str(x)).group(1) if isinstance(x, str) and re.search(r'P(\d+)', str(x)) else None)
-        DATA["Fine"] = DATA["Fine"].apply(lambda x: float(x.replace('$', '').replace(',', '')) if isinstance(x, str) else x)
-        DATA["Residence"] = DATA["License Plate/Vin"].str.split().str[0]
-        DATA["IssuedDate"] = pd.to_datetime(DATA["Issued"], format='%b %d, %Y %I:%M %p').dt.strftime('%Y-%m-%d')
-        DATA["IssuedTime"] = pd.to_datetime(DATA["Issued"], format='%b %d, %Y %I:%M %p').dt.strftime('%I:%M %p')
-        
-        if os.path.exists("ParkingCitations.csv"):
-            DATA.to_csv("ParkingCitations.csv", mode='a', index=False, header=False)
-        else:
-            DATA.to_csv("ParkingCitations.csv", index=False)
-
-        DATA = pd.DataFrame()
+    if save and not DATA.empty:
+        #Partitioned by year and officer (see store.py)
+        write_citations(clean_data(DATA.frame()))
+
+        DATA.clear()
+        JOURNAL.flushed()
+
+def issued_time(data):
+    #Issue time of the last citation in a scraped frame
+    return datetime.datetime.strptime(data["Issued"].iloc[-1], ISSUED_FORMAT)
+
+def format_key(officer, index):
+    #Citation keys are the officer number followed by a zero-padded 5 digit index, i.e. P8-00042
+    index = "0"*(5-len(str(index)))+str(index)
+    return f"P{officer}-{index}"
+
+#Several scrapers may log errors at the same time when scraping in parallel
+ERROR_LOCK = threading.Lock()
+def log_error(key, e):
+    now = datetime.datetime.now()
+    error_message = f"{now}: {str(e)};\nThere was an error sending the keys or scraping the data: {key}"
+    with ERROR_LOCK:
+        with open("errors.txt", "a") as f:
+            f.write(error_message + "\n\n")
 
 PATH = "Driver/chromedriver.exe"
 
-def selenium_driver():
+#Resources the scraper never reads: images, fonts, media and stylesheets (the citation card renders without them)
+BLOCKED_URLS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico",
+                "*.woff", "*.woff2", "*.ttf", "*.otf", "*.css", "*.mp4", "*.webm"]
+
+def selenium_driver(headless=False, block_resources=None, profile_dir=None):
+    #A visible Chrome by default. headless runs it without a window and (unless block_resources is False) without
+    #loading the resources above. profile_dir keeps the browser profile, and so the login, from one run to the next
     
-    service = Service(PATH) #Service(ChromeDriverManager().install())
+    #Without the bundled driver, Selenium finds one for the installed Chrome
+    service = Service(PATH) if os.path.exists(PATH) else Service() #Service(ChromeDriverManager().install())
 
     options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1280,1024")
+        #Containers have a small /dev/shm, and Chrome won't start sandboxed as root
+        options.add_argument("--disable-dev-shm-usage")
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            options.add_argument("--no-sandbox")
+    if profile_dir is not None:
+        options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+    block = headless if block_resources is None else block_resources
+    if block:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        #driver.get returns once the page's DOM is ready; the scraper waits for the elements it needs anyway
+        options.page_load_strategy = "eager"
     driver = webdriver.Chrome(service=service, options=options)
+    if block:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
     return driver
 
-def measure_time(start_time, s, threshold=10.1):
-    counting = True
-    while counting and not s.citation_loaded:
-        current = time.perf_counter() - start_time
-        if current >= threshold:
-            counting = False
-            s.flag = True
-            s.go()
-        time.sleep(0.1)
-
-#Create the chrome driver that can be referred to globally
-driver = None
+#Number of seconds a citation has to load before the scraper gives up and reloads the page
+TIMEOUT = 10.1
+
+#Runs in the browser: waits for either the citation or the "no data" message to render and returns the
+#text of every field, whether there was no data, and the text of the appeal/pay buttons in one payload.
+#arguments[0] is the number of milliseconds to wait before giving up.
+EXTRACT_SCRIPT = """
+var done = arguments[arguments.length - 1];
+var observer = null;
+var timer = null;
+
+function extract() {
+    var fields = document.querySelectorAll(".v-card__text .col");
+    var noData = document.querySelectorAll(".v-card__text .text-center h4");
+    if (fields.length < 1 && noData.length < 1) {
+        return false;
+    }
+    if (observer) observer.disconnect();
+    if (timer) clearTimeout(timer);
+    done({
+        timedOut: false,
+        noData: noData.length > 0,
+        fields: Array.from(fields, function (el) { return el.innerText; }),
+        buttons: Array.from(document.querySelectorAll(".v-card__text .text-center button"), function (el) { return el.innerText; })
+    });
+    return true;
+}
+
+if (!extract()) {
+    observer = new MutationObserver(extract);
+    observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    timer = setTimeout(function () {
+        observer.disconnect();
+        done({timedOut: true});
+    }, arguments[0]);
+}
+"""
 
 class Scraper():
     
-    def __init__(self, url):
+    def __init__(self, url, driver):
         #Define the url to scrape
         self._url = url
 
+        #Each scraper drives its own browser session so several can run side by side
+        self.driver = driver
+        #Leave EXTRACT_SCRIPT time to give up on its own first
+        self.driver.set_script_timeout(TIMEOUT + 5)
+
         #Starting time
         self.start_time = time.perf_counter()
         
         #Some properties that will help us see if the citation has been found
         self._citation_loaded = False
-        self._flag = False
+        #Set by the shared timeout scheduler (or after an error); the scraping thread reloads the page
+        self._flag = threading.Event()
         
         #Define parameters of loop
         self.officers = range(1, 10+1)
         self.index = range(1, 99999+1)
 
+    @METRICS.timed("go")
     def go(self):
-        driver.get(self._url)
+        self.driver.get(self._url)
 
     def calculateTime(self):
         self.end_time = time.perf_counter()
@@ -107,91 +231,92 @@ class Scraper():
     
     @property
     def flag(self):
-        return self._flag
+        return self._flag.is_set()
     
     @flag.setter
     def flag(self, change):
-        self._flag = change
+        if change:
+            self._flag.set()
+        else:
+            self._flag.clear()
+
+    def wait_until(self, condition):
+        #Wait for the page like WebDriverWait, but give up as soon as the citation times out
+        def check(driver):
+            if self.flag:
+                raise TimeoutExpired(f"Citation took longer than {TIMEOUT} seconds to load")
+            return condition(driver)
+        return WebDriverWait(self.driver, 10).until(check)
     
-    @staticmethod
-    def find_citation():
+    @METRICS.timed("find_citation")
+    def find_citation(self):
+        driver = self.driver
         WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CLASS_NAME, "v-btn__content"))
         )
         find_citation_btn = driver.find_elements(By.CLASS_NAME, "v-btn__content")[0]
         find_citation_btn.click()
     
+    @METRICS.timed("send_keys")
     def send_keys(self, data={"officer": 1, "index": 0}):
+        driver = self.driver
         self._citation_loaded = False
-        index = "0"*(5-len(str(data["index"])))+str(data["index"])
-        key = f"P{data['officer']}-{index}"
+        key = format_key(data["officer"], data["index"])
         #print(key)
         
         #Time how long it takes to load each citation
-        start_time = time.perf_counter()
-
-        # Create and start the thread for measuring time
-        time_thread = threading.Thread(target=measure_time, args=(start_time,self))
-        time_thread.start()
-
-        #Search the key into the search bar
+        with SCHEDULER.schedule(TIMEOUT, self._flag):
+            #Search the key into the search bar
         
-        #Sometimes dynamically loaded websites will spoof the identifiers of their web elements
-        #This makes it harder to consistently identify.
+            #Sometimes dynamically loaded websites will spoof the identifiers of their web elements
+            #This makes it harder to consistently identify.
         
-        #One solution is to use XPATH
-        #Another solution is to find the unique combination of nested HTML tags and target that.
+            #One solution is to use XPATH
+            #Another solution is to find the unique combination of nested HTML tags and target that.
         
-        #i.e. if I know the link (<a> tag) I want to target is always the first link in the p tags of every
-        #div that can be identified with a positional or classical identifier, then I can identify the <a> tag
-        #even if the <a> isn't explicitly identifiable through other identifiers.
+            #i.e. if I know the link (<a> tag) I want to target is always the first link in the p tags of every
+            #div that can be identified with a positional or classical identifier, then I can identify the <a> tag
+            #even if the <a> isn't explicitly identifiable through other identifiers.
         
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, ".v-text-field__slot input"))
-        )
-        input_field = driver.find_elements(By.CSS_SELECTOR, ".v-text-field__slot input")[0]
-        driver.execute_script("arguments[0].value = '';", input_field)
-        input_field.send_keys(key)
+            self.wait_until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, ".v-text-field__slot input"))
+            )
+            input_field = driver.find_elements(By.CSS_SELECTOR, ".v-text-field__slot input")[0]
+            driver.execute_script("arguments[0].value = '';", input_field)
+            input_field.send_keys(key)
         
-        #Search the citation
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, ".v-input__append-inner button"))
-        )
-        search_btn = driver.find_elements(By.CSS_SELECTOR, ".v-input__append-inner button")[0]
-        search_btn.click()
-
-        self._citation_loaded = True
-        time_thread.join()
+            #Search the citation
+            self.wait_until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, ".v-input__append-inner button"))
+            )
+            search_btn = driver.find_elements(By.CSS_SELECTOR, ".v-input__append-inner button")[0]
+            search_btn.click()
+
+            self._citation_loaded = True
     
+    @METRICS.timed("get_data")
     def get_data(self):
-        #Time how long it takes to scrape each citation
-        start_time = time.perf_counter()
+        #One round trip: the script waits in the browser for the result card and returns everything we need from it
         self._citation_loaded = False
-
-        # Create and start the thread for measuring time
-        time_thread = threading.Thread(target=measure_time, args=(start_time,self))
-        time_thread.start()
-
-        citation_data = driver.find_elements(By.CSS_SELECTOR, ".v-card__text .col")
-        no_data_text = driver.find_elements(By.CSS_SELECTOR, ".v-card__text .text-center h4")
-        while not self.flag and len(citation_data) < 1 and len(no_data_text) < 1:
-            citation_data = driver.find_elements(By.CSS_SELECTOR, ".v-card__text .col")
-            no_data_text = driver.find_elements(By.CSS_SELECTOR, ".v-card__text .text-center h4")
-            time.sleep(0.1)
-
+        try:
+            result = self.driver.execute_async_script(EXTRACT_SCRIPT, int(TIMEOUT*1000))
+        except TimeoutException:
+            result = {"timedOut": True}
         self._citation_loaded = True
-        #Join the current thread
-        time_thread.join()
+
+        if result["timedOut"]:
+            self.flag = True
+            raise TimeoutExpired(f"Citation took longer than {TIMEOUT} seconds to load")
         
-        if len(no_data_text) >= 1:
+        if result["noData"]:
             return pd.DataFrame()
         else:
             #Now we need to parse the data into a pandas data frame
             
             #Additional information about the citation if it exists and whether or not they paid the ticket
-            additionalInfo = self.checkPayment()
+            additionalInfo = self.checkPayment(result["buttons"])
             
-            return pd.concat([self.format_text([el.text for el in citation_data]), additionalInfo], axis=1)
+            return pd.concat([self.format_text(result["fields"]), additionalInfo], axis=1)
     
     @staticmethod
     def format_text(text_arr):
@@ -202,30 +327,67 @@ class Scraper():
         row = pd.DataFrame(data, cols).transpose()
         return row
 
-    @staticmethod
-    def checkPayment():
+    @METRICS.timed("checkPayment")
+    def checkPayment(self, buttons):
         #Check to see if the payment is available
-        #We can assume that the buttons to appeal and pay have loaded when the citation has loaded so we don't need to load again
-        buttons = driver.find_elements(By.CSS_SELECTOR, ".v-card__text .text-center button")
+        #We can assume that the buttons to appeal and pay have loaded when the citation has loaded, so
+        #their text comes back with the rest of the citation (see EXTRACT_SCRIPT)
         
+        #Two columns to be merged with the row that scrapes the general information
+        return pd.DataFrame.from_dict(self.payment_info(buttons), orient='index').T
+
+    @staticmethod
+    def payment_info(buttons):
+        #Takes the text of the appeal/pay buttons under the citation
         citationInfo = {"CitationText": None,
                         "Unpaid": False}
         if len(buttons) > 0:
             if len(buttons) > 1:
-                citationInfo = {"CitationText": buttons[0].text,
+                citationInfo = {"CitationText": buttons[0],
                                 "Unpaid": True}
             elif len(buttons) == 0:
                 #We have to determine what kind of information is left to be scraped
-                if "APPEAL" in buttons[0].text.upper():
-                    citationInfo = {"CitationText": buttons[0].text,
+                if "APPEAL" in buttons[0].upper():
+                    citationInfo = {"CitationText": buttons[0],
                                     "Unpaid": False}
-                elif "PAY" in buttons[0].text.upper():
+                elif "PAY" in buttons[0].upper():
                     citationInfo = {"CitationText": None,
                                     "Unpaid": True}
-        #Two columns to be merged with the row that scrapes the general information
-        return pd.DataFrame.from_dict(citationInfo, orient='index').T
+        return citationInfo
+
+    def scrape(self, officer, index):
+        #Look up a single citation key; returns an empty frame when there is no citation
+        self.send_keys({"officer": officer, "index": index})
+        return self.get_data()
+
+    def any_issued(self, officer, indexes):
+        #Whether any of the indexes is a citation, stopping at the first one found (used to probe index ranges)
+        for index in indexes:
+            while True:
+                if self.flag:
+                    self.recover()
+                try:
+                    if not self.scrape(officer, index).empty:
+                        return True
+                    break
+                except TimeoutExpired:
+                    self.flag = True
+                except Exception as e:
+                    log_error(format_key(officer, index), e)
+                    self.flag = True
+        return False
 
-    def main_loop(self, i = 1, j = 0, start_at={"i": False, "j": False}):
+    def recover(self):
+        #Reload the page after a timeout or an error
+        self.flag = False
+        self.go()
+        self.find_citation()
+
+    def main_loop(self, i = 1, j = 0, start_at={"i": False, "j": False}, ranges=None, stored=None):
+        #ranges optionally limits each officer to a range of indexes (see probe.py)
+        #stored is each officer's highest stored citation (see probe.stored_last), so an officer with nothing new
+        #can be retired as well
+        stored = stored or {}
         self.go()
         self.find_citation()
         if not start_at["i"]:
@@ -234,75 +396,81 @@ class Scraper():
             start_at["i"] = False
             if not start_at["j"]:
                 j = 0
+            stop = len(self.index)+1
+            if ranges is not None:
+                if i not in ranges:
+                    i += 1
+                    continue
+                j, stop = ranges[i].start, ranges[i].stop
             no_data_sequence = 0
-            while j < len(self.index)+1:
-                start_time = time.perf_counter()
+            #Issue time of this officer's last citation before index j
+            last_issued = last_before(stored, i, j)
+            while j < stop:
                 start_at["j"] = False
 
+                if JOURNAL.is_done(i, j):
+                    #Finished by an earlier run (see journal.py)
+                    j += 1
+                    continue
+
                 #Reset the flag:
-                if self._flag == True:
-                    self._flag = False
-                    self.go()
-                    self.find_citation()
+                if self.flag:
+                    self.recover()
 
                 try:
-                    self.send_keys({"officer": i, "index": j})
-                    
                     #Store the data in the RAM
                     #Save it to a file when it is the last index
                     #i.e. save it to a file when we are done scraping each officer's citations
-                    scraped_data = self.get_data()
+                    scraped_data = self.scrape(i, j)
                     if not scraped_data.empty:                      
                         #Save to a file every 1000 rows scraped, or if it's the last index
                         to_file = (j == len(self.index)-1) or j % 1000 == 0
                         save_data(scraped_data, save = to_file)
+                        last_issued = issued_time(scraped_data)
                         no_data_sequence = 0
+                        METRICS.key(format_key(i, j), "hit")
                     else:
-                        print("No data")
                         no_data_sequence += 1
+                        METRICS.key(format_key(i, j), "miss")
+                except TimeoutExpired:
+                    self.flag = True
+                    METRICS.key(format_key(i, j), "timeout")
                 except Exception as e:
-                    now = datetime.datetime.now()
-                    index = "0"*(5-len(str(j)))+str(j)
-                    key = f"P{i}-{index}"
-                    error_message = f"{now}: {str(e)};\nThere was an error sending the keys or scraping the data: {key}"
-                    with open("errors.txt", "a") as f:
-                        f.write(error_message + "\n\n")
-                    self._flag = True
-
-                print(f"Execution time: {time.perf_counter()-start_time:.6f}\n")
-
-                print("Most recent data scraped:")
-                print(DATA.tail(5))
+                    log_error(format_key(i, j), e)
+                    self.flag = True
+                    METRICS.key(format_key(i, j), "error")
 
-                if j % 10 == 0:
-                    self.calculateTime()
-
-                if self._flag:
-                    #This property can only be set true by the measure_time thread
+                if self.flag:
+                    #Set by the timeout scheduler or after an error; retry the same index
                     j -= 1
+                else:
+                    JOURNAL.done(i, j)
 
                 #Generally increase the jth index after each iteration
                 j += 1
 
-                if no_data_sequence >= 50 and abs(datetime.datetime.now() - datetime.datetime.strptime(DATA.tail(1)["Issued"].iloc[-1], '%b %d, %Y %I:%M %p')) <= datetime.timedelta(days=30):
+                if no_data_sequence >= 50 and is_current(last_issued):
                     save_data(pd.DataFrame(), save = True)
+                    JOURNAL.retire(i, j)
                     break
 
             i += 1
+        save_data(pd.DataFrame(), save = True)
+        METRICS.report(force=True)
         print("Finished scraping all the data.")
         self.calculateTime()
 
-if __name__ == "__main__":
-    driver = selenium_driver()
-
-    scraper = Scraper("https://cars.byu.edu/citations/")
-    scraper.go()
+URL = "https://cars.byu.edu/citations/"
 
+def wait_for_login():
     user_input = input("Are you logged in yet? (y/n): ").rstrip().upper()
 
     while user_input != "Y":
         print("Waiting for user to log in...")
         input("Press any key to continue...")
         user_input = input("Are you logged in yet? (y/n): ").rstrip().upper()
-    
-    scraper.main_loop(i=8, j=26001, start_at={"i": True, "j": True})
\ No newline at end of file
+
+if __name__ == "__main__":
+    #The command line is in scrape.py (see there for why)
+    import runpy
+    runpy.run_module("scrape", run_name="__main__")
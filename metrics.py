@@ -0,0 +1,151 @@
+import threading
+import functools
+import time
+import json
+import os
+
+#Latency histograms for each stage of a lookup, counters for how every key turned out, and keys per minute.
+#Snapshots are written every `interval` seconds, either as a Prometheus textfile (path ending in .prom,
+#for the node exporter's textfile collector) or appended as JSON lines, along with a one line progress
+#summary on the console.
+
+#Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")]
+
+RESULTS = ["hit", "miss", "timeout", "error"]
+
+class Histogram():
+
+    def __init__(self):
+        self.counts = [0]*len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        #Upper bound of the bucket the q-th quantile falls in
+        rank = q*self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+class Metrics():
+
+    def __init__(self, path=None, interval=30.0):
+        self.path = path
+        self.interval = interval
+
+        self._lock = threading.RLock()
+        self.stages = {}
+        self.results = {result: 0 for result in RESULTS}
+        self.last_key = None
+
+        self.start_time = time.perf_counter()
+        self._last_report = self.start_time
+        self._last_keys = 0
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def timed(self, stage):
+        #Decorator that records how long every call takes under the given stage
+        def decorator(f):
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def key(self, key, result):
+        #Counts how a key turned out: hit, miss, timeout or error
+        with self._lock:
+            self.results[result] += 1
+            self.last_key = key
+        self.report()
+
+    @property
+    def keys(self):
+        #Keys that are finished (timeouts and errors get retried)
+        return self.results["hit"] + self.results["miss"]
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self.start_time
+            return {
+                "time": time.time(),
+                "elapsed": elapsed,
+                "last_key": self.last_key,
+                "results": dict(self.results),
+                "keys_per_minute": 60*self.keys/elapsed if elapsed > 0 else 0.0,
+                "recent_keys_per_minute": 60*(self.keys - self._last_keys)/(now - self._last_report) if now > self._last_report else 0.0,
+                "stages": {stage: {"buckets": dict(zip([str(b) for b in BUCKETS], h.counts)), "sum": h.sum, "count": h.count, "max": h.max}
+                           for stage, h in self.stages.items()},
+            }
+
+    def prometheus(self, snapshot):
+        lines = ["# TYPE scraper_stage_seconds histogram"]
+        for stage, h in snapshot["stages"].items():
+            cumulative = 0
+            for bound, count in h["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {h["sum"]}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {h["count"]}')
+        lines.append("# TYPE scraper_keys_total counter")
+        for result, count in snapshot["results"].items():
+            lines.append(f'scraper_keys_total{{result="{result}"}} {count}')
+        lines.append("# TYPE scraper_keys_per_minute gauge")
+        lines.append(f'scraper_keys_per_minute {snapshot["recent_keys_per_minute"]}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self, snapshot):
+        results = snapshot["results"]
+        line = (f"{snapshot['last_key']} | {results['hit'] + results['miss']} keys ({results['hit']} hits, {results['miss']} no data, "
+                f"{results['timeout']} timeouts, {results['error']} errors) | "
+                f"{snapshot['recent_keys_per_minute']:.1f} keys/min ({snapshot['keys_per_minute']:.1f} overall)")
+        with self._lock:
+            latencies = [f"{stage} p50<={h.quantile(0.5)}s" for stage, h in self.stages.items()]
+        return line + (" | " + ", ".join(latencies) if latencies else "")
+
+    def report(self, force=False):
+        #Writes a snapshot and prints the progress summary at most once every interval seconds
+        with self._lock:
+            now = time.perf_counter()
+            if not force and now - self._last_report < self.interval:
+                return
+            snapshot = self.snapshot()
+            self._last_report = now
+            self._last_keys = self.keys
+        print(self.summary(snapshot))
+        if self.path is None:
+            return
+        if self.path.endswith(".prom"):
+            #Written to a temporary file first so the exporter never reads half a file
+            with open(self.path + ".tmp", "w") as f:
+                f.write(self.prometheus(snapshot))
+            os.replace(self.path + ".tmp", self.path)
+        else:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+#Shared by every scraper in the process
+METRICS = Metrics()
@@ -0,0 +1,289 @@
+import asyncio
+import argparse
+import datetime
+import math
+import random
+
+from aiohttp import web
+
+#A local stand-in for the citations server so the scrapers can be run and tested offline.
+#Citations are generated deterministically from the key: officer n has issued indexes 0 up to
+#last_index, of which roughly hit_rate are real citations, and every response is delayed by latency seconds
+#(lookups by up to jitter more). stall_rate of the lookups never answer in time, like the real site sometimes doesn't.
+#The citation page itself (/citations/) is served too, with the elements main.py finds it by, so the browser
+#scraper can be load tested against it; the page loads a stylesheet, a font and an image it doesn't need.
+#It also stands in for the weather (Open-Meteo) and air quality (Weatherbit) history APIs of fetcher.py,
+#with values generated deterministically from the date.
+
+STATES = ["UT", "UT", "UT", "ID", "AZ", "NV", "CA", "CO", "WA", "TX"]
+VIOLATIONS = ["No Permit", "Expired Meter", "Reserved Stall", "Fire Lane", "Handicap Stall"]
+
+def fake_citation(officer, index, last_index, seed=0):
+    #Same key and seed always give the same citation; the last index was issued today
+    rng = random.Random(f"{seed}-{officer}-{index}")
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time(8))
+    issued = today - datetime.timedelta(minutes=(last_index - index)*37 + rng.randint(0, 36))
+    fine = rng.choice([0, 15, 20, 25, 35, 50, 75, 100])
+    paid = rng.random() < 0.8
+    actions = [] if paid else ["APPEAL", "PAY"]
+    return {
+        "citationNumber": f"P{officer}-{str(index).zfill(5)}",
+        "licensePlate": f"{rng.choice(STATES)} {rng.randint(100000, 999999)}",
+        "fineAmount": float(fine),
+        "issuedDate": issued.isoformat(),
+        "location": f"Lot {rng.randint(1, 60)}",
+        "violation": rng.choice(VIOLATIONS),
+        "actions": actions,
+    }
+
+def fake_weather(day, seed=0):
+    #One day of the Open-Meteo daily archive
+    rng = random.Random(f"{seed}-weather-{day}")
+    mean = 11 - 14*math.cos(2*math.pi*(day.timetuple().tm_yday - 15)/365) + rng.gauss(0, 3)
+    return {
+        "time": day.isoformat(),
+        "temperature_2m_max": round(mean + rng.uniform(4, 9), 1),
+        "temperature_2m_min": round(mean - rng.uniform(4, 9), 1),
+        "temperature_2m_mean": round(mean, 1),
+        "rain_sum": round(max(0.0, rng.gauss(-2, 4)), 1),
+        "snowfall_sum": round(max(0.0, rng.gauss(-3, 3)) if mean < 2 else 0.0, 2),
+        "wind_speed_10m_max": round(rng.uniform(5, 35), 1),
+    }
+
+def fake_air_quality(hour, seed=0):
+    #One hour of the Weatherbit air quality history (gases in ug/m3)
+    rng = random.Random(f"{seed}-aq-{hour.isoformat()}")
+    return {
+        "datetime": hour.strftime('%Y-%m-%d:%H'),
+        "timestamp_local": hour.isoformat(),
+        "aqi": rng.randint(10, 120),
+        "co": round(rng.uniform(100, 600), 1),
+        "no2": round(rng.uniform(1, 60), 1),
+        "o3": round(rng.uniform(20, 160), 1),
+        "pm10": round(rng.uniform(1, 80), 1),
+        "pm25": round(rng.uniform(1, 40), 1),
+        "so2": round(rng.uniform(0, 5), 1),
+    }
+
+#The citation page, with the Vuetify classes main.py relies on: the "Find Citation" button (v-btn__content), the
+#search field (.v-text-field__slot input) and its button (.v-input__append-inner button), and the result card,
+#with a .col per field, a .text-center h4 when there is no citation, and the appeal/pay buttons under .text-center.
+#Searching clears the card at once and renders the lookup's response when it comes back
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Citations</title>
+<link rel="stylesheet" href="/citations/static/app.css">
+</head>
+<body>
+<div id="app">
+  <img src="/citations/static/logo.png" alt="Parking Services">
+  <button type="button" id="find" class="v-btn"><span class="v-btn__content">Find Citation</span></button>
+  <div id="search" hidden>
+    <div class="v-input"><div class="v-input__control"><div class="v-input__slot">
+      <div class="v-text-field__slot"><input type="text" id="key" placeholder="Citation Number"></div>
+      <div class="v-input__append-inner"><button type="button" class="v-btn"><span class="v-btn__content">Search</span></button></div>
+    </div></div></div>
+  </div>
+  <div id="result"></div>
+</div>
+<script>
+var FIELDS = [["citationNumber", "Citation"], ["licensePlate", "License Plate/Vin"], ["fineAmount", "Fine"],
+              ["issuedDate", "Issued"], ["location", "Location"], ["violation", "Violation"]];
+var MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+var searches = 0;
+
+function escape(text) {
+    return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+
+function pad(n) {
+    return (n < 10 ? "0" : "") + n;
+}
+
+function show(field, value) {
+    //Fines and dates are shown the way the site shows them: $1,020.00 and Oct 10, 2023 01:37 PM
+    if (field === "fineAmount") {
+        return "$" + Number(value).toLocaleString("en-US", {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    }
+    if (field === "issuedDate") {
+        var d = new Date(value);
+        var hour = d.getHours() % 12 || 12;
+        return MONTHS[d.getMonth()] + " " + pad(d.getDate()) + ", " + d.getFullYear() + " " + pad(hour) + ":" +
+            pad(d.getMinutes()) + " " + (d.getHours() < 12 ? "AM" : "PM");
+    }
+    return value;
+}
+
+function card(citation) {
+    if (citation === null) {
+        return '<div class="v-card"><div class="v-card__text"><div class="text-center"><h4>No citation was found</h4></div></div></div>';
+    }
+    var cols = FIELDS.map(function (f) {
+        return '<div class="col">' + escape(f[1] + ": " + show(f[0], citation[f[0]])) + "</div>";
+    });
+    var buttons = (citation.actions || []).map(function (action) {
+        return '<button type="button" class="v-btn"><span class="v-btn__content">' + escape(action) + "</span></button>";
+    });
+    return '<div class="v-card"><div class="v-card__text"><div class="row">' + cols.join("") + "</div>" +
+        '<div class="text-center">' + buttons.join("") + "</div></div></div>";
+}
+
+document.getElementById("find").addEventListener("click", function () {
+    document.getElementById("search").hidden = false;
+});
+
+document.querySelector(".v-input__append-inner button").addEventListener("click", function () {
+    var key = document.getElementById("key").value.trim();
+    var result = document.getElementById("result");
+    var search = ++searches;
+    result.innerHTML = "";
+    fetch("/citations/api/citations/" + encodeURIComponent(key)).then(function (response) {
+        if (response.status === 404) {
+            return null;
+        }
+        if (!response.ok) {
+            throw new Error("Lookup failed: " + response.status);
+        }
+        return response.json();
+    }).then(function (citation) {
+        //A newer search replaced this one
+        if (search === searches) {
+            result.innerHTML = card(citation);
+        }
+    }).catch(function () {});
+});
+</script>
+</body>
+</html>
+"""
+
+STYLESHEET = """@font-face { font-family: "Site"; src: url("/citations/static/site.woff2") format("woff2"); }
+body { font-family: "Site", sans-serif; background: url("/citations/static/background.jpg"); }
+.v-card { border: 1px solid #ccc; padding: 16px; }
+"""
+
+#Static resources the page loads and their content types; everything but the stylesheet is filler of ASSET_SIZE bytes
+ASSETS = {"app.css": "text/css", "site.woff2": "font/woff2", "logo.png": "image/png", "background.jpg": "image/jpeg"}
+ASSET_SIZE = 200000
+
+#Seconds a stalled lookup waits before answering, well past the scrapers' timeouts
+STALL = 120
+
+def dates(request, exclusive_end=False):
+    start = datetime.date.fromisoformat(request.query["start_date"])
+    end = datetime.date.fromisoformat(request.query["end_date"])
+    if exclusive_end:
+        end -= datetime.timedelta(days=1)
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+class MockSite():
+
+    def __init__(self, latency=0.0, hit_rate=0.5, last_index=2000, seed=0, jitter=0.0, stall_rate=0.0):
+        self.latency = latency
+        self.hit_rate = hit_rate
+        self.last_index = last_index
+        self.seed = seed
+        self.jitter = jitter
+        self.stall_rate = stall_rate
+
+        #Number of requests served, handy when measuring throughput
+        self.requests = 0
+
+    def citation(self, key):
+        #Returns the citation stored under a key like P8-00042, or None
+        try:
+            officer, index = key[1:].split("-")
+            officer, index = int(officer), int(index)
+        except ValueError:
+            return None
+        if index > self.last_index:
+            return None
+        if random.Random(f"{self.seed}-hit-{officer}-{index}").random() >= self.hit_rate:
+            return None
+        return fake_citation(officer, index, self.last_index, self.seed)
+
+    async def delay(self):
+        #Every lookup waits latency plus up to jitter seconds; stall_rate of them wait long enough to time out
+        if self.stall_rate > 0 and random.random() < self.stall_rate:
+            await asyncio.sleep(STALL)
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter > 0 else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def page(self, request):
+        return web.Response(text=PAGE, content_type="text/html")
+
+    async def asset(self, request):
+        name = request.match_info["name"]
+        if name not in ASSETS:
+            raise web.HTTPNotFound()
+        body = STYLESHEET.encode() if name == "app.css" else bytes(ASSET_SIZE)
+        return web.Response(body=body, content_type=ASSETS[name])
+
+    async def api_citation(self, request):
+        self.requests += 1
+        await self.delay()
+        #A key without a citation gets an explicit null, not a 404 (which an unknown route gets)
+        return web.json_response(self.citation(request.match_info["key"]))
+
+    async def api_weather(self, request):
+        self.requests += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        try:
+            days = [fake_weather(day, self.seed) for day in dates(request)]
+        except (KeyError, ValueError):
+            raise web.HTTPBadRequest()
+        daily = {field: [day[field] for day in days] for field in (days[0] if days else {"time": None})}
+        return web.json_response({"latitude": float(request.query.get("latitude", 0)),
+                                  "longitude": float(request.query.get("longitude", 0)),
+                                  "timezone": request.query.get("timezone", "GMT"), "daily": daily})
+
+    async def api_air_quality(self, request):
+        self.requests += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        try:
+            #Like Weatherbit, end_date is the first day that isn't returned
+            days = dates(request, exclusive_end=True)
+        except (KeyError, ValueError):
+            raise web.HTTPBadRequest()
+        hours = [datetime.datetime.combine(day, datetime.time(h)) for day in days for h in range(24)]
+        return web.json_response({"lat": float(request.query.get("lat", 0)), "lon": float(request.query.get("lon", 0)),
+                                  "data": [fake_air_quality(hour, self.seed) for hour in hours]})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/citations/", self.page)
+        app.router.add_get("/citations/static/{name}", self.asset)
+        app.router.add_get("/citations/api/citations/{key}", self.api_citation)
+        app.router.add_get("/v1/archive", self.api_weather)
+        app.router.add_get("/v2.0/history/airquality", self.api_air_quality)
+        return app
+
+    def endpoint(self, port):
+        #The endpoint to hand to lookup.HttpLookup
+        return f"http://127.0.0.1:{port}/citations/api/citations/{{key}}"
+
+    def url(self, port):
+        #The page to hand to main.py's --url
+        return f"http://127.0.0.1:{port}/citations/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local mock of the citations site")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--hit-rate", type=float, default=0.5, help="Share of issued indexes that are citations")
+    parser.add_argument("--last-index", type=int, default=2000, help="Last issued index of every officer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many more seconds of latency, at random")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Share of lookups that never answer in time")
+    args = parser.parse_args()
+
+    site = MockSite(args.latency, args.hit_rate, args.last_index, args.seed, args.jitter, args.stall_rate)
+    print(f"Citation page: {site.url(args.port)}")
+    print(f"Citation endpoint: {site.endpoint(args.port)}")
+    print(f"Weather and air quality: python fetcher.py weather --base-url http://127.0.0.1:{args.port} ...")
+    web.run_app(site.app(), host="127.0.0.1", port=args.port)
@@ -0,0 +1,244 @@
+import pandas as pd
+import threading
+import queue
+
+from main import Scraper, selenium_driver, save_data, format_key, log_error, wait_for_login, issued_time, JOURNAL
+from timeouts import TimeoutExpired
+from probe import plan_ranges, stored_last, last_before, is_current
+from metrics import METRICS
+
+#Runs a pool of independent browser sessions over the citation keys.
+#Each worker pulls (officer, start, stop) shards from a shared work queue and hands every
+#citation it finds to a single writer thread, which is the only thread that touches DATA.
+#Workers report every key back to the queue, which retires an officer like Scraper.main_loop does: after
+#no_data_limit keys in a row without a citation, when the citation right before them is current. The runs of
+#empty keys are kept per officer, so they carry over from one shard into the next whichever worker scrapes them.
+
+class WorkQueue():
+
+    def __init__(self, ranges, shard_size=500, no_data_limit=50, stored=None):
+        #ranges maps each officer to the range of indexes to scrape; stored is each officer's highest stored
+        #citation (see probe.stored_last). Shards finished by an earlier run are skipped and half finished ones
+        #pick up where they stopped
+        self._shards = queue.Queue()
+        self._lock = threading.Lock()
+        self.no_data_limit = no_data_limit
+        self._ranges = ranges
+        self._stored = stored or {}
+
+        #First index of each officer that no longer needs to be scraped
+        self._retired = {}
+        #Issue time of every citation found this run, by officer and index
+        self._issued = {}
+        #Runs of empty keys of each officer as [start, stop) ranges: the stop of each run by its start, and the
+        #start of each run by its stop
+        self._run_stops = {}
+        self._run_starts = {}
+
+        for officer, indexes in ranges.items():
+            for start in range(indexes.start, indexes.stop, shard_size):
+                stop = min(start + shard_size, indexes.stop)
+                start = JOURNAL.resume_index(officer, start, stop)
+                if start < stop:
+                    self._shards.put((officer, start, stop))
+
+    def put(self, officer, start, stop):
+        #Hands a shard (or what's left of one) back to be scraped
+        self._shards.put((officer, start, stop))
+
+    def __len__(self):
+        return self._shards.qsize()
+
+    def get(self):
+        #Returns the next shard worth scraping, or None when the queue is drained
+        while True:
+            try:
+                officer, start, stop = self._shards.get_nowait()
+            except queue.Empty:
+                return None
+            if not self.is_retired(officer, start):
+                return officer, start, stop
+
+    def is_retired(self, officer, index):
+        with self._lock:
+            return index >= self._retired.get(officer, float("inf"))
+
+    def retire(self, officer, index):
+        #Stop handing out (or finishing) shards of this officer past the given index
+        with self._lock:
+            self._retired[officer] = min(index, self._retired.get(officer, float("inf")))
+        JOURNAL.retire(officer, index)
+
+    def hit(self, officer, index, data):
+        #A citation was found at index: the run of empty keys after it (if already scraped) may now be retirable
+        with self._lock:
+            self._issued.setdefault(officer, {})[index] = issued_time(data)
+            stop = self._run_stops.get(officer, {}).get(index + 1)
+            retire = None if stop is None else self._retire_at(officer, index + 1, stop)
+        if retire is not None:
+            self.retire(officer, retire)
+
+    def miss(self, officer, index):
+        #No citation at index: it joins the runs of empty keys on either side of it
+        with self._lock:
+            stops, starts = self._run_stops.setdefault(officer, {}), self._run_starts.setdefault(officer, {})
+            start, stop = index, index + 1
+            if start in starts:
+                start = starts.pop(start)
+                del stops[start]
+            if stop in stops:
+                stop = stops.pop(stop)
+                del starts[stop]
+            stops[start], starts[stop] = stop, start
+            retire = self._retire_at(officer, start, stop)
+        if retire is not None:
+            self.retire(officer, retire)
+
+    def _retire_at(self, officer, start, stop):
+        #Where Scraper.main_loop would retire the officer over the run of empty keys [start, stop), if anywhere
+        if stop - start < self.no_data_limit:
+            return None
+        issued = self._issued.get(officer, {})
+        if start - 1 in issued:
+            last_issued = issued[start - 1]
+        elif start == self._ranges[officer].start or JOURNAL.is_done(officer, start - 1):
+            #The run starts the officer's range or where an earlier run left off: the citation before it is the
+            #last one found before start this run, or the highest stored one
+            earlier = [i for i in issued if i < start]
+            last_issued = issued[max(earlier)] if earlier else last_before(self._stored, officer, start)
+        else:
+            #The key before the run hasn't been scraped yet
+            return None
+        if not is_current(last_issued):
+            return None
+        return start + self.no_data_limit
+
+class ParallelScraper():
+
+    def __init__(self, url, workers=4, shard_size=500, flush_every=1000, no_data_limit=50, driver_options=None, login=True,
+                 max_reload_failures=5):
+        self._url = url
+        self.workers = workers
+        self.shard_size = shard_size
+        self.flush_every = flush_every
+        self.no_data_limit = no_data_limit
+        self._login = login
+        #A worker whose page fails to reload this many times in a row gives up (its shards go to the other workers)
+        self.max_reload_failures = max_reload_failures
+
+        #Passed on to selenium_driver; Chrome can't open a profile twice, so each worker keeps its own
+        options = dict(driver_options or {})
+        profile_dir = options.pop("profile_dir", None)
+        self.scrapers = [Scraper(url, selenium_driver(**options, profile_dir=profile_dir and f"{profile_dir}-{i}"))
+                         for i in range(workers)]
+        self.results = queue.Queue()
+
+    def login(self):
+        for scraper in self.scrapers:
+            scraper.go()
+        if self._login:
+            print(f"Log in to each of the {self.workers} browser windows.")
+            wait_for_login()
+
+    def write(self):
+        #The single writer: buffers citations and flushes them to file every flush_every rows
+        pending = 0
+        while True:
+            result = self.results.get()
+            if result is None:
+                break
+            officer, index, data = result
+            pending += 1
+            save_data(data, save = pending >= self.flush_every)
+            #Only journaled once the row is in the buffer (and so in the journal too)
+            JOURNAL.done(officer, index)
+            if pending >= self.flush_every:
+                pending = 0
+        save_data(pd.DataFrame(), save = True)
+
+    def reload(self, scraper, officer, j, stop):
+        #Reloads the page; when that fails the rest of the shard goes back on the queue
+        try:
+            scraper.recover()
+            return True
+        except Exception as e:
+            log_error(format_key(officer, j), e)
+            scraper.flag = True
+            self.work.put(officer, j, stop)
+            return False
+
+    def work_shards(self, scraper):
+        #The page is loaded before the first key
+        scraper.flag = True
+        reload_failures = 0
+        while (shard := self.work.get()) is not None:
+            officer, j, stop = shard
+            while j < stop and not self.work.is_retired(officer, j):
+                if JOURNAL.is_done(officer, j):
+                    #Finished by an earlier run (see journal.py)
+                    j += 1
+                    continue
+
+                if scraper.flag:
+                    if not self.reload(scraper, officer, j, stop):
+                        reload_failures += 1
+                        break
+                    reload_failures = 0
+
+                try:
+                    scraped_data = scraper.scrape(officer, j)
+                    if not scraped_data.empty:
+                        self.results.put((officer, j, scraped_data))
+                        self.work.hit(officer, j, scraped_data)
+                        METRICS.key(format_key(officer, j), "hit")
+                    else:
+                        JOURNAL.done(officer, j)
+                        self.work.miss(officer, j)
+                        METRICS.key(format_key(officer, j), "miss")
+                except TimeoutExpired:
+                    scraper.flag = True
+                    METRICS.key(format_key(officer, j), "timeout")
+                except Exception as e:
+                    log_error(format_key(officer, j), e)
+                    scraper.flag = True
+                    METRICS.key(format_key(officer, j), "error")
+
+                if scraper.flag:
+                    #Retry the same key once the page has been reloaded
+                    continue
+                j += 1
+
+            if reload_failures >= self.max_reload_failures:
+                print(f"A browser failed to reload {reload_failures} times in a row and stopped (see errors.txt)")
+                return
+
+    def run(self, discover=False, incremental=False):
+        self.login()
+
+        #Probing the index ranges (see probe.py) is sequential, so it runs on the first browser before the pool starts
+        scraper = self.scrapers[0]
+        if discover:
+            scraper.find_citation()
+        ranges = plan_ranges(scraper, scraper.officers, len(scraper.index)+1, discover, incremental)
+        self.work = WorkQueue(ranges, self.shard_size, self.no_data_limit, stored_last())
+
+        writer = threading.Thread(target=self.write)
+        writer.start()
+
+        threads = [threading.Thread(target=self.work_shards, args=(scraper,)) for scraper in self.scrapers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.results.put(None)
+        writer.join()
+
+        if len(self.work) > 0:
+            print(f"{len(self.work)} shards were left unscraped because every browser stopped; run again to pick them up")
+
+        for scraper in self.scrapers:
+            scraper.driver.quit()
+        METRICS.report(force=True)
+        print("Finished scraping all the data.")
+        self.scrapers[0].calculateTime()
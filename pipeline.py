@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+#Builds the daily data set (Provo.csv) and its compact version (citations_cleaned_compact.csv) from the
+#citation level data, instead of by hand across the notebooks. The citations are streamed in chunks
+#(from a CSV file or the Parquet store, see store.py) and only each chunk's per day counts and sums are
+#kept, added up as they come in, so memory depends on the number of days and not on the number of citations.
+#The daily totals are then joined with environment.csv and the calendar from enrollment.csv on sorted dates.
+#
+#   python pipeline.py --citations ParkingCitationsEncrypted.csv
+#   python pipeline.py --citations ParkingCitations.parquet
+
+CITATIONS = "ParkingCitationsEncrypted.csv"
+ENVIRONMENT = "environment.csv"
+ENROLLMENT = "enrollment.csv"
+OUTPUT = "Provo.csv"
+COMPACT = "citations_cleaned_compact.csv"
+CHUNKSIZE = 100000
+
+COLUMNS = ["IssuedDate", "Fine", "Unpaid"]
+TOTALS = ["DailyNumFines", "NumPaidFines", "TotalFineAmount"]
+FINES = TOTALS + ["AvgPaidFine"]
+WEEKDAYS = {"Monday": "Mon", "Tuesday": "Tues", "Wednesday": "Wed", "Thursday": "Thurs",
+            "Friday": "Fri", "Saturday": "Sat", "Sunday": "Sun"}
+CALENDAR = ["Term", "Enrollment", "FullTime", "Holiday", "Exam"]
+COMPACT_COLUMNS = ["IssuedDate", "Year", "Month", "Day"] + FINES + [
+    "MinTemp", "RainPrecip", "SnowPrecip", "Wind", "CO", "CO_LEVEL", "NO2", "NO2_LEVEL", "O3", "O3_LEVEL",
+    "PM10", "PM10_LEVEL", "PM25", "PM25_LEVEL", "NA_Correction", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun",
+    "AQI", "AQI_LEVEL"]
+
+def read_chunks(path, chunksize=CHUNKSIZE, columns=COLUMNS):
+    #Yields the citations a chunk at a time, only with the columns the daily totals need (every column with None)
+    if os.path.isdir(path):
+        import store
+        files = store.dataset(path)
+        if columns is not None:
+            columns = [c for c in columns if c in files.schema.names]
+        for batch in files.to_batches(columns=columns, batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=None if columns is None else (lambda c: c in columns), chunksize=chunksize)
+
+def daily_partials(chunk):
+    #Number of citations, number of paid fines and their total per issued day of one chunk
+    dates = pd.to_datetime(chunk["IssuedDate"]).dt.normalize().to_numpy()
+    fines = pd.to_numeric(chunk["Fine"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    paid = fines > 0
+    if "Unpaid" in chunk:
+        paid &= ~chunk["Unpaid"].astype("boolean").fillna(False).to_numpy(dtype=bool)
+    partial = pd.DataFrame({"DailyNumFines": 1.0, "NumPaidFines": paid.astype(float),
+                            "TotalFineAmount": np.where(paid, fines, 0)}, index=pd.DatetimeIndex(dates, name="DATE"))
+    return partial.groupby(level=0, sort=True).sum()
+
+def daily_totals(chunks):
+    #Adds up the chunks' partial totals, which only ever hold one row per day
+    totals = pd.DataFrame(columns=TOTALS, index=pd.DatetimeIndex([], name="DATE"), dtype=float)
+    for chunk in chunks:
+        totals = totals.add(daily_partials(chunk), fill_value=0)
+    return totals.sort_index()
+
+def holidays(text):
+    #Multi-day holidays of enrollment.csv (2014-11-26/2014-11-28); single days (+) were never flagged in Provo.csv,
+    #so they are left out to build it the same way
+    days = []
+    for part in str(text).split("+"):
+        if "/" in part:
+            begin, end = part.split("/")
+            days.append(pd.date_range(begin, end))
+    return days
+
+def calendar(dates, enrollment):
+    #Term, enrollment, holiday and exam flags of every date. A term runs from the day after the year's previous term
+    #ends (Winter from January 1st) through its exams, so the days between terms count toward the next term and
+    #the days after the Fall exams toward Fall. Days outside classes and exams are holidays.
+    terms = enrollment.copy()
+    for col in ["ClassBegins", "LastDay", "ExamsStart", "ExamsEnd"]:
+        terms[col] = pd.to_datetime(terms[col])
+    #A few exam end dates in enrollment.csv are typos from before the exams start; those terms end on their last day
+    terms["End"] = terms[["LastDay", "ExamsEnd"]].max(axis=1)
+    terms = terms.sort_values("ClassBegins").reset_index(drop=True)
+    january = pd.to_datetime(terms["Year"].astype(str) + "-01-01")
+    terms["Start"] = (terms.groupby("Year")["End"].shift() + pd.Timedelta(days=1)).fillna(january)
+
+    days = pd.DataFrame({"DATE": pd.DatetimeIndex(dates)})
+    days = pd.merge_asof(days, terms[["Start", "Term", "Enrollment", "FullTime"]], left_on="DATE", right_on="Start")
+
+    date = days["DATE"].to_numpy()
+    def within(begins, ends):
+        #Whether every date falls in one of the (sorted, non-overlapping) begin through end ranges
+        begins, ends = np.asarray(begins, dtype="datetime64[ns]"), np.asarray(ends, dtype="datetime64[ns]")
+        i = np.searchsorted(begins, date, side="right") - 1
+        return (i >= 0) & (date <= ends[np.maximum(i, 0)])
+
+    classes = within(terms["ClassBegins"], terms["LastDay"])
+    #Empty where the exam end date is a typo
+    exam = within(terms["ExamsStart"], terms["ExamsEnd"])
+    breaks = [day for text in terms["Holidays"] for day in holidays(text)]
+    holiday = ~(classes | exam) | within([b[0] for b in breaks], [b[-1] for b in breaks])
+
+    days["Holiday"] = holiday.astype(int)
+    days["Exam"] = exam.astype(int)
+    return days.set_index("DATE")[CALENDAR]
+
+def build(totals, environment, enrollment):
+    #Provo.csv: every day of environment.csv with its citation totals (0 without citations), weekday dummies and calendar
+    environment = environment.drop(columns=[c for c in environment.columns if c.startswith("Unnamed")])
+    environment["DATE"] = pd.to_datetime(environment["DATE"])
+    provo = environment.sort_values("DATE").set_index("DATE")
+
+    #Both sides are sorted by date, so these joins are merges of sorted keys
+    provo["Year"] = provo.index.year
+    provo = provo.join(totals[TOTALS], how="left")
+    provo[TOTALS] = provo[TOTALS].fillna(0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        provo["AvgPaidFine"] = np.where(provo["NumPaidFines"] > 0, provo["TotalFineAmount"]/provo["NumPaidFines"], 0)
+    for day in sorted(WEEKDAYS.values()):
+        provo[day] = (provo["Day"].map(WEEKDAYS) == day).astype(int)
+    provo = provo.join(calendar(provo.index, enrollment), how="left")
+    return provo.reset_index()
+
+def compact(provo):
+    #citations_cleaned_compact.csv: only the days with citations and the columns of the first analysis
+    days = provo[provo["DailyNumFines"] > 0].rename(columns={"DATE": "IssuedDate"})
+    return days[COMPACT_COLUMNS]
+
+def write(data, path):
+    data = data.copy()
+    for col in ["DATE", "IssuedDate"]:
+        if col in data:
+            data[col] = data[col].dt.strftime('%Y-%m-%d')
+    data.to_csv(path, index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build Provo.csv from the citations, environment.csv and enrollment.csv")
+    parser.add_argument("--citations", default=CITATIONS, help="Citation CSV file or Parquet store directory")
+    parser.add_argument("--environment", default=ENVIRONMENT)
+    parser.add_argument("--enrollment", default=ENROLLMENT)
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--compact", default=COMPACT)
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Citations read at a time")
+    args = parser.parse_args()
+
+    totals = daily_totals(read_chunks(args.citations, args.chunksize))
+    provo = build(totals, pd.read_csv(args.environment), pd.read_csv(args.enrollment))
+    write(provo, args.output)
+    write(compact(provo), args.compact)
+    print(f"{int(totals['DailyNumFines'].sum())} citations over {len(totals)} days, {len(provo)} days written to {args.output}")
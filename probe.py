@@ -0,0 +1,98 @@
+import datetime
+
+from store import read_citations, STORE
+
+#Finds where each officer's issued citation indexes end so only that range has to be scanned.
+#Most of the 0-99,999 indexes of an officer have never been issued. Instead of walking them one by one,
+#probe exponentially growing steps until an index comes back empty, then bisect back to the last issued index.
+#Citations can be missing inside an issued range, so a probe at index k only counts as empty when none of
+#the next `gap` indexes is a citation (the same 50 misses in a row main_loop stops an officer at).
+
+#How the citation page shows issue times, i.e. Oct 10, 2023 01:37 PM
+ISSUED_FORMAT = '%b %d, %Y %I:%M %p'
+
+class RangeProbe():
+
+    def __init__(self, any_issued, gap=50, samples=5):
+        #any_issued(officer, indexes) returns whether any of the indexes is a citation
+        self.any_issued = any_issued
+        self.gap = gap
+        self.samples = samples
+
+        #Number of windows probed, to compare against a dense scan
+        self.probes = 0
+
+    def alive(self, officer, index, stop):
+        #Try a few keys spread over the window first, and only look at the rest when none of them is a citation
+        self.probes += 1
+        window = range(index, min(index + self.gap, stop))
+        step = max(1, self.gap // self.samples)
+        return self.any_issued(officer, window[::step]) or self.any_issued(officer, [j for j in window if (j - index) % step])
+
+    def find_end(self, officer, start, stop):
+        #Returns the index just past the officer's issued range (with a margin of gap), or start if nothing is issued
+        if not self.alive(officer, start, stop):
+            return start
+
+        #Grow the step until a probe comes back empty: lo is always issued, hi never is
+        lo, step = start, self.gap
+        while True:
+            hi = lo + step
+            if hi >= stop:
+                return stop
+            if not self.alive(officer, hi, stop):
+                break
+            lo, step = hi, step*2
+
+        while hi - lo > self.gap:
+            mid = (lo + hi)//2
+            if self.alive(officer, mid, stop):
+                lo = mid
+            else:
+                hi = mid
+
+        return min(hi + self.gap, stop)
+
+    def discover(self, officers, stop, starts={}):
+        #Returns the range of indexes worth scanning for every officer
+        ranges = {}
+        for officer in officers:
+            start = starts.get(officer, 0)
+            ranges[officer] = range(start, self.find_end(officer, start, stop))
+            print(f"Officer {officer}: scanning indexes {ranges[officer].start}-{ranges[officer].stop} ({self.probes} probes so far)")
+        return ranges
+
+def stored_last(root=STORE):
+    #Index and issue time of each officer's highest stored citation
+    stored = read_citations(root, columns=["Citation", "Issued"])
+    keys = stored["Citation"].astype("string").str.extract(r'P(\d+)-(\d+)')
+    stored = stored[keys.notna().all(axis=1).to_numpy()]
+    keys = keys.dropna().astype(int)
+    last = {}
+    for officer, index, issued in zip(keys[0], keys[1], stored["Issued"]):
+        if officer not in last or index > last[officer][0]:
+            last[officer] = (index, issued)
+    return {officer: (index, datetime.datetime.strptime(issued, ISSUED_FORMAT)) for officer, (index, issued) in last.items()}
+
+def stored_progress(root=STORE):
+    #Highest index already scraped for each officer
+    return {officer: index for officer, (index, issued) in stored_last(root).items()}
+
+def last_before(stored, officer, index):
+    #Issue time of the officer's highest stored citation (see stored_last) if it comes before index, otherwise None
+    if officer in stored and stored[officer][0] < index:
+        return stored[officer][1]
+    return None
+
+def is_current(issued):
+    #Whether a citation was issued in the last 30 days: an officer whose citation before a run of keys without
+    #any is this recent has nothing issued past them (the scrapers retire the officer there)
+    return issued is not None and abs(datetime.datetime.now() - issued) <= datetime.timedelta(days=30)
+
+def plan_ranges(backend, officers, stop, discover=False, incremental=False):
+    #Ranges of indexes to scrape for each officer: everything, or only what is left past the stored
+    #citations (incremental), cut down to the issued range (discover)
+    starts = {officer: index + 1 for officer, index in stored_progress().items()} if incremental else {}
+    if discover:
+        return RangeProbe(backend.any_issued).discover(officers, stop, starts)
+    return {officer: range(starts.get(officer, 0), stop) for officer in officers}
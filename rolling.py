@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+#Rolling means for the dashboard's smoothness sliders from prefix sums: the sum of a window is the difference
+#of two cumulative sums, so a mean over any window size is a couple of vectorized lookups instead of a
+#pandas rolling pass. The cumulative sums of every column (and of how many values aren't missing) are built
+#once for all rows and once per group (i.e. per weekday). Missing values (NaN) are left out of the sums; like
+#pandas, a window needs min_periods values that aren't missing (all of them by default) to have a mean.
+
+def prefix_sums(values):
+    #Cumulative sums with a leading row of zeros, of the values and of how many aren't missing
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    missing = np.isnan(values)
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    counts = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(missing, 0, values), axis=0, out=sums[1:])
+    np.cumsum(~missing, axis=0, out=counts[1:])
+    return sums, counts
+
+def window_means(sums, counts, window, min_periods=None):
+    #Mean of the window rows ending at every row, NaN where fewer than min_periods of them aren't missing
+    min_periods = window if min_periods is None else min_periods
+    n = len(sums) - 1
+    end = np.arange(1, n + 1)
+    start = np.maximum(end - window, 0)
+    total = sums[end] - sums[start]
+    count = counts[end] - counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count >= max(min_periods, 1), total/count, np.nan)
+
+def blank(data, columns, ranges, date="DATE"):
+    #The columns as an array, with the rows whose date falls in one of the (begin, end) ranges set to missing
+    values = data[columns].to_numpy(dtype=float, copy=True)
+    for begin, end in ranges:
+        values[((data[date] >= pd.to_datetime(begin)) & (data[date] <= pd.to_datetime(end))).to_numpy()] = np.nan
+    return values
+
+class RollingMeans():
+
+    def __init__(self, values, columns, groups=None):
+        #values is a (rows x columns) array in date order; groups optionally labels every row (i.e. its weekday)
+        self.values = np.asarray(values, dtype=float)
+        self.columns = list(columns)
+        self.sums = prefix_sums(self.values)
+        self.groups = {}
+        if groups is not None:
+            groups = np.asarray(groups)
+            for label in pd.unique(groups):
+                rows = np.flatnonzero(groups == label)
+                self.groups[label] = (rows, prefix_sums(self.values[rows]))
+
+    def column(self, column):
+        return self.columns.index(column)
+
+    def mean(self, window, column, rows=None, min_periods=None):
+        #Rolling mean of the column over all rows, or over only the selected rows (a boolean mask) as if the
+        #others weren't there; returns one value per (selected) row
+        c = self.column(column)
+        if rows is None:
+            sums, counts = self.sums
+            return window_means(sums[:, c:c+1], counts[:, c:c+1], window, min_periods)[:, 0]
+        sums, counts = prefix_sums(self.values[np.asarray(rows, dtype=bool), c])
+        return window_means(sums, counts, window, min_periods)[:, 0]
+
+    def group_mean(self, window, column, min_periods=None):
+        #Rolling mean of the column within each group (over the group's earlier rows), aligned to the rows
+        c = self.column(column)
+        means = np.full(len(self.values), np.nan)
+        for rows, (sums, counts) in self.groups.values():
+            means[rows] = window_means(sums[:, c:c+1], counts[:, c:c+1], window, min_periods)[:, 0]
+        return means
@@ -0,0 +1,159 @@
+import pandas as pd
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pyarrow as pa
+
+#The types of the daily panel (Provo.csv) and a binary copy of it to load it from. Read with default types, the
+#day, term and level columns are Python strings, every flag is int64 and DATE is parsed from text on every load.
+#With the schema they are categoricals, int8/bool flags and float32 measures. The typed panel is saved next to
+#the CSV as an uncompressed Arrow IPC (Feather v2) file, which is memory-mapped when it's read. The file records
+#the size, modification time and hash of the CSV it was built from and is rebuilt when the CSV changes.
+#
+#   from schema import read_provo
+#   provo = read_provo("Provo.csv")
+
+PROVO = "Provo.csv"
+#Part of the cache, so changing the schema rebuilds it
+VERSION = 1
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TERMS = ["Winter", "Spring", "Summer", "Fall"]
+#The levels of AQI-Criteria.csv, from best to worst
+LEVELS = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"]
+
+MEASURES = ["MaxTemp", "MinTemp", "MeanTemp", "RainPrecip", "SnowPrecip", "Wind", "CO", "NO2", "O3", "PM10", "PM25",
+            "DailyNumFines", "NumPaidFines", "TotalFineAmount", "AvgPaidFine"]
+FLAGS = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun", "Holiday", "Exam"]
+
+SCHEMA = {
+    "DATE": "datetime64[ns]",
+    "Month": "int8",
+    "Day": pd.CategoricalDtype(DAYS),
+    "NA_Correction": "bool",
+    **{col: "float32" for col in MEASURES},
+    **{f"{p}_LEVEL": pd.CategoricalDtype(LEVELS, ordered=True) for p in ["CO", "NO2", "O3", "PM10", "PM25", "AQI"]},
+    "AQI": "int16",
+    "Year": "int16",
+    **{col: "int8" for col in FLAGS},
+    "Term": pd.CategoricalDtype(TERMS),
+    "Enrollment": "int32",
+    "FullTime": "int32",
+}
+
+def typed(data):
+    #The panel in the schema's types; columns the schema doesn't know are left as they are.
+    #Integers with missing values are kept as float32 rather than failing
+    data = data.copy()
+    for col, dtype in SCHEMA.items():
+        if col not in data:
+            continue
+        if col == "DATE":
+            data[col] = pd.to_datetime(data[col]).astype(dtype)
+        elif isinstance(dtype, str) and dtype.startswith("int") and data[col].isna().any():
+            data[col] = data[col].astype("float32")
+        else:
+            data[col] = data[col].astype(dtype)
+    return data
+
+def cache_path(path):
+    #Provo.csv -> Provo.feather, next to it
+    return os.path.splitext(path)[0] + ".feather"
+
+def content_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def stamp(path):
+    stat = os.stat(path)
+    return {"version": VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def source(cached):
+    #What the cache was built from, read from the file's schema without reading its data; None without a usable cache
+    try:
+        with pa.memory_map(cached) as f:
+            metadata = pa.ipc.open_file(f).schema.metadata or {}
+        return json.loads(metadata[b"provo"])
+    except (FileNotFoundError, pa.ArrowInvalid, KeyError, ValueError):
+        return None
+
+def is_fresh(cached, path):
+    built = source(cached)
+    if built is None or built.get("version") != VERSION:
+        return False
+    current = stamp(path)
+    if built["size"] == current["size"] and built["mtime_ns"] == current["mtime_ns"]:
+        return True
+    #Touched (i.e. checked out again) but not changed
+    return built["size"] == current["size"] and built["sha256"] == content_hash(path)
+
+def write_cache(data, path, cached=None):
+    #Saves the typed panel read from path to its cache
+    cached = cached or cache_path(path)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    built = {**stamp(path), "sha256": content_hash(path)}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"provo": json.dumps(built).encode()})
+    #Written to a temporary file first so a reader never maps half a file
+    temporary = f"{cached}.{os.getpid()}.tmp"
+    with pa.OSFile(temporary, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary, cached)
+
+def read_cache(cached):
+    with pa.memory_map(cached) as f:
+        return pa.ipc.open_file(f).read_all().to_pandas()
+
+def read_provo(path=PROVO, cache=True):
+    #The panel in the schema's types, from the cache when it was built from this CSV (building it otherwise)
+    if not cache:
+        return typed(pd.read_csv(path))
+    cached = cache_path(path)
+    if is_fresh(cached, path):
+        try:
+            return read_cache(cached)
+        except (OSError, pa.ArrowInvalid):
+            pass
+    data = typed(pd.read_csv(path))
+    try:
+        write_cache(data, path, cached)
+    except OSError:
+        #A read-only directory just means no cache
+        pass
+    return data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the typed binary cache of Provo.csv and compare loading it with the CSV")
+    parser.add_argument("path", nargs="?", default=PROVO)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the cache even if it's up to date")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(cache_path(args.path)):
+        os.remove(cache_path(args.path))
+    provo = read_provo(args.path)
+    print(f"{cache_path(args.path)}: {len(provo)} days, {os.path.getsize(cache_path(args.path))/1e6:.2f} MB")
+
+    def best(load):
+        seconds = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            load()
+            seconds.append(time.perf_counter() - start)
+        return min(seconds)
+
+    def csv():
+        data = pd.read_csv(args.path)
+        data["DATE"] = pd.to_datetime(data["DATE"])
+        return data
+
+    for name, load in [("CSV (default types)", csv), ("CSV (schema)", lambda: read_provo(args.path, cache=False)),
+                       ("Cache", lambda: read_provo(args.path))]:
+        memory = load().memory_usage(deep=True).sum()
+        print(f"{name:<20} {best(load)*1000:8.2f} ms  {memory/1e6:6.2f} MB in memory")
@@ -0,0 +1,90 @@
+import argparse
+
+from main import Scraper, selenium_driver, wait_for_login, open_journal, JOURNAL, JOURNAL_PATH, URL
+from probe import plan_ranges, stored_last
+from metrics import METRICS
+from store import compact
+
+#The command line of the scrapers (python main.py runs it too).
+#It lives here rather than in main.py because a script runs as __main__: lookup.py and parallel.py import main,
+#which would load a second copy of it with its own DATA and JOURNAL. Here every module shares the one imported as main.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape BYU parking citations")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of browser sessions to scrape with in parallel")
+    parser.add_argument("--shard-size", type=int, default=500,
+                        help="Number of indexes handed to a worker at a time (parallel mode)")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium",
+                        help="Drive the rendered page, or call the citation request directly")
+    parser.add_argument("--endpoint", default=None,
+                        help="Citation request URL, with {key} in place of the citation key (required by the http backend)")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="Maximum number of open requests (http backend)")
+    parser.add_argument("--login", action=argparse.BooleanOptionalAction, default=True,
+                        help="Wait for a login in the browser first (the http backend reuses its cookies)")
+    parser.add_argument("--url", default=URL, help="Citation page, i.e. http://127.0.0.1:8080/citations/ for mocksite.py")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the browsers without a window, and without images, fonts and stylesheets")
+    parser.add_argument("--block-resources", action=argparse.BooleanOptionalAction, default=None,
+                        help="Block images, fonts and stylesheets (the default with --headless)")
+    parser.add_argument("--profile-dir", default=None,
+                        help="Chrome profile directory to keep between runs, so the login is kept too")
+    parser.add_argument("--discover", action="store_true",
+                        help="Probe where each officer's issued indexes end and only scan up to there")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Start each officer after the highest index already in the citation store")
+    parser.add_argument("--journal", default=JOURNAL_PATH,
+                        help="Journal of scraped keys; a scrape picks up where the last one stopped")
+    parser.add_argument("--metrics", default=None,
+                        help="Write scraper metrics to this file: a Prometheus textfile if it ends in .prom, JSON lines otherwise")
+    parser.add_argument("--metrics-interval", type=float, default=30.0,
+                        help="Seconds between metrics snapshots and progress lines")
+    args = parser.parse_args()
+    if args.backend == "http" and args.endpoint is None:
+        parser.error("--backend http needs --endpoint")
+
+    METRICS.path = args.metrics
+    METRICS.interval = args.metrics_interval
+
+    open_journal(args.journal)
+
+    driver_options = {"headless": args.headless, "block_resources": args.block_resources, "profile_dir": args.profile_dir}
+
+    if args.backend == "http":
+        from lookup import HttpLookup, cookies_from_driver
+
+        cookies = None
+        if args.login:
+            #Logging in needs a window
+            driver = selenium_driver(profile_dir=args.profile_dir)
+            driver.get(args.url)
+            wait_for_login()
+            cookies = cookies_from_driver(driver)
+            driver.quit()
+
+        lookup = HttpLookup(args.endpoint, concurrency=args.concurrency, cookies=cookies)
+        ranges = plan_ranges(lookup, lookup.officers, len(lookup.index)+1, args.discover, args.incremental)
+        lookup.main_loop(ranges=JOURNAL.resume(ranges), stored=stored_last())
+    elif args.workers > 1:
+        from parallel import ParallelScraper
+
+        ParallelScraper(args.url, workers=args.workers, shard_size=args.shard_size, driver_options=driver_options,
+                        login=args.login).run(args.discover, args.incremental)
+    else:
+        driver = selenium_driver(**driver_options)
+
+        scraper = Scraper(args.url, driver)
+        scraper.go()
+
+        if args.login:
+            wait_for_login()
+
+        if args.discover:
+            scraper.find_citation()
+        ranges = plan_ranges(scraper, scraper.officers, len(scraper.index)+1, args.discover, args.incremental)
+        scraper.main_loop(ranges=JOURNAL.resume(ranges), stored=stored_last())
+
+    JOURNAL.close()
+    #One file per partition instead of one per flush
+    compact()
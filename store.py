@@ -0,0 +1,130 @@
+import pandas as pd
+import argparse
+import time
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+#Citations are stored as typed, compressed Parquet files partitioned by year and officer
+#(ParkingCitations.parquet/Year=2022/Officer=8/part-....parquet).
+#Readers only open the partitions (and row groups) that can match their date and officer filters,
+#and only the columns they ask for, instead of parsing the whole CSV and its date strings every time.
+#Every flush of the scraper adds a small file to each partition it touches; compact() merges them into one file
+#per partition (scrape.py runs it at the end of every scrape).
+
+STORE = "ParkingCitations.parquet"
+
+PARTITIONING = ds.partitioning(pa.schema([("Year", pa.int16()), ("Officer", pa.int8())]), flavor="hive")
+
+#Schema of every file read so far by path. Stored files are never rewritten (new ones get new names),
+#so each footer is only read once per process
+SCHEMAS = {}
+
+def typed(data):
+    #Turns a cleaned frame (see main.clean_data) into the stored types
+    data = data.copy()
+    issued = pd.to_datetime(data["IssuedDate"])
+    data["IssuedDate"] = issued.dt.date
+    data["Year"] = issued.dt.year.astype("int16")
+    data["Officer"] = pd.to_numeric(data["Officer"]).astype("Int8")
+    data["Fine"] = pd.to_numeric(data["Fine"]).astype(float)
+    if "Unpaid" in data:
+        data["Unpaid"] = data["Unpaid"].astype(bool)
+    for col in data.columns:
+        if data[col].dtype == object or pd.api.types.is_string_dtype(data[col]):
+            if col != "IssuedDate":
+                data[col] = data[col].astype("string")
+    return data
+
+def write_citations(data, root=STORE):
+    #Adds the citations to the store as new files; nothing already stored is rewritten
+    table = pa.Table.from_pandas(typed(data), preserve_index=False)
+    ds.write_dataset(table, root, format="parquet", partitioning=PARTITIONING,
+                     basename_template=f"part-{time.time_ns()}-{{i}}.parquet",
+                     existing_data_behavior="overwrite_or_ignore",
+                     file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"))
+
+def dataset(root=STORE):
+    files = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    #Scraped pages don't always have the same fields, so combine the columns of every file
+    schemas = set()
+    for fragment in files.get_fragments():
+        path = os.path.abspath(fragment.path)
+        if path not in SCHEMAS:
+            SCHEMAS[path] = fragment.physical_schema
+        schemas.add(SCHEMAS[path])
+    if len(schemas) > 1:
+        schema = pa.unify_schemas(list(schemas) + [PARTITIONING.schema])
+        files = ds.dataset(root, format="parquet", partitioning=PARTITIONING, schema=schema)
+    return files
+
+def compact(root=STORE):
+    #Rewrites each partition made of more than one file as a single file, dropping rows stored twice
+    if not os.path.exists(root):
+        return
+    partitions = {}
+    for fragment in dataset(root).get_fragments():
+        partitions.setdefault(os.path.dirname(fragment.path), []).append(fragment.path)
+    for directory, paths in partitions.items():
+        if len(paths) < 2:
+            continue
+        schema = pa.unify_schemas([SCHEMAS[os.path.abspath(path)] for path in paths])
+        rows = ds.dataset(paths, format="parquet", schema=schema).to_table().to_pandas().drop_duplicates()
+        #The new file is written before the old ones are removed, so a crash in between only leaves duplicates
+        #(which the next compaction drops)
+        pq.write_table(pa.Table.from_pandas(rows, schema=schema, preserve_index=False),
+                       os.path.join(directory, f"part-{time.time_ns()}-0.parquet"), compression="zstd")
+        for path in paths:
+            os.remove(path)
+            SCHEMAS.pop(os.path.abspath(path), None)
+
+def to_date(date):
+    return pd.Timestamp(date).date()
+
+def read_citations(root=STORE, start=None, end=None, officers=None, columns=None, exclude=()):
+    #Citations issued from start through end (inclusive), optionally only for some officers,
+    #leaving out the date ranges in exclude, i.e. exclude=[("2020-04-01", "2020-08-31")]
+    if not os.path.exists(root):
+        return pd.DataFrame(columns=columns)
+
+    issued = ds.field("IssuedDate")
+    year = ds.field("Year")
+    conditions = []
+    if start is not None:
+        conditions += [year >= to_date(start).year, issued >= to_date(start)]
+    if end is not None:
+        conditions += [year <= to_date(end).year, issued <= to_date(end)]
+    if officers is not None:
+        conditions.append(ds.field("Officer").isin(list(officers)))
+    for begin, stop in exclude:
+        conditions.append(~((issued >= to_date(begin)) & (issued <= to_date(stop))))
+
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+
+    citations = dataset(root).to_table(columns=columns, filter=condition).to_pandas()
+    if "IssuedDate" in citations:
+        citations["IssuedDate"] = pd.to_datetime(citations["IssuedDate"])
+    return citations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between the citation CSV files and the Parquet store")
+    parser.add_argument("--root", default=STORE, help="Directory of the Parquet store")
+    parser.add_argument("--from-csv", default=None, help="Add the citations of a CSV file (i.e. ParkingCitationsEncrypted.csv) to the store")
+    parser.add_argument("--to-csv", default=None, help="Write every stored citation to a CSV file")
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument("--compact", action="store_true", help="Merge the files of each partition into one")
+    args = parser.parse_args()
+
+    if args.from_csv:
+        for chunk in pd.read_csv(args.from_csv, chunksize=args.chunksize):
+            write_citations(chunk, args.root)
+    if args.compact:
+        compact(args.root)
+    if args.to_csv:
+        citations = read_citations(args.root)
+        citations["IssuedDate"] = citations["IssuedDate"].dt.strftime('%Y-%m-%d')
+        citations.to_csv(args.to_csv, index=False)
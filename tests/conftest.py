@@ -0,0 +1,59 @@
+import datetime
+import os
+import random
+import sys
+import time
+
+import pytest
+
+#The modules live at the top of the repository and import each other by name
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+import main
+from lookup import format_citation
+from mocksite import fake_citation
+from store import read_citations
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    #Scrapers save to the citation store, errors.txt and the journal in the working directory
+    monkeypatch.chdir(tmp_path)
+    main.DATA.clear()
+    yield tmp_path
+    main.DATA.clear()
+
+def citation(officer, index, last_index=2000):
+    #A citation row as the scrapers buffer it, from mocksite.py's citation for the key
+    return format_citation(fake_citation(officer, index, last_index))
+
+#An officer whose indexes up to LAST are all citations except an old gap (the citation before it is about 38 days old)
+LAST = 1900
+GAP = range(400, 461)
+CITATIONS = set(range(LAST + 1)) - set(GAP)
+
+class FakeScraper():
+    #Stands in for a browser session over CITATIONS, answering a little slower or faster at random
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.flag = False
+
+    def recover(self):
+        self.flag = False
+
+    def scrape(self, officer, index):
+        time.sleep(self.rng.random()*0.0005)
+        if index not in CITATIONS:
+            return pd.DataFrame()
+        return citation(officer, index, LAST)
+
+def stored(index):
+    #Officer 1's highest stored citation is at index (see probe.stored_last)
+    return {1: (index, datetime.datetime.fromisoformat(fake_citation(1, index, LAST)["issuedDate"]))}
+
+def stored_indexes():
+    #Indexes of the citations saved to the store in the working directory
+    return set(read_citations(columns=["Citation"])["Citation"].str.slice(3).astype(int))
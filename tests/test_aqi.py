@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from conftest import ROOT
+from aqi import parse, add_aqi, breakpoints
+
+CRITERIA = f"{ROOT}/AQI-Criteria.csv"
+
+def test_parse_keeps_the_sign():
+    parsed = parse(["12.5", "-5", "P 37.3 +", "-0.4", None, "--"])
+    np.testing.assert_array_equal(parsed, [12.5, -5, 37.3, -0.4, np.nan, np.nan])
+
+def test_parse_implied_decimals():
+    np.testing.assert_array_equal(parse(["P 074", "0.061", "-0.002"], implied=3), [0.074, 0.061, -0.002])
+
+def test_breakpoints():
+    #The upper breakpoint of a row is that row's highest AQI, one step above it the next row's lowest
+    table = breakpoints(CRITERIA)
+    np.testing.assert_array_equal(table.sub_index("PM25", np.array([0, 12.0, 12.1, 35.4, 35.5, 500.4])),
+                                  [0, 50, 51, 100, 101, 500])
+    np.testing.assert_array_equal(table.sub_index("O3", np.array([0.054, 0.0709])), [50, 100])
+
+def test_negative_readings_count_as_zero():
+    table = breakpoints(CRITERIA)
+    np.testing.assert_array_equal(table.sub_index("PM25", np.array([-5, -0.4, np.nan])), [0, 0, np.nan])
+
+    data = add_aqi(pd.DataFrame({"PM25": parse(["-5", "12.0"]), "O3": [np.nan, np.nan]}), ["PM25", "O3"], CRITERIA)
+    assert list(data["AQI"]) == [0, 50]
+    assert list(data["AQI_LEVEL"]) == ["Good", "Good"]
+    assert data["O3_LEVEL"].isna().all()
+
+def test_levels_match_the_sub_index():
+    #12.05 truncates to 12.0, the top of Good; untruncated it would fall between the rows and be called Moderate
+    table = breakpoints(CRITERIA)
+    values = np.array([12.05, 0.0709, -0.4, np.nan])
+    pollutants = ["PM25", "O3", "PM25", "PM25"]
+    levels = [table.level(p, [v])[0] for p, v in zip(pollutants, values)]
+    assert levels == ["Good", "Moderate", "Good", None]
+    assert [table.aqi_level(table.sub_index(p, [v]))[0] for p, v in zip(pollutants, values)] == levels
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+import main
+from conftest import citation
+from main import CitationBuffer, clean_data, save_data
+from journal import Journal
+from store import read_citations
+
+def test_append_skips_empty_rows():
+    buffer = CitationBuffer()
+    assert buffer.empty
+    assert buffer.append(pd.DataFrame()) == []
+    assert buffer.append(pd.DataFrame([{"Citation": None, "Fine": np.nan}])) == []
+    rows = buffer.append(citation(1, 5))
+    buffer.append(citation(1, 6))
+    assert len(buffer) == 2 and not buffer.empty
+    assert rows[0]["Citation"] == "P1-00005"
+    assert list(buffer.tail(1)["Citation"]) == ["P1-00006"]
+    assert list(buffer.frame()["Citation"]) == ["P1-00005", "P1-00006"]
+    buffer.clear()
+    assert buffer.empty
+
+def test_clean_data():
+    data = clean_data(pd.DataFrame({"Citation": ["P8-00042", "P10-00001"], "License Plate/Vin": ["UT 123456", "ID 654321"],
+                                    "Fine": ["$1,020.00", "$15.00"], "Issued": ["Oct 10, 2023 01:37 PM", "Jan 06, 2014 08:05 AM"]}))
+    assert list(data["Officer"]) == ["8", "10"]
+    assert list(data["Fine"]) == [1020.0, 15.0]
+    assert list(data["Residence"]) == ["UT", "ID"]
+    assert list(data["IssuedDate"]) == ["2023-10-10", "2014-01-06"]
+    assert list(data["IssuedTime"]) == ["01:37 PM", "08:05 AM"]
+
+def test_save_data_flushes_to_the_store(workdir, monkeypatch):
+    journal = Journal()
+    journal.open(str(workdir / "scrape.journal"))
+    monkeypatch.setattr(main, "JOURNAL", journal)
+
+    keys = [(officer, index) for officer in [2, 3] for index in range(1990, 2000)]
+    for officer, index in keys:
+        save_data(citation(officer, index))
+    assert len(main.DATA) == len(keys)
+    save_data(pd.DataFrame(), save=True)
+    assert main.DATA.empty
+    journal.close()
+
+    stored = read_citations()
+    assert sorted(stored["Citation"]) == sorted(f"P{officer}-{index:05d}" for officer, index in keys)
+    assert set(stored["Officer"]) == {2, 3}
+    #Saved rows aren't pending anymore
+    journal = Journal()
+    journal.open(str(workdir / "scrape.journal"))
+    assert journal.pending_rows().empty
+    journal.close()
@@ -0,0 +1,12 @@
+import numpy as np
+
+from enrich import time_of_day
+
+def test_time_of_day():
+    #Non-ASCII text (here a no-break space and an accented word) goes to the pandas fallback instead of failing
+    #the byte conversion
+    offsets = time_of_day(["01:37 PM", "12:00 AM", "1:37 PM", "01:37 PM", "été", None, ""])
+    minutes = [13*60 + 37, 0, 13*60 + 37, 13*60 + 37, None, None, None]
+    expected = np.array([np.timedelta64(m*60, "s") if m is not None else np.timedelta64("NaT") for m in minutes],
+                        dtype="timedelta64[ns]")
+    np.testing.assert_array_equal(offsets, expected)
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from journal import Journal
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "scrape.journal")
+
+def reopen(path):
+    journal = Journal()
+    journal.open(path)
+    return journal
+
+def crash(journal):
+    #Stops writing without closing, like a killed process (every record is synced, see sync_every)
+    journal._file.flush()
+    journal._file = None
+
+def test_resume_starts_after_finished_keys(path):
+    journal = Journal(sync_every=1)
+    journal.open(path)
+    for index in range(0, 10):
+        journal.done(1, index)
+    crash(journal)
+
+    journal = reopen(path)
+    assert journal.resume({1: range(0, 30), 2: range(0, 30)}) == {1: range(10, 30), 2: range(0, 30)}
+
+def test_resume_stops_at_the_first_unfinished_key(path):
+    #Like the parallel scraper: misses are journaled straight away, the hit at 5 only once the writer saves it
+    journal = Journal(sync_every=1)
+    journal.open(path)
+    for index in [0, 1, 2, 3, 4, 6, 7, 8, 9]:
+        journal.done(1, index)
+    crash(journal)
+
+    journal = reopen(path)
+    assert journal.resume({1: range(0, 30)}) == {1: range(5, 30)}
+    assert journal.resume_index(1, 0, 5) == 5
+    assert not journal.is_done(1, 5)
+    #The keys after it are skipped while scanning
+    assert all(journal.is_done(1, index) for index in range(6, 10))
+
+def test_rows_count_as_finished_keys(path):
+    journal = Journal(sync_every=1)
+    journal.open(path)
+    journal.done(1, 0)
+    journal.rows([{"Citation": "P1-00001", "Fine": "$20.00"}])
+    crash(journal)
+
+    journal = reopen(path)
+    assert journal.pending_rows().to_dict("records") == [{"Citation": "P1-00001", "Fine": "$20.00"}]
+    assert journal.resume({1: range(0, 30)}) == {1: range(2, 30)}
+
+def test_flushed_rows_are_not_pending(path):
+    journal = Journal(sync_every=1)
+    journal.open(path)
+    journal.rows([{"Citation": "P1-00000"}])
+    journal.flushed()
+    journal.rows([{"Citation": "P1-00001"}])
+    crash(journal)
+
+    journal = reopen(path)
+    assert list(journal.pending_rows()["Citation"]) == ["P1-00001"]
+
+def test_retired_officers(path):
+    journal = Journal(sync_every=1)
+    journal.open(path)
+    for index in range(0, 3):
+        journal.done(1, index)
+    journal.retire(1, 20)
+    journal.retire(2, 0)
+    crash(journal)
+
+    journal = reopen(path)
+    assert journal.resume({1: range(0, 30), 2: range(0, 30)}) == {1: range(3, 20)}
+
+def test_compaction_keeps_what_is_left(path):
+    journal = Journal(sync_every=1)
+    journal.open(path)
+    for index in [0, 1, 2, 5, 6, 9]:
+        journal.done(1, index)
+    journal.retire(2, 7)
+    crash(journal)
+
+    reopen(path).close()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [record for record in records if record["t"] == "done"] == [
+        {"t": "done", "officer": 1, "start": 0, "stop": 3},
+        {"t": "done", "officer": 1, "start": 5, "stop": 7},
+        {"t": "done", "officer": 1, "start": 9, "stop": 10},
+    ]
+    assert reopen(path).resume({1: range(0, 30), 2: range(0, 30)}) == {1: range(3, 30), 2: range(0, 7)}
+
+def test_empty_and_cut_off_records(path):
+    with open(path, "w") as f:
+        f.write(json.dumps({"t": "done", "officer": 1, "start": 4, "stop": 4}) + "\n")
+        f.write('{"t": "done", "officer": 1, "sta')
+    journal = reopen(path)
+    assert journal.resume({1: range(0, 30)}) == {1: range(0, 30)}
+    assert journal.pending_rows().empty
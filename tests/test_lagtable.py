@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from lagtable import lag_matrix, lag_coefficients, coefficient_table, lag_curve
+
+@pytest.fixture
+def panel():
+    #Autocorrelated series on very different scales
+    rng = np.random.default_rng(1)
+    n = 300
+    a = np.zeros(n)
+    for t in range(2, n):
+        a[t] = 0.6*a[t - 1] - 0.2*a[t - 2] + rng.normal()
+    return pd.DataFrame({"a": a, "b": 1000 + 5*np.cumsum(rng.normal(size=n)) + rng.normal(size=n)})
+
+def reference(values, lags):
+    #Regression of the series on lagged copies of itself, built the slow way
+    frame = pd.DataFrame({f"lag{lag}": pd.Series(values).shift(lag) for lag in range(1, lags + 1)})
+    frame["y"] = values
+    frame = frame.dropna()
+    return LinearRegression().fit(frame.drop(columns="y"), frame["y"]).coef_
+
+def test_lag_matrix():
+    np.testing.assert_array_equal(lag_matrix(np.arange(6), 2), [[1, 0], [2, 1], [3, 2], [4, 3]])
+
+@pytest.mark.parametrize("lags", [1, 3, 10])
+def test_lag_coefficients_match_sklearn(panel, lags):
+    np.testing.assert_allclose(lag_coefficients(panel["a"], lags), reference(panel["a"].to_numpy(), lags), rtol=1e-8, atol=1e-10)
+
+def test_coefficient_table_matches_sklearn(panel):
+    max_lags = 12
+    tables = coefficient_table(panel, ["a", "b"], max_lags)
+    for metric in ["a", "b"]:
+        assert tables[metric].shape == (max_lags, max_lags)
+        for lags in range(1, max_lags + 1):
+            np.testing.assert_allclose(tables[metric][lags - 1, :lags], reference(panel[metric].to_numpy(), lags),
+                                       rtol=1e-6, atol=1e-8)
+            assert np.isnan(tables[metric][lags - 1, lags:]).all()
+
+def test_lag_curve(panel):
+    table = coefficient_table(panel, ["a"], 5)["a"]
+    curve = lag_curve(table, 3)
+    assert list(curve["Lag"]) == [1, 2, 3]
+    np.testing.assert_array_equal(curve["Delta"], table[2, :3])
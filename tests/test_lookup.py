@@ -0,0 +1,130 @@
+import asyncio
+import collections
+import datetime
+
+import pandas as pd
+import pytest
+from aiohttp import web
+
+import main
+import lookup
+from journal import Journal
+from lookup import HttpLookup
+from mocksite import MockSite, fake_citation
+from store import read_citations
+
+class FlakySite(MockSite):
+    #Answers the first `failures` lookups of each key in `flaky` with a 503
+
+    def __init__(self, flaky=(), failures=0, **kwargs):
+        super().__init__(**kwargs)
+        self.flaky = set(flaky)
+        self.failures = failures
+        self.failed = collections.Counter()
+
+    async def api_citation(self, request):
+        key = request.match_info["key"]
+        if key in self.flaky and self.failed[key] < self.failures:
+            self.failed[key] += 1
+            raise web.HTTPServiceUnavailable()
+        return await super().api_citation(request)
+
+class WrongSite(MockSite):
+    #Answers every lookup with a 404, or with a page instead of JSON
+
+    def __init__(self, status=404, **kwargs):
+        super().__init__(**kwargs)
+        self.status = status
+
+    async def api_citation(self, request):
+        self.requests += 1
+        if self.status == 404:
+            raise web.HTTPNotFound()
+        return web.Response(text="<html>Log in</html>", content_type="text/html")
+
+async def scan(site, officer, indexes, **kwargs):
+    runner = web.AppRunner(site.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    try:
+        #One attempt per lookup, so a failure comes back straight away
+        scraper = HttpLookup(site.endpoint(runner.addresses[0][1]), concurrency=8, retries=1)
+        async with scraper.session() as session:
+            return await scraper.scan_officer(session, officer, indexes, batch_size=16, **kwargs)
+    finally:
+        await runner.cleanup()
+
+def citations():
+    return sorted(row["Citation"] for row in main.DATA.rows)
+
+def test_scan_matches_the_site(workdir):
+    site = MockSite(last_index=100)
+    assert asyncio.run(scan(site, 3, range(1, 80))) == []
+    expected = sorted(f"P3-{index:05d}" for index in range(1, 80) if site.citation(f"P3-{index:05d}") is not None)
+    assert citations() == expected
+
+def test_officer_without_new_citations_is_retired(workdir):
+    #Everything up to index 100 is stored already, and the last of those citations is current
+    site = MockSite(last_index=100)
+    last_issued = datetime.datetime.fromisoformat(fake_citation(3, 100, 100)["issuedDate"])
+    assert asyncio.run(scan(site, 3, range(101, 100000), last_issued=last_issued)) == []
+    assert main.DATA.empty
+    #One batch past the 50 empty keys at most
+    assert site.requests <= 50 + 16
+
+@pytest.mark.parametrize("status", [404, 200])
+def test_wrong_endpoint_is_not_journaled(workdir, monkeypatch, status):
+    #Neither a 404 nor a page that isn't JSON means there is no citation, so no key is done or retired
+    journal = Journal()
+    monkeypatch.setattr(main, "JOURNAL", journal)
+    monkeypatch.setattr(lookup, "JOURNAL", journal)
+    last_issued = datetime.datetime.now()
+    assert asyncio.run(scan(WrongSite(status), 3, range(1, 80), rounds=0, last_issued=last_issued)) == list(range(1, 80))
+    assert not any(journal.is_done(3, j) for j in range(1, 80))
+    assert journal.resume({3: range(1, 80)}) == {3: range(1, 80)}
+
+def test_failed_keys_are_looked_up_again(workdir):
+    healthy = MockSite(last_index=100)
+    hits = [f"P3-{index:05d}" for index in range(1, 80) if healthy.citation(f"P3-{index:05d}") is not None]
+    site = FlakySite(flaky=hits[:5], failures=2, last_index=100)
+    assert asyncio.run(scan(site, 3, range(1, 80))) == []
+    assert citations() == hits
+
+def test_keys_that_keep_failing_are_left_out(workdir):
+    healthy = MockSite(last_index=100)
+    hits = [f"P3-{index:05d}" for index in range(1, 80) if healthy.citation(f"P3-{index:05d}") is not None]
+    site = FlakySite(flaky=hits[:2], failures=100, last_index=100)
+    assert asyncio.run(scan(site, 3, range(1, 80))) == [int(key[3:]) for key in hits[:2]]
+    assert citations() == hits[2:]
+
+def test_crashed_scan_resumes(workdir, monkeypatch):
+    def use(journal):
+        monkeypatch.setattr(main, "JOURNAL", journal)
+        monkeypatch.setattr(lookup, "JOURNAL", journal)
+
+    healthy = MockSite(last_index=100)
+    hits = [f"P3-{index:05d}" for index in range(1, 80) if healthy.citation(f"P3-{index:05d}") is not None]
+    path = str(workdir / "scrape.journal")
+
+    #The first run can't look up its second citation and crashes with every citation it found still buffered
+    journal = Journal(sync_every=1)
+    use(journal)
+    main.open_journal(path)
+    site = FlakySite(flaky=[hits[1]], failures=100, last_index=100)
+    asyncio.run(scan(site, 3, range(1, 40)))
+    journal._file.flush()
+    journal._file = None
+    main.DATA.clear()
+
+    #The next run gets the buffered citations back and starts at the citation that failed
+    journal = Journal()
+    use(journal)
+    main.open_journal(path)
+    ranges = journal.resume({3: range(1, 80)})
+    assert ranges == {3: range(int(hits[1][3:]), 80)}
+    asyncio.run(scan(healthy, 3, ranges[3]))
+    main.save_data(pd.DataFrame(), save=True)
+    journal.close()
+
+    #Every citation is saved exactly once
+    assert sorted(read_citations(columns=["Citation"])["Citation"]) == hits
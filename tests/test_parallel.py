@@ -0,0 +1,41 @@
+import queue
+import threading
+
+from conftest import CITATIONS, LAST, FakeScraper, stored, stored_indexes
+from parallel import ParallelScraper, WorkQueue
+
+def run(ranges, workers=4, shard_size=100, stored=None):
+    scraper = object.__new__(ParallelScraper)
+    scraper.no_data_limit = 50
+    scraper.flush_every = 1000
+    scraper.max_reload_failures = 5
+    scraper.results = queue.Queue()
+    scraper.work = WorkQueue(ranges, shard_size, scraper.no_data_limit, stored)
+    writer = threading.Thread(target=scraper.write)
+    writer.start()
+    threads = [threading.Thread(target=scraper.work_shards, args=(FakeScraper(seed),)) for seed in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scraper.results.put(None)
+    writer.join()
+    return scraper.work
+
+def test_old_gap_does_not_retire_the_officer(workdir):
+    work = run({1: range(0, 5000)})
+    assert stored_indexes() == CITATIONS
+    #Retired where the keys after the last citation ran out, like the sequential scraper
+    assert work._retired == {1: LAST + 1 + 50}
+
+def test_empty_keys_carry_over_between_short_shards(workdir):
+    #With shards of 10 keys, the empty keys have to be counted across shards to reach 50 at all
+    work = run({1: range(0, 2100)}, shard_size=10)
+    assert stored_indexes() == CITATIONS
+    assert work._retired == {1: LAST + 1 + 50}
+
+def test_officer_without_new_citations_is_retired(workdir):
+    #Incremental: everything up to LAST is stored, and that citation is current
+    work = run({1: range(LAST + 1, 100000)}, stored=stored(LAST))
+    assert work._retired == {1: LAST + 1 + 50}
+    assert len(work) == 0
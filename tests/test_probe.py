@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+import pandas as pd
+
+from conftest import citation
+from main import clean_data
+from probe import RangeProbe, stored_last, stored_progress, last_before
+from store import write_citations
+
+def issued(last, hit_rate=0.5, seed=0):
+    #Indexes 0 through last are issued and about hit_rate of them are citations (last always is)
+    rng = random.Random(seed)
+    return {index for index in range(last) if rng.random() < hit_rate} | {last}
+
+@pytest.mark.parametrize("last", [0, 7, 49, 50, 51, 1234, 26543, 99998])
+def test_find_end_covers_every_citation(last):
+    citations = issued(last)
+    probe = RangeProbe(lambda officer, indexes: any(index in citations for index in indexes))
+    end = probe.find_end(1, 0, 100000)
+    assert last < end <= min(last + 1 + 2*probe.gap, 100000)
+    #Far fewer lookups than scanning every index
+    assert probe.probes < 60
+
+def test_nothing_issued():
+    probe = RangeProbe(lambda officer, indexes: False)
+    assert probe.find_end(1, 500, 100000) == 500
+
+def test_discover_starts_where_asked():
+    citations = {1: issued(300), 2: issued(5000, seed=1)}
+    probe = RangeProbe(lambda officer, indexes: any(index in citations[officer] for index in indexes))
+    ranges = probe.discover([1, 2], 100000, starts={2: 4000})
+    assert ranges[1].start == 0 and ranges[1].stop > 300
+    assert ranges[2].start == 4000 and ranges[2].stop > 5000
+
+def test_stored_last(workdir):
+    assert stored_last() == {}
+    write_citations(clean_data(pd.concat([citation(officer, index) for officer in [1, 2] for index in [5, 1500, 90]], ignore_index=True)))
+    last = stored_last()
+    assert stored_progress() == {1: 1500, 2: 1500}
+    assert last[2][1].strftime('%b %d, %Y %I:%M %p') == citation(2, 1500)["Issued"].iloc[0]
+    assert last_before(last, 2, 1501) == last[2][1]
+    assert last_before(last, 2, 1500) is None
+    assert last_before(last, 3, 1501) is None
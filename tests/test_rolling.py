@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rolling import RollingMeans, blank
+
+@pytest.fixture
+def panel():
+    rng = np.random.default_rng(0)
+    n = 400
+    data = pd.DataFrame({"DATE": pd.date_range("2020-01-01", periods=n, freq="D"),
+                         "a": rng.normal(50, 10, n), "b": rng.poisson(20, n).astype(float)})
+    data.loc[rng.random(n) < 0.1, "a"] = np.nan
+    data["Day"] = data["DATE"].dt.day_name()
+    return data
+
+@pytest.mark.parametrize("window", [1, 7, 30, 90])
+@pytest.mark.parametrize("min_periods", [None, 1])
+def test_mean_matches_pandas(panel, window, min_periods):
+    means = RollingMeans(panel[["a", "b"]].to_numpy(), ["a", "b"])
+    for column in ["a", "b"]:
+        expected = panel[column].rolling(window, min_periods=min_periods).mean().to_numpy()
+        np.testing.assert_allclose(means.mean(window, column, min_periods=min_periods), expected, rtol=1e-9, atol=1e-9)
+
+@pytest.mark.parametrize("window", [1, 4, 12])
+def test_group_mean_matches_pandas(panel, window):
+    means = RollingMeans(panel[["a", "b"]].to_numpy(), ["a", "b"], groups=panel["Day"])
+    for column in ["a", "b"]:
+        expected = panel.groupby("Day")[column].transform(lambda values: values.rolling(window, min_periods=1).mean())
+        np.testing.assert_allclose(means.group_mean(window, column, min_periods=1), expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+def test_selected_rows_match_pandas(panel):
+    means = RollingMeans(panel[["a", "b"]].to_numpy(), ["a", "b"])
+    rows = (panel["DATE"].dt.month % 2 == 0).to_numpy()
+    expected = panel.loc[rows, "b"].rolling(10).mean().to_numpy()
+    np.testing.assert_allclose(means.mean(10, "b", rows=rows), expected, rtol=1e-9, atol=1e-9)
+
+def test_blank(panel):
+    values = blank(panel, ["a", "b"], [("2020-02-01", "2020-02-10")])
+    dropped = ((panel["DATE"] >= "2020-02-01") & (panel["DATE"] <= "2020-02-10")).to_numpy()
+    assert np.isnan(values[dropped]).all()
+    np.testing.assert_array_equal(values[~dropped], panel.loc[~dropped, ["a", "b"]].to_numpy())
+    #The frame itself is left as it was
+    assert not panel.loc[dropped, "b"].isna().any()
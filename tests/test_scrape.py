@@ -0,0 +1,48 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+from store import read_citations
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def site():
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "mocksite.py"), "--port", str(port), "--last-index", "120"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}/citations/api/citations/{{key}}"
+    finally:
+        process.terminate()
+        process.wait()
+
+def scrape(endpoint, cwd):
+    return subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "--backend", "http", "--no-login",
+                           "--endpoint", endpoint, "--metrics-interval", "600"],
+                          cwd=cwd, capture_output=True, text=True, timeout=300, check=True).stdout
+
+def test_command_line_journals_and_resumes(site, tmp_path):
+    #Run as a script, main.py has to journal through the same JOURNAL the HTTP lookup uses
+    scrape(site, tmp_path)
+    saved = len(read_citations(root=str(tmp_path / "ParkingCitations.parquet")))
+    assert saved > 0
+    assert os.path.getsize(tmp_path / "ParkingCitations.journal") > 0
+
+    #Every officer was finished, so running it again looks nothing up
+    assert "0 keys" in scrape(site, tmp_path)
+    assert len(read_citations(root=str(tmp_path / "ParkingCitations.parquet"))) == saved
@@ -0,0 +1,41 @@
+import main
+from conftest import CITATIONS, LAST, FakeScraper, stored, stored_indexes
+from main import Scraper
+
+class Driver():
+    def set_script_timeout(self, seconds):
+        pass
+
+class OfflineScraper(Scraper):
+    #Scraper.main_loop over the keys of conftest.FakeScraper instead of a browser
+
+    def __init__(self):
+        super().__init__("http://127.0.0.1/citations/", Driver())
+        self.keys = FakeScraper(0)
+        self.scraped = []
+
+    def go(self):
+        pass
+
+    def find_citation(self):
+        pass
+
+    def calculateTime(self):
+        pass
+
+    def scrape(self, officer, index):
+        self.scraped.append(index)
+        return self.keys.scrape(officer, index)
+
+def test_main_loop_retires_after_the_last_citation(workdir):
+    scraper = OfflineScraper()
+    scraper.main_loop(ranges={1: range(0, 5000)})
+    assert stored_indexes() == CITATIONS
+    assert max(scraper.scraped) == LAST + 50
+
+def test_main_loop_without_new_citations(workdir):
+    #Nothing is buffered when every key comes back empty; the stored citation decides whether to retire
+    scraper = OfflineScraper()
+    scraper.main_loop(ranges={1: range(LAST + 1, 100000)}, stored=stored(LAST))
+    assert main.DATA.empty
+    assert max(scraper.scraped) == LAST + 50
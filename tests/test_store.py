@@ -0,0 +1,40 @@
+import os
+
+import pandas as pd
+
+from conftest import citation
+from main import clean_data
+from store import compact, dataset, read_citations, write_citations
+
+def test_read_citations_filters(workdir):
+    rows = pd.concat([citation(officer, index) for officer in [1, 2] for index in range(0, 2001, 100)], ignore_index=True)
+    save = clean_data(rows)
+    write_citations(save)
+
+    issued = pd.to_datetime(save["IssuedDate"])
+    start, end = issued.min() + pd.Timedelta(days=5), issued.max() - pd.Timedelta(days=5)
+    stored = read_citations(start=start, end=end, officers=[2], columns=["Citation", "IssuedDate"])
+    expected = save[(issued >= start) & (issued <= end) & (save["Officer"] == "2")]
+    assert sorted(stored["Citation"]) == sorted(expected["Citation"])
+
+    middle = (issued.min() + pd.Timedelta(days=10), issued.max() - pd.Timedelta(days=10))
+    stored = read_citations(exclude=[middle], columns=["Citation"])
+    expected = save[(issued < middle[0]) | (issued > middle[1])]
+    assert sorted(stored["Citation"]) == sorted(expected["Citation"])
+
+def test_compact(workdir):
+    rows = pd.concat([citation(officer, index) for officer in [1, 2] for index in range(0, 2001, 100)], ignore_index=True)
+    save = clean_data(rows)
+    #One file per flush, one of them stored twice, and one without the Location field
+    for part in [save[:10], save[10:20], save[10:20], save[20:].drop(columns=["Location"])]:
+        write_citations(part)
+    before = read_citations().sort_values("Citation", ignore_index=True)
+
+    compact()
+    partitions = {}
+    for path in dataset().files:
+        partitions[os.path.dirname(path)] = partitions.get(os.path.dirname(path), 0) + 1
+    assert set(partitions.values()) == {1}
+    after = read_citations().sort_values("Citation", ignore_index=True)
+    #Officer is int8 or Int8 depending on whether the files had to be unified
+    pd.testing.assert_frame_equal(after[before.columns], before.drop_duplicates(ignore_index=True), check_dtype=False)
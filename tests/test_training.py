@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from conftest import ROOT
+from features import LAGS
+from training import LeastSquares, DIFFERENCE, Trainer, design, read_provo
+
+def check(model, X, y):
+    reference = LinearRegression().fit(X, y)
+    np.testing.assert_allclose(model.coef_, reference.coef_, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(model.predict(X), reference.predict(X), rtol=1e-8, atol=1e-8)
+
+def test_least_squares_matches_sklearn():
+    rng = np.random.default_rng(2)
+    #Factors with large means, like enrollment, next to small ones
+    X = np.column_stack([rng.normal(30000, 500, 500), rng.normal(0, 1, 500), rng.poisson(3, 500)])
+    y = X @ [0.001, 2.0, -0.5] + rng.normal(size=500)
+    check(LeastSquares().update(X, y), X, y)
+
+def test_updates_match_one_fit():
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(600, 4))
+    y = X @ [1.0, -2.0, 0.5, 0.0] + 3 + rng.normal(size=600)
+    model = LeastSquares()
+    for start in range(0, 600, 150):
+        model.update(X[start:start + 150], y[start:start + 150])
+    check(model, X, y)
+
+def minimum_norm(X, y):
+    #Coefficients of the least squares solver on the standardized factors (the minimum norm solution there)
+    centered = X - X.mean(axis=0)
+    scale = np.where(centered.std(axis=0) > 0, centered.std(axis=0), 1)
+    return np.linalg.lstsq(centered/scale, y - y.mean(), rcond=None)[0]/scale
+
+def test_collinear_factors_get_the_minimum_norm_solution():
+    rng = np.random.default_rng(4)
+    x = rng.normal(size=200)
+    X = np.column_stack([x, 2*x, np.ones(200)])
+    y = 3*x + 1
+    model = LeastSquares().update(X, y)
+    np.testing.assert_allclose(model.predict(X), y, atol=1e-8)
+    np.testing.assert_allclose(model.coef_, [1.5, 0.75, 0], atol=1e-8)
+
+@pytest.fixture(scope="module")
+def provo_design():
+    return design(read_provo(f"{ROOT}/Provo.csv", cache=False))
+
+@pytest.mark.parametrize("factors, target", [("lasso", "log_fines"), ("difference", "log_fines_change")])
+def test_models_on_provo(provo_design, factors, target):
+    #The factors of both models are collinear (the dummies, their interactions), so their coefficients are compared
+    #with the minimum norm solution rather than with LinearRegression
+    d = provo_design
+    days = d["kept"] & (d["days"] >= max(LAGS)) if factors == "lasso" else d["days"] >= DIFFERENCE
+    X, y = d[factors][days], d[target][days]
+    model = LeastSquares()
+    for part in np.array_split(np.arange(len(X)), 5):
+        model.update(X[part], y[part])
+    reference = minimum_norm(X, y)
+    np.testing.assert_allclose(model.coef_, reference, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(model.predict(X), X @ reference + (y - X @ reference).mean(), atol=1e-8)
+
+class FailingTrainer(Trainer):
+
+    def train(self, data, key, full=False):
+        self.calls = getattr(self, "calls", 0) + 1
+        raise ValueError("no data")
+
+def test_failed_training_is_not_resubmitted(tmp_path):
+    trainer = FailingTrainer(root=str(tmp_path))
+    trainer.submit(None, "key").exception()
+    assert isinstance(trainer.error("key"), ValueError)
+    assert trainer.submit(None, "key") is None
+    trainer.submit(None, "key", force=True).exception()
+    assert trainer.calls == 2
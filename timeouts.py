@@ -0,0 +1,73 @@
+import threading
+import itertools
+import heapq
+import time
+
+#A single long-lived thread that keeps every pending timeout in a heap ordered by deadline.
+#It sleeps until the nearest deadline (or until a new, earlier one is scheduled) instead of polling,
+#and an expired timeout only sets an event: the thread that owns the browser does the recovery.
+
+class TimeoutExpired(Exception):
+    pass
+
+class Timeout():
+
+    def __init__(self, deadline, event):
+        self.deadline = deadline
+        self._event = event
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        self._cancelled = True
+
+    #Cancels the timeout when the block exits, including when it raises
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cancel()
+
+class TimeoutScheduler():
+
+    def __init__(self):
+        self._heap = []
+        self._condition = threading.Condition()
+        #Breaks ties between timeouts that share a deadline
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, seconds, event):
+        #Sets the event once the given number of seconds has passed, unless the timeout is cancelled first
+        timeout = Timeout(time.perf_counter() + seconds, event)
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (timeout.deadline, next(self._counter), timeout))
+            #Only wake the scheduler when the new timeout is now the nearest deadline
+            if self._heap[0][2] is timeout:
+                self._condition.notify()
+        return timeout
+
+    def _run(self):
+        with self._condition:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, timeout = self._heap[0]
+                remaining = deadline - time.perf_counter()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+                timeout._event.set()
+
+#Shared by every scraper in the process
+SCHEDULER = TimeoutScheduler()
@@ -0,0 +1,323 @@
+import numpy as np
+import pandas as pd
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+
+from features import SPEC, LAGS, build_matrix, LASSO_FACTORS, DIFFERENCE_FACTORS, MODEL_FACTORS
+from schema import read_provo
+
+#Fits the dashboard's three models and saves them with their predictions under models/<key>/, where the key
+#is a hash of the data, the factor spec and the model settings. The same data never has to be fit twice:
+#the dashboard loads the saved predictions, and (re)training runs on a background thread, one training per key
+#at a time across every dashboard session (and a lock file keeps other processes from fitting the same key).
+#
+#When new days are appended to Provo.csv, the models saved for the old days are updated instead of refit:
+#the linear models keep their sums of squares and cross products, so adding days and solving again doesn't
+#depend on how many days came before, and only the new days' predictions are added. The random forest
+#is refit every retrain_every new days; in between it predicts the new days as is ("periodic") or
+#grows a few trees on the new data ("warm_start").
+
+ARTIFACTS = "models"
+#The predictions committed with the repository, shown until models have been fit here
+PREDICTIONS = "predictions.csv"
+
+#Days left out of the linear fits: missing data and COVID
+TRUNCATED = [("2017-03-08", "2019-04-23"), ("2020-03-14", "2020-09-07")]
+DIFFERENCE = 1
+RF_PARAMS = {"n_estimators": 100, "random_state": 1120}
+
+#Days before a new day its factors are computed from (the longest lag and the first difference)
+HISTORY = max(LAGS) + DIFFERENCE
+
+#A lock older than this is left over from a crash
+STALE_LOCK = 3600
+
+def artifact_key(data):
+    #Hash of everything the fitted models depend on
+    h = hashlib.sha256()
+    h.update(json.dumps(list(map(str, data.columns))).encode())
+    h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    factors = dict.fromkeys(["log_DailyNumFines", "log_DailyNumFines_change"] + LASSO_FACTORS + DIFFERENCE_FACTORS + MODEL_FACTORS)
+    spec = {name: [type(SPEC[name]).__name__, vars(SPEC[name])] for name in factors}
+    settings = [spec, LASSO_FACTORS, DIFFERENCE_FACTORS, MODEL_FACTORS, TRUNCATED, DIFFERENCE, RF_PARAMS]
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+class LeastSquares():
+    #Least squares with an intercept, solved from running sums of Z'Z and Z'y (Z is the factors with a column of ones)
+
+    def __init__(self):
+        self.zz = None
+        self.zy = None
+        #Subtracted from the factors before they are summed, so the sums don't lose precision to large means
+        self.shift = None
+
+    def update(self, X, y):
+        if self.zz is None:
+            self.shift = X.mean(axis=0) if len(X) > 0 else np.zeros(X.shape[1])
+            self.zz = np.zeros((X.shape[1] + 1, X.shape[1] + 1))
+            self.zy = np.zeros(X.shape[1] + 1)
+        Z = np.column_stack([np.ones(len(X)), X - self.shift])
+        self.zz += Z.T @ Z
+        self.zy += Z.T @ y
+        return self.solve()
+
+    def solve(self):
+        n = self.zz[0, 0]
+        mean, y_mean = self.zz[0, 1:]/n, self.zy[0]/n
+        xx = self.zz[1:, 1:] - n*np.outer(mean, mean)
+        xy = self.zy[1:] - n*mean*y_mean
+        #Standardized, then solved on the eigenvectors that aren't (numerically) zero: factors that are constant
+        #or a combination of others get the minimum norm solution, like a least squares solver would give them
+        scale = np.sqrt(np.clip(np.diag(xx), 0, None))
+        scale = np.where(scale > 0, scale, 1)
+        values, vectors = np.linalg.eigh(xx/np.outer(scale, scale))
+        kept = values > values.max()*1e-10
+        self.coef_ = vectors[:, kept] @ ((vectors[:, kept].T @ (xy/scale))/values[kept])/scale
+        self.intercept_ = y_mean - (mean + self.shift) @ self.coef_
+        return self
+
+    def predict(self, X):
+        return X @ self.coef_ + self.intercept_
+
+def design(provo, start=0):
+    #The factors and targets of the days from start on (computed from the HISTORY days before as well)
+    data = provo.iloc[max(0, start - HISTORY):]
+    skip = start - max(0, start - HISTORY)
+    log_fines, log_fines_change = build_matrix(data, ["log_DailyNumFines", "log_DailyNumFines_change"], np.float64)[skip:].T
+
+    truncated = np.zeros(len(data), dtype=bool)
+    for begin, end in TRUNCATED:
+        truncated |= ((data["DATE"] >= pd.to_datetime(begin)) & (data["DATE"] <= pd.to_datetime(end))).to_numpy()
+
+    return {
+        "days": np.arange(start, len(provo)),
+        "kept": ~truncated[skip:],
+        "log_fines": log_fines,
+        "log_fines_change": log_fines_change,
+        "previous_fines": data["DailyNumFines"].shift(DIFFERENCE).to_numpy(dtype=float)[skip:],
+        #Least squares needs full precision, the random forest works in float32 anyway
+        "lasso": build_matrix(data, LASSO_FACTORS, np.float64)[skip:],
+        "difference": build_matrix(data, DIFFERENCE_FACTORS, np.float64)[skip:],
+        "rf": build_matrix(data, MODEL_FACTORS)[skip:],
+    }
+
+def fit_linear(models, d):
+    #Adds the days of the design d to the linear models
+    lags = max(LAGS)
+    lasso_days = d["kept"] & (d["days"] >= lags)
+    models["lasso"].update(d["lasso"][lasso_days], d["log_fines"][lasso_days])
+    #Fit on every day, as it always has been: joining the differences onto the truncated frame brought the truncated days back
+    difference_days = d["days"] >= DIFFERENCE
+    models["first_difference"].update(d["difference"][difference_days], d["log_fines_change"][difference_days])
+
+def fit_rf(d, n_jobs=-1):
+    #Imported here so importing this module (i.e. for TRUNCATED) doesn't load scikit-learn
+    from sklearn.ensemble import RandomForestRegressor
+
+    lags = d["days"] >= max(LAGS)
+    return RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs).fit(d["rf"][lags], d["log_fines"][lags])
+
+def predict(provo, models, d, rf=True):
+    #Predictions of the days of the design d (without the random forest's if rf is False)
+    predictions = provo[["DATE", "Term", "DailyNumFines"]].iloc[d["days"]].copy()
+    predictions["LassoPrediction"] = None
+    predictions["FirstDifferencePrediction"] = None
+    predictions["RFPrediction"] = None
+    lags = d["days"] >= max(LAGS)
+    difference = d["days"] >= DIFFERENCE
+    predictions.loc[lags, "LassoPrediction"] = np.exp(models["lasso"].predict(d["lasso"][lags]))-1
+    predictions.loc[difference, "FirstDifferencePrediction"] = np.exp(models["first_difference"].predict(d["difference"][difference]) + np.log(d["previous_fines"][difference] + 1))-1
+    if rf:
+        predictions.loc[lags, "RFPrediction"] = np.exp(models["rf"].predict(d["rf"][lags]))-1
+    return predictions
+
+def fit_models(provo, n_jobs=-1):
+    #Returns the fitted models and a frame of their predictions for every day
+    d = design(provo)
+    models = {"lasso": LeastSquares(), "first_difference": LeastSquares(), "rf": fit_rf(d, n_jobs)}
+    fit_linear(models, d)
+    return models, predict(provo, models, d)
+
+def update_models(provo, models, days, rf_days, rf_policy="periodic", retrain_every=30, warm_start_trees=10, n_jobs=-1):
+    #Adds the days from days on to models fit on the days before. Returns the predictions of the new days and,
+    #when the random forest was refit, its predictions for every day
+    d = design(provo, days)
+    fit_linear(models, d)
+    rf_predictions = None
+    if rf_policy == "refit" or len(provo) - rf_days >= retrain_every:
+        everything = design(provo)
+        models["rf"] = fit_rf(everything, n_jobs)
+        rf_predictions = predict(provo, models, everything)["RFPrediction"]
+    elif rf_policy == "warm_start":
+        #The new trees are fit on every day; the old days keep the predictions they had
+        everything = design(provo)
+        lags = everything["days"] >= max(LAGS)
+        models["rf"].set_params(warm_start=True, n_estimators=models["rf"].n_estimators + warm_start_trees, n_jobs=n_jobs)
+        models["rf"].fit(everything["rf"][lags], everything["log_fines"][lags])
+    return predict(provo, models, d), rf_predictions
+
+class Trainer():
+
+    def __init__(self, root=ARTIFACTS, rf_policy="periodic", retrain_every=30, warm_start_trees=10):
+        self.root = root
+        #A copy of the predictions saved last
+        self.latest = os.path.join(root, "predictions.csv")
+        #How the random forest is updated when days are added (see update_models)
+        self.rf_policy = rf_policy
+        self.retrain_every = retrain_every
+        self.warm_start_trees = warm_start_trees
+
+        #A single worker, so trainings never compete for the cores; the random forest uses all of them
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._trainings = {}
+
+    def path(self, key, *names):
+        return os.path.join(self.root, key, *names)
+
+    def has(self, key):
+        return os.path.exists(self.path(key, "predictions.csv"))
+
+    def last_predictions(self):
+        #The predictions saved last, or the committed ones when nothing has been fit yet
+        return self.latest if os.path.exists(self.latest) else PREDICTIONS
+
+    def training(self, key):
+        with self._lock:
+            future = self._trainings.get(key)
+            return future is not None and not future.done()
+
+    def error(self, key):
+        #The exception the last training of the key failed with, if it did
+        with self._lock:
+            future = self._trainings.get(key)
+        if future is None or not future.done():
+            return None
+        return future.exception()
+
+    def submit(self, data, key=None, force=False):
+        #Starts training in the background unless the key is already trained (or being trained), or its
+        #last training failed; force retrains it anyway
+        key = key or artifact_key(data)
+        with self._lock:
+            future = self._trainings.get(key)
+            if future is not None and not future.done():
+                return future
+            if not force and (self.has(key) or (future is not None and future.exception() is not None)):
+                return None
+            future = self._executor.submit(self.train, data, key, force)
+            self._trainings[key] = future
+            return future
+
+    def train(self, data, key, full=False):
+        #Fits the models for data, updating the models of the days it starts with unless full is set
+        os.makedirs(self.root, exist_ok=True)
+        lock = self.path(key) + ".lock"
+        if os.path.exists(lock) and time.time() - os.path.getmtime(lock) > STALE_LOCK:
+            os.remove(lock)
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            #Another process is training the same data
+            return False
+        try:
+            parent = None if full else self.parent(data)
+            if parent is None:
+                models, predictions = fit_models(data)
+                self.save(key, models, {"days": len(data), "rf_days": len(data)}, predictions)
+            else:
+                self.update(data, key, parent)
+            return True
+        finally:
+            os.close(fd)
+            os.remove(lock)
+
+    def meta(self, key):
+        with open(self.path(key, "meta.json")) as f:
+            return json.load(f)
+
+    def parent(self, data):
+        #The saved models that were fit on the most days data starts with, if any
+        parent, days = None, 0
+        if not os.path.isdir(self.root):
+            return None
+        for key in os.listdir(self.root):
+            if not os.path.exists(self.path(key, "meta.json")):
+                continue
+            meta = self.meta(key)
+            if days < meta["days"] < len(data) and artifact_key(data.iloc[:meta["days"]]) == key:
+                parent, days = key, meta["days"]
+        return parent
+
+    def update(self, data, key, parent):
+        meta = self.meta(parent)
+        models = self.models(parent)
+        predictions, rf_predictions = update_models(data, models, meta["days"], meta["rf_days"], self.rf_policy,
+                                                    self.retrain_every, self.warm_start_trees)
+        meta = {"days": len(data), "rf_days": meta["rf_days"], "parent": parent}
+        if rf_predictions is None:
+            self.save(key, models, meta, predictions, append_to=self.path(parent, "predictions.csv"))
+        else:
+            meta["rf_days"] = len(data)
+            predictions = pd.concat([pd.read_csv(self.path(parent, "predictions.csv"), parse_dates=["DATE"]), predictions], ignore_index=True)
+            predictions["RFPrediction"] = rf_predictions.to_numpy()
+            self.save(key, models, meta, predictions)
+
+    def save(self, key, models, meta, predictions, append_to=None):
+        #Written to a temporary directory first, so a half written artifact is never loaded.
+        #With append_to, the predictions are added to the end of that predictions file
+        temp = self.path(key) + ".tmp"
+        shutil.rmtree(temp, ignore_errors=True)
+        os.makedirs(temp)
+        joblib.dump(models, os.path.join(temp, "models.joblib"))
+        with open(os.path.join(temp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        if append_to is None:
+            predictions.to_csv(os.path.join(temp, "predictions.csv"), index=False)
+        else:
+            shutil.copyfile(append_to, os.path.join(temp, "predictions.csv"))
+            predictions.to_csv(os.path.join(temp, "predictions.csv"), mode="a", header=False, index=False)
+        old = self.path(key) + ".old"
+        if os.path.exists(self.path(key)):
+            os.replace(self.path(key), old)
+        os.replace(temp, self.path(key))
+        shutil.rmtree(old, ignore_errors=True)
+
+        #root/predictions.csv always holds the latest predictions
+        shutil.copyfile(self.path(key, "predictions.csv"), self.latest + ".tmp")
+        os.replace(self.latest + ".tmp", self.latest)
+
+    def models(self, key):
+        return joblib.load(self.path(key, "models.joblib"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the dashboard's models and save them under models/")
+    parser.add_argument("--data", default="Provo.csv")
+    parser.add_argument("--root", default=ARTIFACTS)
+    parser.add_argument("--force", action="store_true", help="Refit even if the data has been fit before")
+    parser.add_argument("--rf-policy", choices=["periodic", "warm_start", "refit"], default="periodic",
+                        help="When days are added: keep the random forest until it is refit, grow it, or always refit it")
+    parser.add_argument("--retrain-every", type=int, default=30, help="Refit the random forest after this many new days")
+    parser.add_argument("--warm-start-trees", type=int, default=10, help="Trees added per update with --rf-policy warm_start")
+    args = parser.parse_args()
+
+    provo = read_provo(args.data)
+    key = artifact_key(provo)
+    trainer = Trainer(args.root, rf_policy=args.rf_policy, retrain_every=args.retrain_every, warm_start_trees=args.warm_start_trees)
+    if trainer.has(key) and not args.force:
+        print(f"Models for this data are already saved in {trainer.path(key)}")
+    else:
+        start_time = time.perf_counter()
+        if not trainer.train(provo, key, args.force):
+            print("The models for this data are being fit by another process")
+        else:
+            print(f"Saved the models in {trainer.path(key)} ({time.perf_counter() - start_time:.1f} seconds)")
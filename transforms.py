@@ -0,0 +1,39 @@
+import functools
+import numpy as np
+from sympy import sympify, symbols, lambdify, SympifyError
+
+#Equations typed into the dashboard (i.e. log(PM25)) are parsed with sympy once and compiled to NumPy with
+#lambdify, so a transformation runs over a whole column at once instead of substituting every value.
+#Values outside the domain of the equation (log of 0, sqrt of a negative number, ...) become NaN
+#and are counted, instead of failing the whole transformation.
+
+class TransformError(ValueError):
+    pass
+
+@functools.lru_cache(maxsize=128)
+def compile_transform(expression, variable):
+    #Returns the parsed equation and a function that evaluates it on an array of the variable's values
+    try:
+        parsed = sympify(expression)
+    except (SympifyError, SyntaxError, TypeError) as e:
+        raise TransformError(f"could not read {expression!r}") from e
+    symbol = symbols(variable)
+    unknown = getattr(parsed, "free_symbols", set()) - {symbol}
+    if unknown:
+        raise TransformError(f"unknown variable {', '.join(sorted(str(s) for s in unknown))} (use {variable})")
+    return parsed, lambdify(symbol, parsed, modules="numpy")
+
+def apply_transform(expression, variable, values):
+    #Returns the transformed values and how many of them fell outside the equation's domain
+    values = np.asarray(values, dtype=float)
+    parsed, f = compile_transform(expression, variable)
+    try:
+        with np.errstate(all="ignore"):
+            result = np.broadcast_to(f(values), values.shape)
+            if np.iscomplexobj(result):
+                result = np.where(result.imag == 0, result.real, np.nan)
+            result = result.astype(float)
+    except (TypeError, ValueError, NameError, AttributeError) as e:
+        raise TransformError(f"could not evaluate {parsed}") from e
+    undefined = ~np.isfinite(result)
+    return np.where(undefined, np.nan, result), int((undefined & np.isfinite(values)).sum())